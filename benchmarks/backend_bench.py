@@ -0,0 +1,105 @@
+"""
+本地推理后端 Benchmark：PEFT (FP16 + LoRA 包装) vs 合并后的 fp32 / int8 / bf16
+
+每个后端在独立子进程中测量：
+  - 首次加载 (合并 + 保存产物) 与缓存加载的耗时
+  - 贪心解码固定长度的 tokens/s
+用法: python benchmarks/backend_bench.py --backends peft merged merged_int8 --new-tokens 64
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+# 确保能导入 src
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_PROMPT = (
+    "当前代码:\n```python\n"
+    "def running_mean(xs):\n"
+    "    total = 0\n"
+    "    out = []\n"
+    "    for i, x in enumerate(xs):\n"
+    "        total += x\n"
+    "        out.append(total / i)\n"
+    "    return out\n"
+    "```\n\n"
+    "请修复代码使其通过测试。只返回修复后的Python代码。"
+)
+
+
+def run_once(backend: str, new_tokens: int, repeats: int) -> dict:
+    """在当前进程中加载指定后端并测速 (由子进程调用)"""
+    os.environ["LLM_BACKEND"] = backend
+    from src.reason_code.models.llm import LocalLoraModel
+    import torch
+
+    model = LocalLoraModel()
+    start = time.perf_counter()
+    if not model.initialize():
+        return {"error": "model unavailable"}
+    load_s = time.perf_counter() - start
+
+    inputs, _ = model._build_inputs(BENCH_PROMPT)
+    kwargs = dict(max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False,
+                  pad_token_id=model.tokenizer.eos_token_id)
+    with torch.no_grad():
+        model.model.generate(**inputs, max_new_tokens=4, do_sample=False, pad_token_id=model.tokenizer.eos_token_id)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model.model.generate(**inputs, **kwargs)
+        decode_s = time.perf_counter() - start
+    return {"load_s": load_s, "tokens_per_s": new_tokens * repeats / decode_s}
+
+
+def measure(backend: str, new_tokens: int, repeats: int) -> dict:
+    """子进程隔离：每次都是真实的冷启动，不共享已加载的权重"""
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", backend,
+         "--new-tokens", str(new_tokens), "--repeats", str(repeats)],
+        capture_output=True, text=True, cwd=ROOT,
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "no output"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["peft", "merged", "merged_int8", "merged_bf16"])
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--fresh", action="store_true", help="先删除已缓存的合并产物，测量首次构建耗时")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_once(args.child, args.new_tokens, args.repeats)))
+        return
+
+    if args.fresh:
+        from src.reason_code.models.local_backend import LLM_ARTIFACT_DIR
+        shutil.rmtree(LLM_ARTIFACT_DIR, ignore_errors=True)
+
+    print(f"{'backend':>12} | {'1st load s':>10} | {'load s':>7} | {'tokens/s':>9} | {'speedup':>7}")
+    print("-" * 58)
+    base_tps = None
+    for backend in args.backends:
+        first = measure(backend, args.new_tokens, args.repeats)
+        # 第二次启动：合并后端直接读取缓存产物
+        second = measure(backend, args.new_tokens, args.repeats)
+        if "error" in first or "error" in second:
+            print(f"{backend:>12} | ❌ {first.get('error') or second.get('error')}")
+            continue
+        base_tps = base_tps or second["tokens_per_s"]
+        speedup = second["tokens_per_s"] / base_tps
+        print(f"{backend:>12} | {first['load_s']:>10.2f} | {second['load_s']:>7.2f} | {second['tokens_per_s']:>9.1f} | {speedup:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+生成吞吐 Benchmark：串行循环 vs 批量采样 vs 批量采样 + 提前停止
+
+对比每次 generate_code_candidates 调用的墙钟时间、tokens/s 与每个候选的耗时 (n=1/3/8)
+用法: python benchmarks/generation_bench.py --repeats 3 --ns 1 3 8
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.models import llm
+from src.reason_code.models.llm import generate_code_candidates
+from src.reason_code.models.router import router
+
+BENCH_PROMPT = (
+    "当前代码:\n```python\n"
+    "def running_mean(xs):\n"
+    "    total = 0\n"
+    "    out = []\n"
+    "    for i, x in enumerate(xs):\n"
+    "        total += x\n"
+    "        out.append(total / i)\n"
+    "    return out\n"
+    "```\n\n"
+    "在level_3失败: ZeroDivisionError: division by zero\n\n"
+    "请修复代码使其通过测试。只返回修复后的Python代码。"
+)
+
+
+async def bench_mode(batched: bool, n: int, repeats: int, early_stop: bool = False) -> dict:
+    model = router.local_model
+    llm.LLM_BATCHED_SAMPLING = batched
+    llm.LLM_EARLY_STOP = early_stop
+
+    wall = 0.0
+    tokens_before = model.metrics["new_tokens"]
+    for _ in range(repeats):
+        # 清空候选缓存，保证每次都真实推理
+        llm._candidate_cache.memory.clear()
+        start = time.perf_counter()
+        await generate_code_candidates(BENCH_PROMPT, n=n)
+        wall += time.perf_counter() - start
+
+    new_tokens = model.metrics["new_tokens"] - tokens_before
+    return {
+        "wall_per_call": wall / repeats,
+        "wall_per_candidate": wall / (repeats * n),
+        "tokens_per_s": new_tokens / wall if wall > 0 else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--ns", type=int, nargs="+", default=[1, 3, 8])
+    args = parser.parse_args()
+
+    model = router.local_model
+    if not model.initialize() and not model._initialized:
+        print("❌ 本地模型不可用，请检查 LORA_MODEL_PATH / BASE_MODEL_NAME")
+        return
+
+    # 不读写磁盘缓存层，避免污染共享缓存
+    llm._candidate_cache.disk = None
+
+    # 预热一次，排除首次调用的图构建开销
+    model.generate(BENCH_PROMPT, 1)
+
+    # 调度器会把请求交给 generate_batch，这里直接比较生成路径本身
+    llm.LLM_SCHEDULER = False
+
+    print(f"{'n':>3} | {'mode':>12} | {'s/call':>8} | {'s/cand':>8} | {'tokens/s':>9} | {'speedup':>7}")
+    print("-" * 66)
+    for n in args.ns:
+        results = {
+            "loop": await bench_mode(False, n, args.repeats),
+            "batched": await bench_mode(True, n, args.repeats),
+            "batched+stop": await bench_mode(True, n, args.repeats, early_stop=True),
+        }
+        base = results["loop"]["wall_per_call"]
+        for mode, res in results.items():
+            speedup = base / res["wall_per_call"] if res["wall_per_call"] else 0.0
+            print(f"{n:>3} | {mode:>12} | {res['wall_per_call']:>8.2f} | {res['wall_per_candidate']:>8.2f} | {res['tokens_per_s']:>9.1f} | {speedup:>6.2f}x")
+
+        saved = results["batched"]["wall_per_candidate"] - results["batched+stop"]["wall_per_candidate"]
+        pct = saved / results["batched"]["wall_per_candidate"] if results["batched"]["wall_per_candidate"] else 0.0
+        print(f"    ⏱️  early stop saves {saved:.2f}s per candidate ({pct:.0%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
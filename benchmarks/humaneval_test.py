@@ -2,17 +2,19 @@ import sys
 import os
 import json
 import asyncio
+import argparse
 from typing import List
 
 # 确保能导入 src
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.reason_code.agent.mcts import EnhancedMCTS
+from src.reason_code.agent.mcts import EnhancedMCTS, SearchBudget
+from src.reason_code.utils.config import MCTS_CHECKPOINT_DIR
 # 需要安装 datasets: pip install datasets
 from datasets import load_dataset 
 from tqdm.asyncio import tqdm
 
-async def run_one_problem(problem, output_file):
+async def run_one_problem(problem, output_file, n_simulations: int = 1, budget: SearchBudget = None):
     task_id = problem["task_id"]
     prompt = problem["prompt"]
     # HumanEval 的 test 通常包含在 test 字段里
@@ -28,16 +30,21 @@ async def run_one_problem(problem, output_file):
 
     try:
         # 实例化 Agent (为了跑得快，论文实验可以把 simulations 设为 10)
-        agent = EnhancedMCTS(root_code=full_prompt, n_simulations=1, n_candidates=1)
+        # 设置了 MCTS_CHECKPOINT_DIR 时，中途中断后重跑会从检查点继续 (跑对比实验前清空该目录)
+        agent = EnhancedMCTS(root_code=full_prompt, n_simulations=n_simulations, n_candidates=1,
+                             checkpoint_dir=MCTS_CHECKPOINT_DIR)
         
-        # 运行
-        generated_code = await agent.run(runner_script)
+        # 运行 (到达预算时返回目前最好的代码)
+        search = await agent.run_anytime(runner_script, budget)
         
         result = {
             "task_id": task_id,
-            "completion": generated_code,
+            "completion": search.code,
             "prompt": prompt,
-            "status": "generated"
+            "status": "generated",
+            "stop_reason": search.stop_reason,
+            "simulations": search.simulations,
+            "elapsed_s": round(search.elapsed_s, 3)
         }
     except Exception as e:
         result = {
@@ -52,6 +59,17 @@ async def run_one_problem(problem, output_file):
         f.write(json.dumps(result) + "\n")
 
 async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--simulations", type=int, default=1)
+    parser.add_argument("--deadline-s", type=float, default=None, help="每个问题的墙钟时间上限")
+    parser.add_argument("--max-llm-calls", type=int, default=None)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--max-sandbox-runs", type=int, default=None)
+    parser.add_argument("--plateau-patience", type=int, default=None)
+    args = parser.parse_args()
+    budget = SearchBudget(deadline_s=args.deadline_s, max_llm_calls=args.max_llm_calls, max_tokens=args.max_tokens,
+                          max_sandbox_runs=args.max_sandbox_runs, plateau_patience=args.plateau_patience)
+
     print("🚀 Loading HumanEval dataset...")
     dataset = load_dataset("openai_humaneval", split="test")
     dataset = dataset.select(range(90, 110))
@@ -70,7 +88,7 @@ async def main():
 
     async def sem_task(problem):
         async with sem:
-            await run_one_problem(problem, output_file)
+            await run_one_problem(problem, output_file, args.simulations, budget)
 
     tasks = [sem_task(p) for p in dataset]
     await tqdm.gather(*tasks)
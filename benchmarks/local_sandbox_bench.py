@@ -0,0 +1,77 @@
+"""
+本地沙箱单次执行开销 Benchmark：fork server (SANDBOX_BACKEND=local) vs 每次新起一个 python 子进程
+
+新起子进程与 Docker 不可用时评估器的回退路径 (validate_repair) 相同：临时目录 + 解释器冷启动
+测试代码分两种：只用内置函数的小函数，以及导入常用标准库模块的函数 (fork server 已预先导入)
+用法: python benchmarks/local_sandbox_bench.py --runs 100
+"""
+import sys
+import os
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.executor.local_sandbox import LocalForkSandbox
+
+CASES = {
+    "builtin": ("def add(a, b):\n    return a + b", "    assert add(1, 2) == 3"),
+    "stdlib": (
+        "import re, json, heapq, collections, itertools, functools, statistics, fractions, decimal\n"
+        "def top(words, k):\n    return [w for w, _ in collections.Counter(words).most_common(k)]",
+        "    assert top(['a', 'b', 'a'], 1) == ['a']",
+    ),
+}
+
+
+def fresh_subprocess(code: str, test_runner: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test_code.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{code}\n\nif __name__ == '__main__':\n{test_runner}")
+        proc = subprocess.run([sys.executable, path], cwd=tmp, capture_output=True, text=True, timeout=10)
+        return proc.returncode, proc.stdout, proc.stderr
+
+
+def timed(run, code: str, test_runner: str, runs: int):
+    run(code, test_runner)  # 预热
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        exit_code, _, stderr = run(code, test_runner)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert exit_code == 0, stderr
+    latencies.sort()
+    return statistics.median(latencies), latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    start = time.perf_counter()
+    sandbox = LocalForkSandbox()
+    startup_ms = (time.perf_counter() - start) * 1000
+    print(f"⚡ fork server 启动 (含预导入): {startup_ms:.1f} ms，每种代码 {args.runs} 次\n")
+    print(f"{'case':>8} | {'backend':>10} | {'p50 ms':>7} | {'p95 ms':>7} | {'speedup':>7}")
+    print("-" * 52)
+    try:
+        for name, (code, test_runner) in CASES.items():
+            base_p50, base_p95 = timed(fresh_subprocess, code, test_runner, args.runs)
+            p50, p95 = timed(sandbox.execute_code, code, test_runner, args.runs)
+            print(f"{name:>8} | {'subprocess':>10} | {base_p50:>7.2f} | {base_p95:>7.2f} | {1:>6.2f}x")
+            print(f"{name:>8} | {'fork':>10} | {p50:>7.2f} | {p95:>7.2f} | {base_p50 / p50:>6.2f}x")
+    finally:
+        sandbox.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+叶并行 MCTS Benchmark：K=1/2/4/8 个在途模拟下，找到 reward 1.0 解所需的墙钟时间
+
+LLM 生成与沙箱评估用成本模型代替 (异步 sleep)：
+  - 生成：固定延迟 (调度器合批 / 远程 API 下并发请求互相重叠)
+  - 评估：--sandboxes 个沙箱槽位，每个候选占用一个槽位 --eval-s 秒
+  - 候选通过的概率随修复深度增加，由 (问题, 代码) 哈希决定，同一问题在不同 K 下可复现
+用法: python benchmarks/mcts_parallel_bench.py --problems 8 --simulations 40
+"""
+import sys
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import zlib
+from typing import List, Optional
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.agent import mcts as mcts_module
+from src.reason_code.agent import reflexion
+from src.reason_code.executor import evaluator
+from src.reason_code.agent.mcts import EnhancedMCTS
+
+
+class SimulatedBackend:
+    def __init__(self, gen_s: float, eval_s: float, sandboxes: int, seed: int):
+        self.gen_s = gen_s
+        self.eval_s = eval_s
+        self.sandboxes = sandboxes
+        self.seed = seed
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._counter = 0
+
+    def reset(self):
+        self._slots = asyncio.Semaphore(self.sandboxes)
+        self._counter = 0
+
+    async def generate(self, prompt: str, n: int = 3, **kwargs) -> List[str]:
+        await asyncio.sleep(self.gen_s)
+        depth = prompt.count("fix()") + 1
+        problem = prompt.split("problem = ", 1)[1].split("\n", 1)[0]
+        candidates = []
+        for _ in range(n):
+            self._counter += 1
+            candidates.append(f"problem = {problem}\n" + "fix()\n" * depth + f"variant = {self._counter}\n")
+        return candidates
+
+    def _passes(self, code: str) -> bool:
+        depth = code.count("fix()")
+        p = min(0.02 * depth * depth, 0.9)
+        return random.Random(zlib.crc32(code.encode()) ^ self.seed).random() < p
+
+    async def _evaluate_one(self, code: str) -> dict:
+        async with self._slots:
+            await asyncio.sleep(self.eval_s)
+        if self._passes(code):
+            return {"level_1": {"passed": True}, "level_2": {"passed": True}, "level_3": {"passed": True},
+                    "overall": {"reward": 1.0, "failed_at": None}}
+        return {"level_1": {"passed": True}, "level_2": {"passed": False, "message": "simulated failure"},
+                "overall": {"reward": 0.3, "failed_at": "level_2"}}
+
+    async def evaluate(self, candidates: List[str], test_runner: str, prompt: str = "") -> List[dict]:
+        return list(await asyncio.gather(*(self._evaluate_one(c) for c in candidates)))
+
+
+def install(backend: SimulatedBackend):
+    mcts_module.generate_code_candidates = backend.generate
+    mcts_module.simple_retrieve = lambda code, k=3: []
+    evaluator.evaluate_candidates_async = backend.evaluate
+
+    async def no_fix(code, error_msg, test_runner, decoding=None):
+        return code
+    reflexion.attempt_fix = no_fix
+
+
+async def solve(problem: int, k: int, args) -> dict:
+    search = EnhancedMCTS(root_code=f"problem = {problem}\n", n_simulations=args.simulations,
+                          n_candidates=args.candidates, parallelism=k)
+    start = time.perf_counter()
+    await search.run("assert True")
+    return {"tts": search.stats["time_to_solution_s"], "wall": time.perf_counter() - start,
+            "in_flight": search.stats["max_in_flight"]}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problems", type=int, default=8)
+    parser.add_argument("--simulations", type=int, default=40)
+    parser.add_argument("--candidates", type=int, default=2)
+    parser.add_argument("--gen-s", type=float, default=0.05, help="单次生成延迟 (秒)")
+    parser.add_argument("--eval-s", type=float, default=0.03, help="单个候选的沙箱执行时间 (秒)")
+    parser.add_argument("--sandboxes", type=int, default=8)
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    backend = SimulatedBackend(args.gen_s, args.eval_s, args.sandboxes, args.seed)
+    install(backend)
+
+    print(f"🧪 {args.problems} 个问题 x {args.simulations} 次模拟，生成 {args.gen_s}s，评估 {args.eval_s}s，"
+          f"{args.sandboxes} 个沙箱\n")
+    print(f"{'K':>3} | {'solved':>6} | {'median tts s':>12} | {'mean wall s':>11} | {'in flight':>9}")
+    print("-" * 56)
+    baseline = None
+    for k in args.parallelism:
+        runs = []
+        for problem in range(args.problems):
+            backend.reset()
+            runs.append(await solve(problem, k, args))
+        solved = [r["tts"] for r in runs if r["tts"] is not None]
+        median_tts = statistics.median(solved) if solved else float("nan")
+        mean_wall = statistics.mean(r["wall"] for r in runs)
+        baseline = baseline or median_tts
+        print(f"{k:>3} | {len(solved):>3}/{len(runs):<2} | {median_tts:>12.3f} | {mean_wall:>11.3f} | "
+              f"{max(r['in_flight'] for r in runs):>9}   ({baseline / median_tts:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
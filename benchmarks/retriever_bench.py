@@ -0,0 +1,183 @@
+"""
+失败案例检索延迟 Benchmark：BM25 增量索引 / 稠密向量索引 vs 旧的全量读取 + 子串扫描
+
+在临时目录生成 10k / 100k / 1M 条合成失败记录，统计：
+  - 首次建索引耗时、索引内存 (tracemalloc 峰值)
+  - 追加 100 条记录后的增量刷新耗时
+  - 查询延迟 p50 / p95 (查询是一段节点代码，与 _build_prompt 一致)
+旧实现每次检索都要重新解析整个日志，只在 --legacy-max 以内的规模上测
+dense 模式另外统计 IVF 相对全量点积的 recall@3
+用法: python benchmarks/retriever_bench.py --sizes 10000 100000 1000000 --modes bm25 dense
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+import numpy as np
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.agent.retriever import BM25Index, DenseIndex, load_fail_cases
+
+NAMES = ["parse", "merge", "sort", "count", "split", "render", "fetch", "score", "index", "encode", "window", "prefix"]
+NOUNS = ["items", "tokens", "rows", "nodes", "words", "pairs", "lines", "chars", "scores", "keys", "edges", "bytes"]
+ERRORS = ["IndexError: list index out of range", "KeyError: 'id'", "TypeError: unsupported operand type(s)",
+          "ZeroDivisionError: division by zero", "AssertionError", "ValueError: invalid literal for int()",
+          "AttributeError: 'NoneType' object has no attribute 'append'", "RecursionError: maximum recursion depth"]
+
+
+def synth_case(rng: random.Random) -> dict:
+    fn = f"{rng.choice(NAMES)}_{rng.choice(NOUNS)}"
+    var = rng.choice(NOUNS)
+    body = rng.choice([
+        f"    return sorted({var})[{rng.randint(0, 9)}]",
+        f"    total = 0\n    for x in {var}:\n        total += x / len({var})\n    return total",
+        f"    seen = {{}}\n    for k in {var}:\n        seen[k] = seen.get(k, 0) + 1\n    return seen['{rng.choice(NOUNS)}']",
+        f"    if not {var}:\n        return None\n    return {fn}({var}[1:]) + [{var}[0]]",
+    ])
+    return {
+        "prompt": f"实现 {fn}",
+        "candidate": f"def {fn}({var}):\n{body}",
+        "stderr": f"Traceback (most recent call last):\n  File \"<string>\", line {rng.randint(1, 40)}\n{rng.choice(ERRORS)}",
+        "test_case": f"assert {fn}([]) is not None",
+    }
+
+
+def write_cases(path: str, n: int, rng: random.Random) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for _ in range(n):
+            f.write(json.dumps(synth_case(rng), ensure_ascii=False) + "\n")
+
+
+def legacy_retrieve(path: str, query: str, k: int = 3):
+    """重构前的 simple_retrieve：每次都重新解析整个日志再做子串匹配"""
+    scored = []
+    q = query.lower()
+    for c in load_fail_cases(path):
+        score = 3 * (q in c.get("prompt", "").lower()) + 2 * (q in c.get("candidate", "").lower()) \
+            + (q in c.get("stderr", "").lower())
+        scored.append((score, c))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [c for s, c in scored[:k] if s > 0]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def timed_queries(index, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.get_many([doc_id for _, doc_id in index.search(q, k=3)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+def bench_bm25(n, args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "fail_cases.jsonl")
+        write_cases(log, n, rng)
+
+        index = BM25Index(log, snapshot_path=None)
+        tracemalloc.start()
+        start = time.perf_counter()
+        index.refresh()
+        build_s = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        write_cases(log, 100, rng)
+        start = time.perf_counter()
+        index.refresh()
+        tail_ms = (time.perf_counter() - start) * 1000
+
+        queries = [synth_case(rng)["candidate"] for _ in range(args.queries)]
+        p50, p95 = timed_queries(index, queries)
+
+        legacy = "-"
+        if n <= args.legacy_max:
+            runs = []
+            for q in queries[:3]:
+                start = time.perf_counter()
+                legacy_retrieve(log, q)
+                runs.append((time.perf_counter() - start) * 1000)
+            legacy = f"{statistics.median(runs):.1f}"
+
+        print(f"{n:>9} | {build_s:>7.2f} | {peak / 2**20:>8.1f} | {tail_ms:>7.2f} | {p50:>7.2f} | {p95:>7.2f} | {legacy:>13}")
+
+
+def bench_dense(n, args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "fail_cases.jsonl")
+        write_cases(log, n, rng)
+
+        index = DenseIndex(log, os.path.join(tmp, "fail_cases.dense"))
+        tracemalloc.start()
+        start = time.perf_counter()
+        index.refresh()
+        build_s = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        write_cases(log, 100, rng)
+        start = time.perf_counter()
+        index.refresh()
+        tail_ms = (time.perf_counter() - start) * 1000
+
+        queries = [synth_case(rng)["candidate"] for _ in range(args.queries)]
+        index.search(queries[0], k=3)  # 预热 page cache
+        p50, p95 = timed_queries(index, queries)
+
+        # 与全量点积对比 IVF 的召回 (按分数比较，合成数据里并列的重复记录很多)
+        recall = "-"
+        if index._centroids is not None:
+            hits = total = 0
+            for q in queries:
+                vec = index.embed(q)
+                exact = np.sort(index._vectors @ vec)[-3:]
+                approx = [s for s, _ in index.search(q, k=3)]
+                hits += sum(1 for s in approx if s >= exact[0] - 1e-6)
+                total += 3
+            recall = f"{hits / total:.2f}"
+
+        print(f"{n:>9} | {build_s:>7.2f} | {peak / 2**20:>8.1f} | {tail_ms:>7.2f} | {p50:>7.3f} | {p95:>7.3f} | {recall:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--modes", nargs="+", choices=["bm25", "dense"], default=["bm25", "dense"])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--legacy-max", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if "bm25" in args.modes:
+        print("🔎 BM25\n")
+        print(f"{'cases':>9} | {'build s':>7} | {'index MB':>8} | {'+100 ms':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'legacy p50 ms':>13}")
+        print("-" * 78)
+        for n in args.sizes:
+            bench_bm25(n, args)
+        print()
+    if "dense" in args.modes:
+        print("🧭 Dense (哈希 n-gram + memmap)\n")
+        print(f"{'cases':>9} | {'build s':>7} | {'heap MB':>8} | {'+100 ms':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'IVF recall':>9}")
+        print("-" * 74)
+        for n in args.sizes:
+            bench_dense(n, args)
+        print()
+
+
+if __name__ == "__main__":
+    main()
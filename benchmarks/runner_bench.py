@@ -0,0 +1,143 @@
+"""
+常驻 runner Benchmark：每次评估的延迟，exec_run 路径 (每次新起解释器) vs 容器里常驻的 runner
+
+测试代码仿照 HumanEval：METADATA + 带 --asserts 条断言的 check() + check(entry_point)，所有候选共用
+  - docker: 真实的 PersistentSandbox，use_runner=False / True 两种 (需要 Docker daemon)
+  - local:  在本机模拟容器里执行的那部分 (不含 docker API 往返)：
+      exec        每次写临时文件 + python fork_server.py --run，与 exec_run 里执行的命令相同
+      runner      常驻 fork server，每次发送完整代码 (harness 每次重新编译)
+      runner+hc   常驻 fork server，harness 只发送、编译一次 (RunnerSession)
+用法: python benchmarks/runner_bench.py --evals 100 --asserts 200
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.executor import fork_server
+from src.reason_code.executor.runner_session import RunnerSession
+from src.reason_code.utils.config import SANDBOX_PRELOAD
+
+
+def make_problem(n_asserts: int):
+    lines = ["    METADATA = {'author': 'bench', 'dataset': 'test'}", "", "    def check(candidate):"]
+    for i in range(n_asserts):
+        lines.append(f"        assert candidate([{i}, {i + 1}, {i + 2}], {i % 7}) == {3 * i + 3 + (i % 7)}")
+    lines.append("")
+    lines.append("    check(add_all)")
+    test_runner = "\n".join(lines)
+    candidates = [f"def add_all(xs, k):\n    total = {j} - {j}\n    for x in xs:\n        total += x\n    return total + k"
+                  for j in range(64)]
+    return candidates, test_runner
+
+
+def docker_available() -> bool:
+    try:
+        import docker
+        docker.from_env().ping()
+        return True
+    except Exception:
+        return False
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def timed(run, candidates, test_runner: str, evals: int):
+    run(candidates[0], test_runner)  # 预热
+    latencies = []
+    for i in range(evals):
+        start = time.perf_counter()
+        exit_code, stderr = run(candidates[i % len(candidates)], test_runner)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert exit_code == 0, stderr
+    return percentiles(latencies)
+
+
+def local_exec(code: str, test_runner: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "test_code.py"), "w", encoding="utf-8") as f:
+            f.write(f"{code}\n\nif __name__ == '__main__':\n{test_runner}")
+        proc = subprocess.run([sys.executable, fork_server.__file__, "--run", "test_code.py", "10", "10"],
+                              cwd=tmp, capture_output=True, text=True, timeout=30)
+        result = json.loads(proc.stdout.rpartition(fork_server.RESULT_MARKER)[2])
+        return result["exit_code"], result["stderr"]
+
+
+def bench_local(candidates, test_runner, args):
+    proc = subprocess.Popen([sys.executable, "-I", fork_server.__file__, SANDBOX_PRELOAD],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    session = RunnerSession(proc.stdout, proc.stdin)
+    session.hello()
+
+    def runner_full(code, test_runner):
+        full = f"{code}\n\nif __name__ == '__main__':\n{test_runner}"
+        result = session.request({"code": full, "timeout": 10, "limits": {"cpu_s": 10}})
+        return result["exit_code"], result["stderr"]
+
+    def runner_cached(code, test_runner):
+        result = session.run(code, test_runner, 10, {"cpu_s": 10})
+        return result["exit_code"], result["stderr"]
+
+    try:
+        rows = [("exec", timed(local_exec, candidates, test_runner, args.evals)),
+                ("runner", timed(runner_full, candidates, test_runner, args.evals)),
+                ("runner+hc", timed(runner_cached, candidates, test_runner, args.evals))]
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return rows
+
+
+def bench_docker(candidates, test_runner, args):
+    from src.reason_code.executor.sandbox import PersistentSandbox
+
+    rows = []
+    for label, use_runner in (("exec_run", False), ("runner", True)):
+        sandbox = PersistentSandbox(use_runner=use_runner)
+
+        def run(code, test_runner):
+            result = sandbox.execute_code(code, test_runner)
+            return result.exit_code, result.stderr or result.stdout
+
+        try:
+            rows.append((label, timed(run, candidates, test_runner, args.evals)))
+        finally:
+            sandbox.cleanup()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--evals", type=int, default=100)
+    parser.add_argument("--asserts", type=int, default=200)
+    parser.add_argument("--backend", choices=["auto", "docker", "local"], default="auto")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    backend = args.backend
+    if backend == "auto":
+        backend = "docker" if docker_available() else "local"
+    candidates, test_runner = make_problem(args.asserts)
+    print(f"🏃 后端: {backend}，{args.evals} 次评估，harness {len(test_runner.splitlines())} 行\n")
+    rows = bench_docker(candidates, test_runner, args) if backend == "docker" else bench_local(candidates, test_runner, args)
+    print(f"{'path':>10} | {'p50 ms':>7} | {'p95 ms':>7} | {'speedup':>7}")
+    print("-" * 42)
+    base = rows[0][1][0]
+    for label, (p50, p95) in rows:
+        print(f"{label:>10} | {p50:>7.2f} | {p95:>7.2f} | {base / p50:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
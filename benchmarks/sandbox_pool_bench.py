@@ -0,0 +1,107 @@
+"""
+沙箱池吞吐 Benchmark：池大小 1 / 4 / 8 时 evaluate_candidates_async 每秒完成的评估数
+
+走真实的评估路径 (语法 -> 静态分析 -> 从池里借容器执行)，容器两种后端：
+  - docker: 真实的 PersistentSandbox (需要 Docker daemon)
+  - sim:    成本模型，每次执行占用容器 --exec-ms 毫秒 (docker exec + 解释器启动的量级)
+auto 在 Docker 可用时用 docker，否则用 sim；池大小 1 相当于改动前所有评估共用一个容器
+用法: python benchmarks/sandbox_pool_bench.py --sizes 1 4 8 --candidates 64
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.executor import sandbox_pool
+from src.reason_code.executor.evaluator import evaluate_candidates_async
+from src.reason_code.executor.sandbox_pool import SandboxPool
+
+
+class SimulatedSandbox:
+    """一个容器同一时刻只能跑一个进程：执行互斥地占用 exec_s 秒"""
+
+    def __init__(self, exec_s: float):
+        self.exec_s = exec_s
+        self._busy = threading.Lock()
+
+    def execute_code(self, code: str, test_runner: str):
+        with self._busy:
+            time.sleep(self.exec_s)
+        return 0, "ok", ""
+
+    def is_healthy(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        pass
+
+
+def docker_available() -> bool:
+    try:
+        import docker
+        docker.from_env().ping()
+        return True
+    except Exception:
+        return False
+
+
+async def run(size: int, factory, candidates, test_runner: str, rounds: int) -> float:
+    pool = SandboxPool(size=size, factory=factory)
+    pool.start()
+    # 默认执行器的线程数跟 CPU 核数走，小机器上会先于沙箱池成为瓶颈
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=size + 4))
+    sandbox_pool._pool = pool
+    try:
+        await evaluate_candidates_async(candidates[:size], test_runner)  # 预热：等容器就绪
+        start = time.perf_counter()
+        for _ in range(rounds):
+            results = await evaluate_candidates_async(candidates, test_runner)
+            failed = [r for r in results if not r["overall"]["passed"]]
+            assert not failed, failed[0]
+        return rounds * len(candidates) / (time.perf_counter() - start)
+    finally:
+        sandbox_pool._pool = None
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--candidates", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--backend", choices=["auto", "docker", "sim"], default="auto")
+    parser.add_argument("--exec-ms", type=float, default=80.0)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    backend = args.backend
+    if backend == "auto":
+        backend = "docker" if docker_available() else "sim"
+    if backend == "docker":
+        from src.reason_code.executor.sandbox import PersistentSandbox
+        factory = PersistentSandbox
+    else:
+        factory = lambda: SimulatedSandbox(args.exec_ms / 1000)
+
+    candidates = [f"def add(a, b):\n    return a + b + {i} - {i}" for i in range(args.candidates)]
+    test_runner = "    assert add(1, 2) == 3"
+    print(f"🐳 后端: {backend}，每轮 {args.candidates} 个候选 x {args.rounds} 轮\n")
+    print(f"{'pool':>5} | {'evals/s':>8} | {'speedup':>7}")
+    print("-" * 28)
+    base = None
+    for size in args.sizes:
+        rate = asyncio.run(run(size, factory, candidates, test_runner, args.rounds))
+        base = base or rate
+        print(f"{size:>5} | {rate:>8.1f} | {rate / base:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
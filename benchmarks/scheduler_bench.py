@@ -0,0 +1,123 @@
+"""
+推理调度器吞吐 Benchmark：多线程直接调用 vs 连续批处理调度器
+
+模拟 1/4/16 个并发搜索，每个搜索串行发起若干次 generate_code_candidates (n=3)，
+统计总墙钟时间、请求吞吐与平均批大小
+用法:
+  python benchmarks/scheduler_bench.py                # 真实本地模型
+  python benchmarks/scheduler_bench.py --simulate     # 用成本模型代替真实推理
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import threading
+from typing import List, Optional
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.models import llm
+from src.reason_code.models.llm import LocalLoraModel, generate_code_candidates
+from src.reason_code.models.router import router
+from src.reason_code.models.scheduler import get_scheduler
+
+
+class SimulatedModel(LocalLoraModel):
+    """
+    CPU 推理的成本模型：解码受内存带宽限制，一步的耗时几乎与批大小无关
+    单副本模型同一时刻只能跑一个 forward，用锁模拟线程间的争抢
+    """
+
+    PREFILL_S = 0.05
+    STEP_S = 0.004
+    STEP_PER_ROW_S = 0.0003
+    NEW_TOKENS = 64
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def _decode_cost(self, rows: int) -> float:
+        return self.NEW_TOKENS * (self.STEP_S + self.STEP_PER_ROW_S * rows)
+
+    def generate(self, code_snippet: str, num_return_sequences: int = 3, batched: Optional[bool] = None,
+                 prefix_hint: Optional[str] = None, decoding: Optional[str] = None) -> List[str]:
+        with self._lock:
+            time.sleep(self.PREFILL_S + self._decode_cost(num_return_sequences))
+        self.metrics["calls"] += 1
+        self.metrics["batches"] += 1
+        self.metrics["sequences"] += num_return_sequences
+        return [f"def solution():\n    return {i}" for i in range(num_return_sequences)]
+
+    def generate_batch(self, prompts, ns, prefix_hints=None, contexts=None, decoding=None) -> List[List[str]]:
+        with self._lock:
+            time.sleep(self.PREFILL_S * len(prompts) + self._decode_cost(sum(ns)))
+        self.metrics["calls"] += len(prompts)
+        self.metrics["batches"] += 1
+        self.metrics["sequences"] += sum(ns)
+        return [[f"def solution():\n    return {i}" for i in range(n)] for n in ns]
+
+
+_run_counter = 0
+
+
+async def one_search(run_id: int, search_id: int, simulations: int):
+    for i in range(simulations):
+        # 每次 prompt 都不同，避免命中候选缓存
+        prompt = f"当前代码:\n```python\ndef f_{run_id}_{search_id}_{i}(x):\n    return x - 1\n```\n\n请修复代码使其通过测试。只返回修复后的Python代码。"
+        await generate_code_candidates(prompt, n=3)
+
+
+async def bench(concurrency: int, simulations: int, use_scheduler: bool) -> dict:
+    global _run_counter
+    _run_counter += 1
+    llm.LLM_SCHEDULER = use_scheduler
+    model = router.local_model
+    batches_before = model.metrics["batches"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_search(_run_counter, s, simulations) for s in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    requests = concurrency * simulations
+    batches = model.metrics["batches"] - batches_before
+    return {
+        "wall": wall,
+        "req_per_s": requests / wall if wall > 0 else 0.0,
+        "avg_batch": (requests * 3) / batches if batches else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--simulate", action="store_true", help="用成本模型代替真实模型")
+    parser.add_argument("--simulations", type=int, default=4, help="每个搜索的扩展次数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    if args.simulate:
+        router.local_model = SimulatedModel()
+    elif not router.local_model.initialize() and not router.local_model._initialized:
+        print("❌ 本地模型不可用，请检查 LORA_MODEL_PATH / BASE_MODEL_NAME，或使用 --simulate")
+        return
+
+    # 不读写磁盘缓存层，避免污染共享缓存
+    llm._candidate_cache.disk = None
+
+    print(f"{'searches':>8} | {'mode':>9} | {'wall s':>7} | {'req/s':>6} | {'rows/batch':>10} | {'speedup':>7}")
+    print("-" * 64)
+    for c in args.concurrency:
+        threaded = await bench(c, args.simulations, use_scheduler=False)
+        scheduled = await bench(c, args.simulations, use_scheduler=True)
+        speedup = threaded["wall"] / scheduled["wall"] if scheduled["wall"] else 0.0
+        print(f"{c:>8} | {'threads':>9} | {threaded['wall']:>7.2f} | {threaded['req_per_s']:>6.2f} | {threaded['avg_batch']:>10.1f} | {'1.00x':>7}")
+        print(f"{c:>8} | {'scheduler':>9} | {scheduled['wall']:>7.2f} | {scheduled['req_per_s']:>6.2f} | {scheduled['avg_batch']:>10.1f} | {speedup:>6.2f}x")
+
+    print(f"\n📊 scheduler stats: {get_scheduler(router.local_model).snapshot()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+投机解码 Benchmark：普通采样 vs prompt-lookup 投机解码
+
+在记录下来的修复 prompt (logs/fail_cases.jsonl，不存在时用内置样例) 上各生成一个修复候选，
+统计 tokens/s、草稿接受率、每次前向产出的 token 数以及相对普通采样的加速比
+用法: python benchmarks/speculative_bench.py --cases 8 --repeats 2
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+from typing import List
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.models.llm import _local_model
+from src.reason_code.agent.reflexion import construct_fix_prompt
+
+# 没有失败日志时使用的修复样例 (代码, 报错, 测试)
+BUILTIN_CASES = [
+    (
+        "def running_mean(xs):\n    total = 0\n    out = []\n    for i, x in enumerate(xs):\n"
+        "        total += x\n        out.append(total / i)\n    return out",
+        "ZeroDivisionError: division by zero",
+        "assert running_mean([2, 4]) == [2.0, 3.0]",
+    ),
+    (
+        "def is_palindrome(s):\n    s = ''.join(c.lower() for c in s if c.isalnum())\n"
+        "    for i in range(len(s)):\n        if s[i] != s[len(s) - i]:\n            return False\n    return True",
+        "IndexError: string index out of range",
+        "assert is_palindrome('A man, a plan, a canal: Panama')",
+    ),
+    (
+        "def merge_intervals(intervals):\n    intervals.sort()\n    merged = [intervals[0]]\n"
+        "    for start, end in intervals[1:]:\n        if start <= merged[-1][1]:\n"
+        "            merged[-1][1] = end\n        else:\n            merged.append([start, end])\n    return merged",
+        "AssertionError: [[1, 4]] != [[1, 5]]",
+        "assert merge_intervals([[1, 5], [2, 4]]) == [[1, 5]]",
+    ),
+]
+
+
+def load_repair_prompts(path: str, limit: int) -> List[str]:
+    prompts = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    case = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if case.get("candidate") and case.get("stderr"):
+                    prompts.append(construct_fix_prompt(case["candidate"], case["stderr"], case.get("test_case", "")))
+                if len(prompts) >= limit:
+                    break
+    if not prompts:
+        print(f"⚠️  {path} 中没有可用记录，使用内置样例")
+        prompts = [construct_fix_prompt(*case) for case in BUILTIN_CASES][:limit]
+    return prompts
+
+
+def bench_mode(decoding: str, prompts: List[str], repeats: int) -> dict:
+    metrics = _local_model.metrics
+    before = dict(metrics)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for prompt in prompts:
+            _local_model.generate(prompt, 1, decoding=decoding)
+    wall = time.perf_counter() - start
+
+    delta = {k: metrics[k] - before[k] for k in metrics}
+    return {
+        "wall": wall,
+        "tokens_per_s": delta["new_tokens"] / wall if wall > 0 else 0.0,
+        "acceptance": delta["spec_accepted"] / delta["spec_drafted"] if delta["spec_drafted"] else 0.0,
+        "tokens_per_forward": delta["spec_new_tokens"] / delta["spec_forward_passes"] if delta["spec_forward_passes"] else 1.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default="logs/fail_cases.jsonl", help="记录下来的失败用例")
+    parser.add_argument("--cases", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    if not _local_model.initialize() and not _local_model._initialized:
+        print("❌ 本地模型不可用，请检查 LORA_MODEL_PATH / BASE_MODEL_NAME")
+        return
+
+    prompts = load_repair_prompts(args.log, args.cases)
+    print(f"🧪 {len(prompts)} 个修复 prompt x {args.repeats} 次")
+
+    # 预热一次，排除首次调用的开销
+    _local_model.generate(prompts[0], 1)
+
+    sample = bench_mode("sample", prompts, args.repeats)
+    lookup = bench_mode("prompt_lookup", prompts, args.repeats)
+
+    print(f"{'mode':>13} | {'wall s':>7} | {'tokens/s':>9} | {'accept':>6} | {'tok/fwd':>7} | {'speedup':>7}")
+    print("-" * 64)
+    for mode, res in (("sample", sample), ("prompt_lookup", lookup)):
+        speedup = res["tokens_per_s"] / sample["tokens_per_s"] if sample["tokens_per_s"] else 0.0
+        print(f"{mode:>13} | {res['wall']:>7.2f} | {res['tokens_per_s']:>9.1f} | {res['acceptance']:>6.1%} | {res['tokens_per_forward']:>7.2f} | {speedup:>6.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+冷启动 Benchmark：import 各入口模块的耗时，以及按顶层包汇总的 -X importtime 明细
+
+同时检查重量级依赖 (torch / transformers / peft / docker / phoenix) 没有在 import 时被加载，
+超出 --budget-ms 或加载了禁止的模块时以非零状态退出，可放进 CI 防止回退
+用法: python benchmarks/startup_bench.py --top 10 --budget-ms 1500
+"""
+import sys
+import os
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = [
+    "src.reason_code.agent.mcts",
+    "src.reason_code.api.app",
+    "src.reason_code.executor.evaluator",
+]
+HEAVY_MODULES = ["torch", "transformers", "peft", "docker", "phoenix", "openinference"]
+
+
+def profile_import(module: str) -> Tuple[float, List[Tuple[str, int, int]], List[str]]:
+    """在干净的子进程里 import 模块，返回 (墙钟秒数, [(模块, self_us, cumulative_us)], 已加载的重量级模块)"""
+    code = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, cwd=ROOT)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    loaded = [m for m in proc.stdout.strip().splitlines()[-1].split(",") if m] if proc.stdout.strip() else []
+    return wall, entries, loaded
+
+
+def by_package(entries: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """按顶层包汇总 self 时间 (微秒)"""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in entries:
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=TARGETS)
+    parser.add_argument("--top", type=int, default=8, help="每个模块展示耗时最多的顶层包数")
+    parser.add_argument("--budget-ms", type=float, default=0, help="单个模块 import 的耗时上限 (0 表示不检查)")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        wall, entries, loaded = profile_import(module)
+        cumulative = next((cum for name, _, cum in entries if name == module), 0) / 1000
+        print(f"\n📦 {module}: import {cumulative:.0f} ms (process wall {wall * 1000:.0f} ms)")
+        for package, us in sorted(by_package(entries).items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {package:<28} {us / 1000:>8.1f} ms")
+
+        if loaded:
+            print(f"    ❌ heavy modules imported eagerly: {', '.join(loaded)}")
+            failed = True
+        if args.budget_ms and cumulative > args.budget_ms:
+            print(f"    ❌ over budget: {cumulative:.0f} ms > {args.budget_ms:.0f} ms")
+            failed = True
+
+    print("\n" + ("❌ startup regression detected" if failed else "✅ startup within limits"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+搜索树存储 Benchmark：Node 对象树 vs CompactTree (NumPy 数组 + 旁表)
+
+对 10^3 ~ 10^6 个节点的随机树 (每个节点挂 --branching 个子节点，访问数/奖励随机) 统计：
+向量化 UCB 的收益随分支数增大：分支很少时 NumPy 的调用开销会抵消掉向量化带来的收益
+  - 内存：tracemalloc 统计的构建峰值 (包含代码旁表)
+  - 选择吞吐：从根走到叶子的 UCB 选择次数 / 秒
+另外对比节点的代码与评估信息存储：raw (改动前：全文 + 原样的评估信息) / full (评估信息截断并 intern) /
+diff (再加上代码按父节点差分)。子节点是父节点改动一两行的 ~40 行函数，评估结果带一段几 KB 的 traceback，
+统计构建后常驻的字节数 / 节点与还原一个节点代码的耗时
+用法: python benchmarks/tree_bench.py --sizes 1000 10000 100000 1000000 --code-sizes 1000 10000 50000
+"""
+import gc
+import sys
+import os
+import time
+import random
+import argparse
+import tracemalloc
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.agent import mcts as mcts_module
+from src.reason_code.agent import compact_tree as compact_module
+from src.reason_code.agent.mcts import Node, EnhancedMCTS
+from src.reason_code.agent.compact_tree import CompactTree, CompactMCTS
+from src.reason_code.agent.code_store import compact_evaluation
+
+
+def tree_shape(n: int, branching: int, seed: int):
+    """按层展开的树：返回 (parent, visits, wins) 列表，父节点下标总小于子节点"""
+    rng = random.Random(seed)
+    shape = [(-1, 0, 0.0)]
+    frontier, i = [0], 0
+    while len(shape) < n:
+        parent = frontier[i]
+        i += 1
+        for _ in range(min(branching, n - len(shape))):
+            visits = rng.randint(1, 50)
+            shape.append((parent, visits, visits * rng.random()))
+            frontier.append(len(shape) - 1)
+    return shape
+
+
+def build_nodes(shape):
+    nodes = []
+    for idx, (parent, visits, wins) in enumerate(shape):
+        node = Node(code=f"def f():\n    return {idx}", parent=nodes[parent] if parent >= 0 else None,
+                    visits=visits, wins=wins)
+        if parent >= 0:
+            nodes[parent].children.append(node)
+        nodes.append(node)
+    # 根的访问数等于子节点之和，保证 log(parent_visits) 有意义
+    nodes[0].visits = sum(c.visits for c in nodes[0].children)
+    return nodes[0]
+
+
+def build_compact(shape):
+    tree = CompactTree("def f():\n    return 0", capacity=len(shape))
+    # 同一父节点的子节点在 shape 中相邻，按父节点整批插入
+    idx = 1
+    while idx < len(shape):
+        parent = shape[idx][0]
+        end = idx
+        while end < len(shape) and shape[end][0] == parent:
+            end += 1
+        ids = tree.add_children(parent, [f"def f():\n    return {i}" for i in range(idx, end)])
+        tree.visits[ids] = [v for _, v, _ in shape[idx:end]]
+        tree.wins[ids] = [w for _, _, w in shape[idx:end]]
+        idx = end
+    tree.visits[0] = tree.visits[tree.children(0)].sum()
+    return tree
+
+
+def select_nodes(root: Node) -> Node:
+    node = root
+    while node.children:
+        node = max(node.children, key=lambda n: n.ucb_score())
+    return node
+
+
+def measure(build, shape):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = build(shape)
+    build_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tree, build_s, peak
+
+
+def throughput(fn, min_s: float = 0.5) -> float:
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < min_s:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def code_tree(n: int, seed: int):
+    """(parent, code, traceback) 列表：子节点在父节点代码上改一两行"""
+    rng = random.Random(seed)
+    root = "def solve(xs):\n" + "".join(f"    v{i} = xs[{i}] if len(xs) > {i} else 0\n" for i in range(38)) + "    return v0\n"
+    nodes = [(-1, root, "")]
+    for parent, _, _ in tree_shape(n, 8, seed)[1:]:
+        lines = nodes[parent][1].splitlines(keepends=True)
+        for _ in range(rng.randint(1, 2)):
+            i = rng.randrange(1, len(lines))
+            lines[i] = f"    v{i} = xs[{i}] * {rng.randint(2, 99)} if xs else {rng.randint(0, 9)}\n"
+        frames = "".join(f'  File "<string>", line {rng.randint(1, 40)}, in solve\n    v = helper_{k}(xs)\n'
+                         for k in range(rng.randint(20, 60)))
+        trace = f"测试失败: Traceback (most recent call last):\n{frames}AssertionError: expected {rng.randint(0, 99)}"
+        nodes.append((parent, "".join(lines), trace))
+    return nodes
+
+
+def build_search(cls, nodes, diff_code: bool):
+    search = cls(root_code=nodes[0][1], diff_code=diff_code)
+    handles = [search.root]
+    for parent, code, trace in nodes[1:]:
+        # 复制一份，模拟 LLM / 沙箱每次返回新的字符串对象
+        evaluation = {"level_1": {"passed": True, "message": "syntax ok"},
+                      "level_2": {"passed": True, "message": "static ok"},
+                      "level_3": {"passed": False, "message": trace.encode().decode()},
+                      "overall": {"passed": False, "failed_at": "level_3", "reward": 0.7}}
+        handles.append(search._add_child(handles[parent], code.encode().decode(), evaluation))
+    return search, handles
+
+
+def measure_store(cls, nodes, diff_code: bool, truncate: bool, seed: int):
+    # raw: 改动之前的行为，评估信息原样保存
+    mcts_module.compact_evaluation = compact_module.compact_evaluation = compact_evaluation if truncate else (lambda e: e)
+    # Node 树有父子循环引用，靠 GC 回收；上一轮的树不回收干净会与本轮共享 intern 过的评估信息
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    search, handles = build_search(cls, nodes, diff_code)
+    build_s = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(seed)
+    picks = [handles[rng.randrange(len(handles))] for _ in range(2000)]
+    start = time.perf_counter()
+    for h in picks:
+        search._node_code(h)
+    get_us = (time.perf_counter() - start) / len(picks) * 1e6
+    return build_s, retained, get_us
+
+
+def code_storage(args):
+    print("📦 节点代码存储：全文 vs 差分\n")
+    print(f"{'nodes':>9} | {'store':>14} | {'build s':>7} | {'B/node':>7} | {'get us':>7}")
+    print("-" * 56)
+    for n in args.code_sizes:
+        nodes = code_tree(n, args.seed)
+        for cls in (EnhancedMCTS, CompactMCTS):
+            for label, diff_code, truncate in (("raw", False, False), ("full", False, True), ("diff", True, True)):
+                build_s, retained, get_us = measure_store(cls, nodes, diff_code, truncate, args.seed)
+                name = f"{'Node' if cls is EnhancedMCTS else 'Compact'}+{label}"
+                print(f"{n:>9} | {name:>14} | {build_s:>7.2f} | {retained // n:>7} | {get_us:>7.1f}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--branching", type=int, nargs="+", default=[8, 64])
+    parser.add_argument("--code-sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for branching in args.branching:
+        print(f"🌲 随机树，每个节点 {branching} 个子节点\n")
+        print(f"{'nodes':>9} | {'store':>7} | {'build s':>7} | {'peak MB':>8} | {'B/node':>6} | {'select/s':>9}")
+        print("-" * 62)
+        for n in args.sizes:
+            shape = tree_shape(n, branching, args.seed)
+            root, build_s, peak = measure(build_nodes, shape)
+            rate = throughput(lambda: select_nodes(root))
+            print(f"{n:>9} | {'Node':>7} | {build_s:>7.2f} | {peak / 2**20:>8.1f} | {peak // n:>6} | {rate:>9.0f}")
+            root = None  # 先释放，再测 CompactTree 的峰值内存
+
+            tree, build_s, peak = measure(build_compact, shape)
+            rate = throughput(lambda: tree.select())
+            print(f"{n:>9} | {'Compact':>7} | {build_s:>7.2f} | {peak / 2**20:>8.1f} | {peak // n:>6} | {rate:>9.0f}")
+            tree = None
+        print()
+    code_storage(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+渐进展开 + 自适应候选数 Benchmark：对比固定宽度展开，统计每解出一个问题所需的 LLM 调用数
+
+LLM 与评估器用质量模型代替：每个候选带一个隐含质量 q，子候选的 q = 父节点 q + 高斯噪声
+  q < 0.2  -> 语法错误 (reward 0.0)
+  q < 0.45 -> 静态检查失败 (0.3)
+  q < 0.85 -> 运行时失败 (0.7)
+  否则通过 (1.0)
+搜索在第一个通过的候选处停止 (anytime 模式)，达到 --simulations 仍未通过记为未解出
+用法: python benchmarks/widening_bench.py --problems 200 --simulations 40
+"""
+import sys
+import os
+import random
+import asyncio
+import argparse
+from typing import List
+
+# 确保能导入 src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reason_code.agent import mcts as mcts_module
+from src.reason_code.agent import reflexion
+from src.reason_code.executor import evaluator
+from src.reason_code.agent.mcts import EnhancedMCTS
+
+
+class QualityModel:
+    def __init__(self, seed: int, drift: float, noise: float):
+        self.rng = random.Random(seed)
+        self.drift = drift
+        self.noise = noise
+        self.calls = 0
+        self.candidates = 0
+        self.sandbox_runs = 0
+        self._counter = 0
+
+    @staticmethod
+    def quality(code: str) -> float:
+        return float(code.split("q = ", 1)[1].split("\n", 1)[0])
+
+    async def generate(self, prompt: str, n: int = 3, **kwargs) -> List[str]:
+        self.calls += 1
+        self.candidates += n
+        parent_q = self.quality(prompt)
+        out = []
+        for _ in range(n):
+            self._counter += 1
+            q = parent_q + self.rng.gauss(self.drift, self.noise)
+            out.append(f"q = {q:.4f}\nvariant = {self._counter}\n")
+        return out
+
+    def _evaluate_one(self, code: str) -> dict:
+        q = self.quality(code)
+        if q < 0.2:
+            return {"level_1": {"passed": False, "message": "SyntaxError"},
+                    "overall": {"reward": 0.0, "failed_at": "level_1"}}
+        if q < 0.45:
+            return {"level_1": {"passed": True}, "level_2": {"passed": False, "message": "static check failed"},
+                    "overall": {"reward": 0.3, "failed_at": "level_2"}}
+        self.sandbox_runs += 1
+        if q < 0.85:
+            return {"level_1": {"passed": True}, "level_2": {"passed": True},
+                    "level_3": {"passed": False, "message": "AssertionError"},
+                    "overall": {"reward": 0.7, "failed_at": "level_3"}}
+        return {"level_1": {"passed": True}, "level_2": {"passed": True}, "level_3": {"passed": True},
+                "overall": {"reward": 1.0, "failed_at": None}}
+
+    async def evaluate(self, candidates: List[str], test_runner: str, prompt: str = "") -> List[dict]:
+        return [self._evaluate_one(c) for c in candidates]
+
+
+def install(model: QualityModel):
+    mcts_module.generate_code_candidates = model.generate
+    mcts_module.simple_retrieve = lambda code, k=3: []
+    evaluator.evaluate_candidates_async = model.evaluate
+
+    async def no_fix(code, error_msg, test_runner, decoding=None):
+        return code
+    reflexion.attempt_fix = no_fix
+
+
+async def run_policy(widening: bool, args) -> dict:
+    model = QualityModel(args.seed, args.drift, args.noise)
+    install(model)
+    solved = 0
+    for problem in range(args.problems):
+        root_q = random.Random(args.seed * 1000 + problem).uniform(0.2, 0.5)
+        search = EnhancedMCTS(root_code=f"q = {root_q:.4f}\n", n_simulations=args.simulations,
+                              n_candidates=args.candidates, parallelism=1, progressive_widening=widening)
+        result = await search.run_anytime("assert True")
+        solved += result.stop_reason == "solved"
+    return {"solved": solved, "calls": model.calls, "candidates": model.candidates, "sandbox": model.sandbox_runs}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problems", type=int, default=200)
+    parser.add_argument("--simulations", type=int, default=40)
+    parser.add_argument("--candidates", type=int, default=3)
+    parser.add_argument("--drift", type=float, default=0.03, help="每次修复质量的平均提升")
+    parser.add_argument("--noise", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"🧪 {args.problems} 个问题，每个最多 {args.simulations} 次模拟，基准候选数 {args.candidates}\n")
+    print(f"{'policy':>10} | {'solved':>7} | {'LLM calls':>9} | {'calls/solved':>12} | {'cands/solved':>12} | {'sandbox/solved':>14}")
+    print("-" * 80)
+    for name, widening in (("fixed", False), ("widening", True)):
+        res = await run_policy(widening, args)
+        per = lambda key: res[key] / res["solved"] if res["solved"] else float("nan")
+        print(f"{name:>10} | {res['solved']:>7} | {res['calls']:>9} | {per('calls'):>12.2f} | "
+              f"{per('candidates'):>12.2f} | {per('sandbox'):>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
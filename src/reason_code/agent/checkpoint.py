@@ -0,0 +1,100 @@
+"""
+搜索树检查点
+- 按 (root_code, test_runner) 的哈希保存，同一任务重试或再次提交时从已有的树继续搜索
+- 格式：gzip 压缩的 JSON，节点按列存放 (parent / visits / wins / code / evaluation)，父节点下标总小于子节点
+- 评估结果只保留构造 Prompt 需要的摘要 (overall + 失败那一级的信息)
+- 先写临时文件再 os.replace，崩溃时不会留下写了一半的检查点
+"""
+import os
+import gzip
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+CHECKPOINT_VERSION = 1
+# 失败信息只保留开头，避免检查点被长 traceback 撑大
+_MAX_MESSAGE_CHARS = 2000
+
+
+def checkpoint_key(root_code: str, test_runner: str) -> str:
+    return hashlib.sha256(f"{root_code}\0{test_runner}".encode("utf-8")).hexdigest()
+
+
+def checkpoint_path(directory: str, key: str) -> str:
+    return os.path.join(directory, f"{key}.json.gz")
+
+
+def summarize_evaluation(evaluation: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not evaluation:
+        return None
+    overall = evaluation.get("overall", {})
+    summary = {"overall": overall}
+    failed_at = overall.get("failed_at")
+    if failed_at and failed_at in evaluation:
+        level = evaluation[failed_at]
+        summary[failed_at] = {"passed": level.get("passed", False),
+                              "message": str(level.get("message", ""))[:_MAX_MESSAGE_CHARS]}
+    return summary
+
+
+def snapshot(search, completed: int, finished: bool) -> Dict[str, Any]:
+    """把搜索树展开成按列存放的节点表 (广度优先，根节点下标为 0)"""
+    columns = {"parent": [], "visits": [], "wins": [], "code": [], "evaluation": []}
+    queue = [(search.root, -1)]
+    for node, parent in queue:
+        index = len(columns["parent"])
+        columns["parent"].append(parent)
+        columns["visits"].append(search._visits(node))
+        columns["wins"].append(search._wins(node))
+        columns["code"].append(search._node_code(node))
+        columns["evaluation"].append(summarize_evaluation(search._node_evaluation(node)))
+        queue.extend((child, index) for child in search._children(node))
+    return {
+        "version": CHECKPOINT_VERSION,
+        "completed": completed,
+        "finished": finished,
+        "nodes": columns,
+    }
+
+
+def restore(search, data: Dict[str, Any]) -> int:
+    """把检查点里的节点接到 search 的 (空) 根节点下，返回恢复的节点数 (不含根)"""
+    nodes = data["nodes"]
+    handles = [search.root]
+    search._set_node_stats(search.root, nodes["visits"][0], nodes["wins"][0])
+    for i in range(1, len(nodes["parent"])):
+        child = search._add_child(handles[nodes["parent"][i]], nodes["code"][i], nodes["evaluation"][i] or {})
+        search._set_node_stats(child, nodes["visits"][i], nodes["wins"][i])
+        handles.append(child)
+    return len(handles) - 1
+
+
+def save_checkpoint(search, directory: str, key: str, completed: int, finished: bool) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = checkpoint_path(directory, key)
+    payload = json.dumps(snapshot(search, completed, finished), ensure_ascii=False, separators=(",", ":"))
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    return path
+
+
+def load_checkpoint(directory: str, key: str) -> Optional[Dict[str, Any]]:
+    path = checkpoint_path(directory, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, EOFError, ValueError) as e:
+        logger.warning("checkpoint_unreadable", path=path, error=str(e))
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        logger.warning("checkpoint_version_mismatch", path=path, version=data.get("version"))
+        return None
+    return data
@@ -0,0 +1,138 @@
+"""
+节点代码的差分存储
+- 子节点大多是父节点的小改动：按行与父节点求差分，只存 (复制父节点行区间 / 新增文本) 序列 (marshal 编码)
+- 每隔 keyframe_interval 层 (或差分不比原文小时) 存一份 zlib 压缩的全文，限制还原时回溯的链长
+- 最近读取的节点全文放在 LRU 缓存里，选择路径上的热节点不必反复还原
+- compact_evaluation: 截断过长的评估信息并 intern，相同的报错在兄弟节点之间共享一份字符串
+"""
+import sys
+import zlib
+import marshal
+import difflib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from src.reason_code.utils.config import MCTS_CODE_CACHE_SIZE, MCTS_KEYFRAME_INTERVAL, MCTS_EVAL_MESSAGE_CHARS
+
+_KEYFRAME = -1
+
+
+class CodeStore:
+    """按追加顺序编号的代码存储，add() 返回编号，get() / [] 还原全文"""
+
+    def __init__(self, keyframe_interval: int = MCTS_KEYFRAME_INTERVAL, cache_size: int = MCTS_CODE_CACHE_SIZE):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.cache_size = cache_size
+        self._base = array("i")  # 差分所基于的编号，_KEYFRAME 表示全文
+        self._depth = array("H")  # 距最近一份全文的差分层数
+        self._blobs: List[bytes] = []
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def __getitem__(self, ref):
+        if isinstance(ref, slice):
+            return [self.get(i) for i in range(*ref.indices(len(self)))]
+        return self.get(ref)
+
+    def add(self, code: str, base: Optional[int] = None) -> int:
+        """存入 code；给出 base 时尝试存成相对 base 的差分"""
+        ref = len(self._blobs)
+        blob = None
+        if base is not None and self._depth[base] + 1 < self.keyframe_interval:
+            delta = self._encode(self.get(base), code)
+            if len(delta) < len(code.encode("utf-8")):
+                blob, depth = delta, self._depth[base] + 1
+        if blob is None:
+            blob, base, depth = zlib.compress(code.encode("utf-8"), 6), _KEYFRAME, 0
+        self._base.append(base)
+        self._depth.append(depth)
+        self._blobs.append(blob)
+        self._remember(ref, code)
+        return ref
+
+    def get(self, ref: int) -> str:
+        code = self._cache.get(ref)
+        if code is not None:
+            self._cache.move_to_end(ref)
+            return code
+        # 往上找到缓存命中或全文，再依次应用差分
+        chain = []
+        cur = ref
+        while True:
+            code = self._cache.get(cur)
+            if code is not None:
+                break
+            if self._base[cur] == _KEYFRAME:
+                code = zlib.decompress(self._blobs[cur]).decode("utf-8")
+                break
+            chain.append(cur)
+            cur = self._base[cur]
+        for cur in reversed(chain):
+            code = self._decode(code, self._blobs[cur])
+        self._remember(ref, code)
+        return code
+
+    def _remember(self, ref: int, code: str) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[ref] = code
+        self._cache.move_to_end(ref)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _encode(base: str, code: str) -> bytes:
+        """差分：整数对 (a, b) 表示复制 base 的第 a..b 行，字符串表示新增文本"""
+        a, b = base.splitlines(keepends=True), code.splitlines(keepends=True)
+        ops: List[Any] = []
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+            if tag == "equal":
+                ops += (i1, i2)
+            elif j2 > j1:
+                ops.append("".join(b[j1:j2]))
+        return marshal.dumps(tuple(ops))
+
+    @staticmethod
+    def _decode(base: str, blob: bytes) -> str:
+        lines = base.splitlines(keepends=True)
+        ops = marshal.loads(blob)
+        out, i = [], 0
+        while i < len(ops):
+            op = ops[i]
+            if isinstance(op, str):
+                out.append(op)
+                i += 1
+            else:
+                out.extend(lines[op:ops[i + 1]])
+                i += 2
+        return "".join(out)
+
+    @property
+    def nbytes(self) -> int:
+        """编码后的数据 + 每条记录的对象开销 (不含 LRU 缓存)"""
+        blobs = sum(sys.getsizeof(b) for b in self._blobs) + sys.getsizeof(self._blobs)
+        return blobs + self._base.buffer_info()[1] * self._base.itemsize + self._depth.buffer_info()[1] * self._depth.itemsize
+
+
+def _shorten(message: str, limit: int) -> str:
+    if len(message) <= limit:
+        return sys.intern(message)
+    # traceback 的关键信息在末尾：保留开头四分之一和结尾四分之三
+    head = limit // 4
+    tail = limit - head
+    return sys.intern(f"{message[:head]}\n... [truncated {len(message) - limit} chars] ...\n{message[-tail:]}")
+
+
+def compact_evaluation(evaluation: Optional[Dict[str, Any]], limit: int = MCTS_EVAL_MESSAGE_CHARS) -> Optional[Dict[str, Any]]:
+    """截断并 intern 各级评估信息，返回新的字典 (不修改传入的评估结果)"""
+    if not evaluation:
+        return evaluation
+    out = {}
+    for key, value in evaluation.items():
+        if isinstance(value, dict) and isinstance(value.get("message"), str):
+            value = dict(value, message=_shorten(value["message"], limit))
+        out[key] = value
+    return out
@@ -0,0 +1,248 @@
+"""
+数组存储的紧凑搜索树
+- 访问次数 / 累计奖励 / 虚拟损失 / 父节点 / 子节点区间存在可增长的 NumPy 数组里，节点用整数下标表示
+- 一个节点所有子节点的 UCB 在一次向量化计算里完成
+- 代码与评估结果放在旁表里，只在构造 Prompt 和返回结果时访问；代码旁表可以换成差分存储的 CodeStore
+CompactMCTS 与 EnhancedMCTS 的 run() 接口一致，适合大模拟预算、长时间存活的搜索树
+"""
+import math
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import structlog
+
+from src.reason_code.agent.mcts import EnhancedMCTS, widening_limit
+from src.reason_code.agent.code_store import CodeStore, compact_evaluation
+from src.reason_code.utils.config import MCTS_C, MCTS_PW_C, MCTS_PW_ALPHA
+
+logger = structlog.get_logger(__name__)
+
+ROOT = 0
+
+
+class CompactTree:
+    """以整数下标表示节点的 MCTS 树，子节点下标连续存放在 child_index 中 (按节点记录起点与个数)"""
+
+    def __init__(self, root_code: str, capacity: int = 1024, code_store: Optional[CodeStore] = None):
+        capacity = max(capacity, 2)
+        self.size = 0
+        self.visits = np.zeros(capacity, dtype=np.float64)
+        self.wins = np.zeros(capacity, dtype=np.float64)
+        self.virtual_loss = np.zeros(capacity, dtype=np.float64)
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.child_start = np.zeros(capacity, dtype=np.int64)
+        self.child_count = np.zeros(capacity, dtype=np.int32)
+        self.child_index = np.zeros(capacity, dtype=np.int32)
+        self._child_used = 0
+        # 旁表：代码与评估结果；使用 CodeStore 时其编号与节点下标一致
+        self.codes = code_store if code_store is not None else []
+        self.evaluations: List[Any] = []
+        self._add_root(root_code)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def _grow(array: np.ndarray, needed: int, fill=0) -> np.ndarray:
+        if needed <= len(array):
+            return array
+        grown = np.full(max(needed, len(array) * 2), fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _reserve(self, n: int) -> None:
+        needed = self.size + n
+        if needed > len(self.visits):
+            self.visits = self._grow(self.visits, needed)
+            self.wins = self._grow(self.wins, needed)
+            self.virtual_loss = self._grow(self.virtual_loss, needed)
+            self.parent = self._grow(self.parent, needed, fill=-1)
+            self.child_start = self._grow(self.child_start, needed)
+            self.child_count = self._grow(self.child_count, needed)
+
+    def _append_child_slots(self, parent: int, n: int) -> int:
+        """为 parent 追加 n 个子节点位置，返回写入起点；区间不在 child_index 末尾时整体搬到末尾"""
+        start, count = int(self.child_start[parent]), int(self.child_count[parent])
+        if count and start + count != self._child_used:
+            # 被其他节点的扩展隔开了 (并行搜索中同一叶子被扩展两次)，旧区间留作空洞
+            self.child_index = self._grow(self.child_index, self._child_used + count + n)
+            self.child_index[self._child_used:self._child_used + count] = self.child_index[start:start + count]
+            start = self._child_used
+            self._child_used += count
+        elif not count:
+            start = self._child_used
+        self.child_index = self._grow(self.child_index, self._child_used + n)
+        self.child_start[parent] = start
+        self.child_count[parent] = count + n
+        self._child_used += n
+        return start + count
+
+    def _add_root(self, code: str) -> None:
+        self.size = 1
+        self._store_codes(-1, [code])
+        self.evaluations.append(None)
+
+    def add_node(self, parent: int, code: str, evaluation: Any = None) -> int:
+        return int(self.add_children(parent, [code], [evaluation])[0])
+
+    def add_children(self, parent: int, codes: List[str], evaluations: Optional[List[Any]] = None) -> np.ndarray:
+        n = len(codes)
+        self._reserve(n)
+        ids = np.arange(self.size, self.size + n, dtype=np.int32)
+        self.parent[ids] = parent
+        offset = self._append_child_slots(parent, n)
+        self.child_index[offset:offset + n] = ids
+        self.size += n
+        self._store_codes(parent, codes)
+        self.evaluations.extend(evaluations if evaluations is not None else [None] * n)
+        return ids
+
+    def _store_codes(self, parent: int, codes: List[str]) -> None:
+        if isinstance(self.codes, CodeStore):
+            for code in codes:
+                self.codes.add(code, base=parent if parent >= 0 else None)
+        else:
+            self.codes.extend(codes)
+
+    def children(self, node: int) -> np.ndarray:
+        start = self.child_start[node]
+        return self.child_index[start:start + self.child_count[node]]
+
+    def ucb_scores(self, node: int, c: float = MCTS_C) -> np.ndarray:
+        """node 所有子节点的 UCB (与 Node.ucb_score 相同的公式，在途模拟计为 0 奖励的访问)"""
+        kids = self.children(node)
+        visits = self.visits[kids] + self.virtual_loss[kids]
+        log_parent = math.log(max(self.visits[node] + self.virtual_loss[node], 1.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = self.wins[kids] / visits + c * np.sqrt(log_parent / visits)
+        scores[visits == 0] = np.inf
+        return scores
+
+    def _select_child(self, node: int, c: float) -> int:
+        start = self.child_start[node]
+        kids = self.child_index[start:start + self.child_count[node]]
+        visits = self.visits[kids]
+        visits += self.virtual_loss[kids]
+        # 未访问过的子节点 UCB 为无穷大，取第一个即可，不必算整组分数
+        unvisited = visits.argmin()
+        if visits[unvisited] == 0:
+            return int(kids[unvisited])
+        scores = np.sqrt(math.log(max(self.visits[node] + self.virtual_loss[node], 1.0)) / visits)
+        scores *= c
+        scores += self.wins[kids] / visits
+        # 平局时取第一个，与 max() 的行为一致
+        return int(kids[scores.argmax()])
+
+    def select(self, node: int = ROOT, c: float = MCTS_C, widening: Optional[Tuple[float, float]] = None) -> int:
+        """从 node 走到要扩展的节点；widening=(c, alpha) 时子节点数未达渐进展开上限的节点就地停下"""
+        child_count = self.child_count
+        while child_count[node]:
+            if widening and child_count[node] < widening_limit(self.visits[node], *widening):
+                break
+            node = self._select_child(node, c)
+        return node
+
+    def path(self, node: int) -> List[int]:
+        path = []
+        while node >= 0:
+            path.append(node)
+            node = int(self.parent[node])
+        return path
+
+    def backpropagate(self, node: int, reward: float) -> None:
+        path = self.path(node)
+        self.visits[path] += 1
+        self.wins[path] += reward
+
+    def apply_virtual_loss(self, node: int, amount: float) -> None:
+        self.virtual_loss[self.path(node)] += amount
+
+    def best_child(self, node: int = ROOT) -> Optional[int]:
+        kids = self.children(node)
+        if not len(kids):
+            return None
+        visits = self.visits[kids]
+        rates = np.where(visits > 0, self.wins[kids] / np.maximum(visits, 1), -1.0)
+        return int(kids[np.argmax(rates)])
+
+    @property
+    def nbytes(self) -> int:
+        """数组部分占用的字节数 (不含旁表)"""
+        arrays = (self.visits, self.wins, self.virtual_loss, self.parent, self.child_start, self.child_count, self.child_index)
+        return sum(a.nbytes for a in arrays)
+
+
+class CompactMCTS(EnhancedMCTS):
+    """用 CompactTree 存储搜索树的 EnhancedMCTS，节点句柄是整数下标"""
+
+    def __init__(self, root_code: str, *args, capacity: int = 1024, **kwargs):
+        super().__init__(root_code, *args, **kwargs)
+        if self.code_store is not None:
+            # 换一个空的存储，编号从根节点开始与树的下标对齐
+            self.code_store = CodeStore()
+        self.tree = CompactTree(root_code, capacity=capacity, code_store=self.code_store)
+        self.root = ROOT
+
+    def _node_code(self, node: int) -> str:
+        return self.tree.codes[node]
+
+    def _node_evaluation(self, node: int) -> Any:
+        return self.tree.evaluations[node]
+
+    def _add_child(self, parent: int, code: str, evaluation: dict) -> int:
+        return self.tree.add_node(parent, code, compact_evaluation(evaluation))
+
+    def _record_visit(self, node: int, reward: float) -> None:
+        self.tree.visits[node] += 1
+        self.tree.wins[node] += reward
+
+    def _path(self, node: int) -> List[int]:
+        return self.tree.path(node)
+
+    def _last_reward(self, node: int) -> float:
+        evaluation = self.tree.evaluations[node]
+        return (evaluation or {}).get("overall", {}).get("reward", 0.0)
+
+    def _visits(self, node: int) -> float:
+        return float(self.tree.visits[node])
+
+    def _child_count(self, node: int) -> int:
+        return int(self.tree.child_count[node])
+
+    def _node_key(self, node: int) -> Any:
+        return node
+
+    def _children(self, node: int) -> List[int]:
+        return self.tree.children(node).tolist()
+
+    def _wins(self, node: int) -> float:
+        return float(self.tree.wins[node])
+
+    def _set_node_stats(self, node: int, visits: float, wins: float) -> None:
+        self.tree.visits[node], self.tree.wins[node] = visits, wins
+
+    def _select(self, node: int) -> int:
+        widening = (MCTS_PW_C, MCTS_PW_ALPHA) if self.progressive_widening else None
+        return self.tree.select(node, widening=widening)
+
+    def _backpropagate(self, node: int, reward: float):
+        self.tree.backpropagate(node, reward)
+
+    def _apply_virtual_loss(self, node: int, amount: float) -> None:
+        self.tree.apply_virtual_loss(node, amount)
+
+    def _get_best_child(self):
+        return self.tree.best_child(ROOT)
+
+    def _final_code(self) -> str:
+        best = self._get_best_child()
+        final_code = self.tree.codes[best if best is not None else ROOT]
+        logger.info("mcts_complete", best_wins=float(self.tree.wins[best]) if best is not None else 0, nodes=len(self.tree))
+        return final_code
+
+    def _print_progress(self, current_iter: int):
+        best = self._get_best_child()
+        visits = self.tree.visits[best] if best is not None else 0
+        best_rate = float(self.tree.wins[best] / visits) if visits else 0
+        logger.info("mcts_progress", current_iter=current_iter + 1, total_simulations=self.n_simulations,
+                    best_pass_rate=round(best_rate, 2), total_branches=int(self.tree.child_count[ROOT]))
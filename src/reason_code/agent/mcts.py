@@ -1,75 +1,361 @@
 import math
+import time
+import itertools
 import asyncio
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Tuple
 from dataclasses import dataclass, field
 
 import structlog
 from src.reason_code.utils.logger import logger as global_logger
 logger = structlog.get_logger(__name__)
 from src.reason_code.utils.trace import trace_span
-from src.reason_code.models.llm import generate_code_candidates
-from src.reason_code.executor.sandbox import execute_code
-from src.reason_code.executor.evaluator import evaluate_code
-from src.reason_code.utils.config import MCTS_C
+from src.reason_code.models.llm import generate_code_candidates, approx_token_count
+from src.reason_code.models.kv_cache import bind_search_stats
+from src.reason_code.models.scheduler import PRIORITY_NORMAL
+from src.reason_code.utils.config import (
+    MCTS_C, MCTS_PARALLELISM, MCTS_VIRTUAL_LOSS,
+    MCTS_PROGRESSIVE_WIDENING, MCTS_PW_C, MCTS_PW_ALPHA, MCTS_MAX_CANDIDATES, MCTS_CHECKPOINT_EVERY, MCTS_REPAIR_BUDGET,
+    MCTS_DIFF_CODE,
+)
 from src.reason_code.agent.retriever import simple_retrieve 
-from src.reason_code.models.router import router
+from src.reason_code.utils.code_hash import code_hash
+from src.reason_code.agent import checkpoint as ckpt
+from src.reason_code.agent.code_store import CodeStore, compact_evaluation
 
-@dataclass
+@dataclass(slots=True)
 class Node:
-    code: str
+    code: Optional[str]  # 差分存储时为 None，经 EnhancedMCTS._node_code 读取
     parent: Optional["Node"]
     visits: int = 0
     wins: float = 0.0
     children: List["Node"] = field(default_factory=list)
     last_result: Any = None
     evaluation_result: Any = None  # 新增：评估结果
+    virtual_loss: float = 0.0  # 经过该节点、尚未回传的在途模拟 (并行搜索)
+    code_ref: int = -1  # 在 CodeStore 中的编号 (-1 表示代码直接存在 code 上)
 
     def ucb_score(self, c: float = MCTS_C):
-        if self.visits == 0:
+        # 在途模拟按"已访问、奖励为 0"计入，让并行的选择分散到其他叶子
+        visits = self.visits + self.virtual_loss
+        if visits == 0:
             return float("inf")
-        parent_visits = self.parent.visits if self.parent else 1
-        return (self.wins / self.visits) + c * math.sqrt(math.log(parent_visits) / self.visits)
+        parent_visits = (self.parent.visits + self.parent.virtual_loss) if self.parent else 1
+        return (self.wins / visits) + c * math.sqrt(math.log(max(parent_visits, 1)) / visits)
+
+def widening_limit(visits: float, c: float = MCTS_PW_C, alpha: float = MCTS_PW_ALPHA) -> int:
+    """渐进展开：访问 visits 次的节点最多允许的子节点数 (至少 1)"""
+    return max(1, math.ceil(c * visits ** alpha))
+
+
+@dataclass
+class SearchBudget:
+    """搜索预算，None 表示不限制"""
+    deadline_s: Optional[float] = None  # 墙钟时间上限 (秒)
+    max_llm_calls: Optional[int] = None
+    max_tokens: Optional[int] = None  # Prompt + 候选的估算 token 数
+    max_sandbox_runs: Optional[int] = None
+    stop_on_solution: bool = True  # 出现 reward 1.0 的候选即停止
+    plateau_patience: Optional[int] = None  # 连续这么多次模拟最好奖励没有提升则停止
+
+
+@dataclass
+class SearchResult:
+    code: str
+    reward: float
+    stop_reason: str  # completed / solved / deadline / llm_call_budget / token_budget / sandbox_budget / plateau
+    simulations: int
+    elapsed_s: float
+    stats: Dict[str, Any] = field(default_factory=dict)
+
 
 class EnhancedMCTS:
     """增强版MCTS：集成分级评估"""
     
-    def __init__(self, root_code: str, n_simulations: int = 30, n_candidates: int = 3):
+    def __init__(self, root_code: str, n_simulations: int = 30, n_candidates: int = 3, priority: int = PRIORITY_NORMAL,
+                 parallelism: int = MCTS_PARALLELISM, progressive_widening: bool = MCTS_PROGRESSIVE_WIDENING,
+                 checkpoint_dir: Optional[str] = None, checkpoint_every: int = MCTS_CHECKPOINT_EVERY,
+                 repair_budget: int = MCTS_REPAIR_BUDGET, diff_code: bool = MCTS_DIFF_CODE):
         self.root = Node(code=root_code, parent=None)
+        # 子节点代码按父节点差分存储，根节点是编号 0 的全文
+        self.code_store: Optional[CodeStore] = None
+        if diff_code:
+            self.code_store = CodeStore()
+            self.root.code_ref = self.code_store.add(root_code)
         self.n_simulations = n_simulations
+        # 每次扩展的基准候选数；开启渐进展开时按节点情况自适应调整
         self.n_candidates = n_candidates
+        self.progressive_widening = progressive_widening
+        # 本次搜索最多用 Reflexion 修复多少个候选 (0 关闭)
+        self.repair_budget = repair_budget
+        # 节点 -> [已评估的子候选数, 其中语法失败数]
+        self._expansion_record: Dict[Any, List[int]] = {}
+        # 本搜索在推理调度器中的优先级
+        self.priority = priority
+        # 同时在途的模拟数：LLM 生成与沙箱评估互相重叠，并发请求由调度器合并成批
+        self.parallelism = max(1, parallelism)
+        self._started_at = 0.0
+        # 目前评估过的最好候选 (anytime 搜索随时返回它)
+        self._best_code: Optional[str] = None
+        self._best_reward = 0.0
+        self._improved_at = 0
+        self._completed = 0
+        # 检查点目录 (None 表示不保存)；每完成 checkpoint_every 次模拟保存一次，运行结束再保存一次
+        self.checkpoint_dir = checkpoint_dir or None
+        self.checkpoint_every = max(1, checkpoint_every)
+        self._checkpoint_key: Optional[str] = None
+        # 置换表：规范化 AST 哈希 -> 节点，等价候选共享同一个节点的统计与评估结果
+        self.transpositions: Dict[str, Node] = {}
         self.stats = {
             "syntax_checks": 0,
             "static_analyses": 0, 
             "runtime_tests": 0,
+            "runtime_timeouts": 0,
+            "evaluation_cache_hits": 0,
             "early_rejects": 0,
-            "llm_calls": 0
+            "llm_calls": 0,
+            "llm_tokens": 0,
+            "prefix_cache_hits": 0,
+            "prefix_cache_misses": 0,
+            "max_in_flight": 0,
+            "duplicates_merged": 0,
+            "evaluations_skipped": 0,
+            "candidates_requested": 0,
+            "resumed_nodes": 0,
+            "repairs_attempted": 0,
+            "repairs_succeeded": 0,
+            "reflexion_s": 0.0,
+            "reflexion_generate_s": 0.0,
+            "reflexion_evaluate_s": 0.0,
+            "time_to_solution_s": None
         }
     
     @trace_span(span_name="mcts_run")
-    async def run(self, test_runner: str):
-        logger.info("mcts_start", n_simulations=self.n_simulations, root_code_preview=self.root.code[:50])
-        
-        for i in range(self.n_simulations):
-            log = logger.bind(iteration=i)
-            node = self._select(self.root)
-            reward = await self._expand_and_simulate(node, test_runner)
-            self._backpropagate(node, reward)
-            
-            #记录关键节点
-            if (i + 1) % 5 == 0:  
-                log.info("mcts_progress", progress=f"{i+1}/{self.n_simulations}")
-        
+    async def run(self, test_runner: str, budget: Optional[SearchBudget] = None) -> str:
+        result = await self.run_anytime(test_runner, budget)
+        return result.code
+
+    async def run_anytime(self, test_runner: str, budget: Optional[SearchBudget] = None) -> SearchResult:
+        """
+        随时可停的搜索：在 n_simulations 跑完之前，预算耗尽、找到通过的解或奖励停滞都会提前结束
+        返回目前为止最好的代码和停止原因
+        """
+        budget = budget or SearchBudget()
+        logger.info("mcts_start", n_simulations=self.n_simulations, root_code_preview=self._node_code(self.root)[:50])
+        # 前缀 KV Cache 的命中统计记到本次搜索的 stats 上
+        stats_token = bind_search_stats(self.stats)
+        self._started_at = time.perf_counter()
+        resumed = self._warm_start(test_runner)
+        try:
+            stop_reason, completed = await self._run_simulations(test_runner, budget, resumed)
+        finally:
+            stats_token.var.reset(stats_token)
+        self._save_checkpoint(completed, finished=True)
+
+        result = SearchResult(
+            code=self._best_code if self._best_code is not None else self._final_code(),
+            reward=self._best_reward,
+            stop_reason=stop_reason,
+            simulations=completed,
+            elapsed_s=time.perf_counter() - self._started_at,
+            stats=dict(self.stats),
+        )
+        logger.info("mcts_stopped", stop_reason=stop_reason, simulations=completed,
+                    best_reward=result.reward, elapsed_s=round(result.elapsed_s, 3))
+        return result
+
+    def _stop_reason(self, budget: SearchBudget, completed: int) -> Optional[str]:
+        """检查是否应该停止发起新的模拟"""
+        if budget.stop_on_solution and self._best_reward >= 1.0:
+            return "solved"
+        if budget.deadline_s is not None and time.perf_counter() - self._started_at >= budget.deadline_s:
+            return "deadline"
+        if budget.max_llm_calls is not None and self.stats["llm_calls"] >= budget.max_llm_calls:
+            return "llm_call_budget"
+        if budget.max_tokens is not None and self.stats["llm_tokens"] >= budget.max_tokens:
+            return "token_budget"
+        if budget.max_sandbox_runs is not None and self.stats["runtime_tests"] >= budget.max_sandbox_runs:
+            return "sandbox_budget"
+        if budget.plateau_patience and completed - self._improved_at >= budget.plateau_patience:
+            return "plateau"
+        return None
+
+    def _warm_start(self, test_runner: str) -> int:
+        """
+        从检查点恢复搜索树，返回要接着计数的已完成模拟数
+        上次运行崩溃 (未正常结束) 时只补跑剩下的模拟；正常结束的检查点在已有的树上再跑完整的 n_simulations
+        """
+        if not self.checkpoint_dir or self._child_count(self.root):
+            return 0
+        self._checkpoint_key = ckpt.checkpoint_key(self._node_code(self.root), test_runner)
+        data = ckpt.load_checkpoint(self.checkpoint_dir, self._checkpoint_key)
+        if data is None:
+            return 0
+        ckpt.restore(self, data)
+        self.stats["resumed_nodes"] = len(data["nodes"]["parent"]) - 1
+        for node in itertools.islice(self._iter_nodes(), 1, None):
+            self.transpositions.setdefault(code_hash(self._node_code(node)), node)
+            self._observe(self._node_code(node), self._last_reward(node))
+        completed = 0 if data["finished"] else min(data["completed"], self.n_simulations)
+        self._completed = self._improved_at = completed
+        logger.info("mcts_checkpoint_restored", nodes=self.stats["resumed_nodes"], completed=completed,
+                    best_reward=self._best_reward)
+        return completed
+
+    def _save_checkpoint(self, completed: int, finished: bool) -> None:
+        if not self._checkpoint_key:
+            return
+        try:
+            path = ckpt.save_checkpoint(self, self.checkpoint_dir, self._checkpoint_key, completed, finished)
+            logger.debug("mcts_checkpoint_saved", path=path, completed=completed, finished=finished)
+        except OSError as e:
+            logger.warning("mcts_checkpoint_failed", error=str(e))
+
+    def _iter_nodes(self):
+        queue = [self.root]
+        for node in queue:
+            yield node
+            queue.extend(self._children(node))
+
+    async def _run_simulations(self, test_runner: str, budget: SearchBudget, resumed: int = 0):
+        """
+        保持最多 parallelism 个模拟在途 (parallelism=1 即串行)
+        叶并行时选中的叶子沿路径加虚拟损失，完成后撤销虚拟损失并回传真实奖励
+        回传发生在事件循环的同一步里 (两次 await 之间)，不会与其他模拟交错
+        停止时取消仍在途的模拟，返回 (停止原因, 完成的模拟数)
+        """
+        in_flight: Dict[asyncio.Task, Node] = {}
+        started = completed = resumed
+        stop_reason = "completed"
+        try:
+            while completed < self.n_simulations:
+                reason = self._stop_reason(budget, completed)
+                if reason:
+                    stop_reason = reason
+                    break
+                while started < self.n_simulations and len(in_flight) < self.parallelism:
+                    node = self._select(self.root)
+                    self._apply_virtual_loss(node, MCTS_VIRTUAL_LOSS)
+                    in_flight[asyncio.ensure_future(self._expand_and_simulate(node, test_runner))] = node
+                    started += 1
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], len(in_flight))
+
+                timeout = None
+                if budget.deadline_s is not None:
+                    timeout = max(0.0, budget.deadline_s - (time.perf_counter() - self._started_at))
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = in_flight.pop(task)
+                    self._apply_virtual_loss(node, -MCTS_VIRTUAL_LOSS)
+                    self._backpropagate(node, task.result())
+                    completed += 1
+                    self._completed = completed
+                    if completed % 5 == 0:
+                        logger.info("mcts_progress", progress=f"{completed}/{self.n_simulations}", in_flight=len(in_flight))
+                    if completed % self.checkpoint_every == 0:
+                        self._save_checkpoint(completed, finished=False)
+        finally:
+            # 提前停止、出错或被取消时不留下孤儿任务
+            for task in in_flight:
+                task.cancel()
+        return stop_reason, completed
+
+    def _apply_virtual_loss(self, node: Node, amount: float) -> None:
+        cur = node
+        while cur:
+            cur.virtual_loss += amount
+            cur = cur.parent
+
+    def _final_code(self) -> str:
         best = self._get_best_child()
-        final_code = best.code if best else self.root.code
+        final_code = self._node_code(best if best else self.root)
         
         logger.info("mcts_complete", best_wins=best.wins if best else 0)
         return final_code
 
+    # 树存储的访问接口：CompactMCTS (agent/compact_tree.py) 用数组存储重写这些方法
+    def _node_code(self, node: Node) -> str:
+        if node.code_ref >= 0:
+            return self.code_store.get(node.code_ref)
+        return node.code
+
+    def _node_evaluation(self, node: Node) -> Any:
+        return node.evaluation_result
+
+    def _add_child(self, parent: Node, code: str, evaluation: dict) -> Node:
+        if self.code_store is not None:
+            base = parent.code_ref if parent.code_ref >= 0 else None
+            child = Node(code=None, parent=parent, code_ref=self.code_store.add(code, base=base))
+        else:
+            child = Node(code=code, parent=parent)
+        parent.children.append(child)
+        evaluation = compact_evaluation(evaluation)
+        child.evaluation_result = evaluation
+        child.last_result = evaluation.get("overall", {})
+        return child
+
+    def _record_visit(self, node: Node, reward: float) -> None:
+        node.visits += 1
+        node.wins += reward
+
+    def _path(self, node: Node) -> List[Node]:
+        """node 到根的路径 (含两端)"""
+        path = []
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        return path
+
+    def _last_reward(self, node: Node) -> float:
+        return (node.last_result or {}).get("reward", 0.0)
+
+    def _visits(self, node: Node) -> float:
+        return node.visits
+
+    def _child_count(self, node: Node) -> int:
+        return len(node.children)
+
+    def _children(self, node: Node) -> List[Node]:
+        return node.children
+
+    def _wins(self, node: Node) -> float:
+        return node.wins
+
+    def _set_node_stats(self, node: Node, visits: float, wins: float) -> None:
+        node.visits, node.wins = visits, wins
+
+    def _node_key(self, node: Node) -> Any:
+        return id(node)
+
     def _select(self, node: Node) -> Node:
-        while node.children:
+        # 开启渐进展开时，子节点数未达上限的节点直接再扩展，不再往下走
+        while node.children and not self._can_widen(node):
             node = max(node.children, key=lambda n: n.ucb_score())
         return node
 
+    def _can_widen(self, node: Node) -> bool:
+        return self.progressive_widening and self._child_count(node) < widening_limit(self._visits(node))
+
+    def _candidates_for(self, node: Node) -> int:
+        """
+        本次扩展要多少个候选
+        运行时失败 (reward 0.7) 的节点离通过最近，多要一个；子候选过半是语法错误的节点减半
+        (一次调用多要几个候选几乎不增加成本，所以不按剩余分支名额截断)
+        """
+        if not self.progressive_widening:
+            return self.n_candidates
+        n = self.n_candidates
+        if self._node_evaluation(node) and self._last_reward(node) == 0.7:
+            n += 1
+        evaluated, syntax_failures = self._expansion_record.get(self._node_key(node), (0, 0))
+        if evaluated >= 2 and syntax_failures * 2 > evaluated:
+            n = max(1, n // 2)
+        return max(1, min(n, MCTS_MAX_CANDIDATES))
+
+    def _record_expansion(self, node: Node, results: List[dict]) -> None:
+        record = self._expansion_record.setdefault(self._node_key(node), [0, 0])
+        record[0] += len(results)
+        record[1] += sum(1 for r in results if r.get("overall", {}).get("failed_at") == "level_1")
+
     def _get_best_child(self):
         return max(self.root.children, key=lambda n: (n.wins / n.visits) if n.visits > 0 else -1, default=None)
 
@@ -77,77 +363,150 @@ class EnhancedMCTS:
     async def _expand_and_simulate(self, node: Node, test_runner: str) -> float:
         prompt = self._build_prompt(node, test_runner)
         self.stats["llm_calls"] += 1
-        # 并发请求 LLM 生成候选
-        # 注意：llm.py 内部已经做了串行化处理以适应 MPS，这里无需改动接口
-        candidates = await generate_code_candidates(prompt, n=self.n_candidates)
+        n = self._candidates_for(node)
+        self.stats["candidates_requested"] += n
+        # 请求 LLM 生成候选 (本地模型经推理调度器与其他搜索的请求合并成批)
+        candidates = await generate_code_candidates(
+            prompt, n=n, prefix_hint=self._prompt_prefix(node), priority=self.priority
+        )
+        self.stats["llm_tokens"] += approx_token_count(prompt) + sum(approx_token_count(c) for c in candidates)
+
+        # 置换表里已有的候选不再评估，本批内重复的只评估第一个
+        hashes = [code_hash(c) for c in candidates]
+        first: Dict[str, int] = {}
+        for i, h in enumerate(hashes):
+            if h not in self.transpositions:
+                first.setdefault(h, i)
 
         # 并发评估所有候选
         from src.reason_code.executor.evaluator import evaluate_candidates_async
-        eval_results = await evaluate_candidates_async(candidates, test_runner, prompt)
+        fresh_results = await evaluate_candidates_async([candidates[i] for i in first.values()], test_runner, prompt)
+        results_by_hash = dict(zip(first.keys(), fresh_results))
+        self._record_expansion(node, fresh_results)
+
+        # 运行时失败的候选并发修复 (修复结果已经复查过)
+        fresh = list(zip(first.keys(), (candidates[i] for i in first.values()), fresh_results))
+        repaired = await self._reflexion_stage([(code, result) for _, code, result in fresh], test_runner, prompt)
+        outcomes = {h: outcome for (h, _, _), outcome in zip(fresh, repaired)}
 
         best_reward = 0.0
+        for i, cand in enumerate(candidates):
+            h = hashes[i]
+            if first.get(h) != i:
+                self.stats["evaluations_skipped"] += 1
+            existing = self.transpositions.get(h)
+            if existing is not None:
+                best_reward = max(best_reward, self._merge_duplicate(existing, node))
+                continue
 
-        from src.reason_code.agent.reflexion import attempt_fix
+            eval_result = results_by_hash[h]
+            final_code, final_result = outcomes[h]
 
-        for cand, eval_result in zip(candidates, eval_results):
-            
-            final_code = cand
-            final_result = eval_result
-            
-            # 🚑 抢救机制：如果运行时失败 (得分0.7)，尝试修复
-            if eval_result["overall"]["reward"] == 0.7:
-                failed_level = eval_result["overall"]["failed_at"]
-                if failed_level == "level_3": # 运行时错误
-                    error_msg = eval_result[failed_level]["message"]
-                    
-                    self.stats["llm_calls"] += 1
-                    # 尝试修复
-                    fixed_code = await attempt_fix(cand, error_msg, test_runner)
-                    
-                    if fixed_code != cand:
-                        # 重新评估修复后的代码
-                        # 这里简单同步调用 evaluate，或者你可以封装成 await
-                        from src.reason_code.executor.evaluator import evaluate_code
-                        new_result = evaluate_code(fixed_code, test_runner)
-                        
-                        if new_result["overall"]["reward"] > 0.7:
-                        # 记录关键里程碑：Reflexion 成功救活了代码
-                            logger.info(
-                                "reflexion_success", 
-                                score_improvement=f"0.7->{new_result['overall']['reward']}",
-                                fixed_level=failed_level
-                            )
-                            final_code = fixed_code
-                            final_result = new_result
-                    else:
-                        # 记录一次无效的尝试
-                        logger.debug("reflexion_attempt_no_improvement")
-
-            child = Node(code=final_code, parent=node)
-            node.children.append(child)
-
-            child.evaluation_result = final_result
-            child.last_result = final_result.get("overall", {})
-            node.children.append(child)
-
-            child.evaluation_result = eval_result
-            child.last_result = eval_result.get("overall", {})
+            key = code_hash(final_code)
+            if key in self.transpositions:
+                # 评估期间其他在途模拟已扩展出等价节点 (或修复后与已有节点等价)
+                best_reward = max(best_reward, self._merge_duplicate(self.transpositions[key], node))
+                continue
+
+            child = self._add_child(node, final_code, final_result)
+            self.transpositions[key] = child
 
             # 更新统计
             self._update_stats(eval_result)
 
-            reward = eval_result.get("overall", {}).get("reward", 0.0)
-            child.visits += 1
-            child.wins += reward
+            reward = final_result.get("overall", {}).get("reward", 0.0)
+            self._record_visit(child, reward)
+            self._observe(final_code, reward)
 
             if reward > best_reward:
                 best_reward = reward
                 if reward == 1.0:
+                    if self.stats["time_to_solution_s"] is None:
+                        self.stats["time_to_solution_s"] = time.perf_counter() - self._started_at
                     logger.info("solution_found", reward=1.0, code_preview=final_code[:30])
         return best_reward
 
+    async def _reflexion_stage(self, items: List[Tuple[str, dict]], test_runner: str, prompt: str) -> List[Tuple[str, dict]]:
+        """
+        Reflexion 修复阶段：运行时失败 (reward 0.7) 的候选并发修复，修复结果一起交给异步评估器复查
+        每次搜索最多修复 repair_budget 个候选；返回每个候选最终采用的 (代码, 评估结果)
+        """
+        from src.reason_code.agent.reflexion import attempt_fix
+        from src.reason_code.executor.evaluator import evaluate_candidates_async
+
+        outcome = list(items)
+        targets = [i for i, (_, result) in enumerate(items)
+                   if result["overall"]["reward"] == 0.7 and result["overall"]["failed_at"] == "level_3"]
+        targets = targets[:max(0, self.repair_budget - self.stats["repairs_attempted"])]
+        if not targets:
+            return outcome
+        # 先记账再 await，并行的模拟共享同一份修复预算
+        self.stats["repairs_attempted"] += len(targets)
+        self.stats["llm_calls"] += len(targets)
+
+        started = time.perf_counter()
+        # 修复请求经推理调度器与其他请求合并成批
+        fixes = await asyncio.gather(*(attempt_fix(items[i][0], items[i][1]["level_3"]["message"], test_runner)
+                                       for i in targets))
+        generated = time.perf_counter()
+
+        recheck = []
+        for i, fixed in zip(targets, fixes):
+            if code_hash(fixed) in self.transpositions:
+                # 修复结果与已有节点等价，之后直接并入该节点
+                self.stats["evaluations_skipped"] += 1
+                outcome[i] = (fixed, items[i][1])
+            elif fixed != items[i][0]:
+                recheck.append((i, fixed))
+            else:
+                # 记录一次无效的尝试
+                logger.debug("reflexion_attempt_no_improvement")
+
+        if recheck:
+            results = await evaluate_candidates_async([fixed for _, fixed in recheck], test_runner, prompt)
+            for (i, fixed), new_result in zip(recheck, results):
+                self._update_stats(new_result)
+                if new_result["overall"]["reward"] > 0.7:
+                    # 记录关键里程碑：Reflexion 成功救活了代码
+                    logger.info("reflexion_success", score_improvement=f"0.7->{new_result['overall']['reward']}",
+                                fixed_level="level_3")
+                    self.stats["repairs_succeeded"] += 1
+                    outcome[i] = (fixed, new_result)
+
+        finished = time.perf_counter()
+        self.stats["reflexion_generate_s"] += generated - started
+        self.stats["reflexion_evaluate_s"] += finished - generated
+        self.stats["reflexion_s"] += finished - started
+        return outcome
+
+    def _observe(self, code: str, reward: float) -> None:
+        """记录目前最好的候选；最好奖励提升时记下已完成的模拟数 (用于判断停滞)"""
+        if reward > self._best_reward:
+            self._improved_at = self._completed
+        if reward > self._best_reward or self._best_code is None:
+            self._best_code, self._best_reward = code, reward
+
+    def _merge_duplicate(self, existing: Node, expanding: Node) -> float:
+        """
+        等价候选并入已有节点：复用它的评估结果，与新评估一样随 expanding 的路径回传 (模拟结束时统一记)
+        已有节点在 expanding 子树内时，它到 expanding 之间的节点各记一次访问，等同于在那里新建子节点；
+        在其他分支时不动那一支，否则汇合点以上只记一次而两个分支各加一次，父节点访问数会小于子节点之和
+        """
+        self.stats["duplicates_merged"] += 1
+        reward = self._last_reward(existing)
+        path = self._path(existing)
+        stop = self._node_key(expanding)
+        keys = [self._node_key(n) for n in path]
+        if stop in keys:
+            for n in path[:keys.index(stop)]:
+                self._record_visit(n, reward)
+        return reward
+
     def _update_stats(self, eval_result: dict):
-        """更新分级评估统计"""
+        """更新分级评估统计 (命中评估缓存的结果没有实际执行，只记命中数)"""
+        if eval_result.get("overall", {}).get("cached"):
+            self.stats["evaluation_cache_hits"] += 1
+            return
         for level in ["level_1", "level_2", "level_3"]:
             if level in eval_result:
                 if level == "level_1":
@@ -159,22 +518,30 @@ class EnhancedMCTS:
                 
                 if not eval_result[level]["passed"] and level != "level_3":
                     self.stats["early_rejects"] += 1
+        if eval_result.get("overall", {}).get("failure") == "timeout":
+            # 超时候选的奖励低于普通运行时失败，不会被选去修复，也不会让父节点多要候选
+            self.stats["runtime_timeouts"] += 1
+
+    def _prompt_prefix(self, node: Node) -> str:
+        """Prompt 开头的节点代码部分，同一节点的多次扩展共享它的 KV Cache"""
+        return f"当前代码:\n```python\n{self._node_code(node)}\n```\n\n"
 
     def _build_prompt(self, node: Node, test_runner: str) -> str:
-        prompt = f"当前代码:\n```python\n{node.code}\n```\n\n"
+        prompt = self._prompt_prefix(node)
         
         # 简单的 RAG 检索
-        retrieved = simple_retrieve(node.code, k=3)
+        retrieved = simple_retrieve(self._node_code(node), k=3)
         if retrieved:
             prompt += "\n\n# 以下是过去类似失败的修复参考："
             for r in retrieved:
                 prompt += f"\n# 失败候选: {r['candidate']}"
                 prompt += f"\n# 错误: {r['stderr']}"
 
-        if node.evaluation_result:
-            failed_level = node.evaluation_result["overall"]["failed_at"]
+        evaluation = self._node_evaluation(node)
+        if evaluation:
+            failed_level = evaluation["overall"]["failed_at"]
             if failed_level:
-                level_msg = node.evaluation_result[failed_level]["message"]
+                level_msg = evaluation[failed_level]["message"]
                 prompt += f"在{failed_level}失败: {level_msg}\n\n"
         
         prompt += "请修复代码使其通过测试。只返回修复后的Python代码。"
@@ -208,6 +575,14 @@ class EnhancedMCTS:
             syntax_checks=self.stats['syntax_checks'],
             static_analyses=self.stats['static_analyses'],
             runtime_tests=self.stats['runtime_tests'],
+            evaluation_cache_hits=self.stats['evaluation_cache_hits'],
             early_rejects=self.stats['early_rejects'],
-            early_reject_rate=round(reject_rate, 4) # 保留4位小数
+            early_reject_rate=round(reject_rate, 4), # 保留4位小数
+            prefix_cache_hits=self.stats['prefix_cache_hits'],
+            prefix_cache_misses=self.stats['prefix_cache_misses'],
+            duplicates_merged=self.stats['duplicates_merged'],
+            evaluations_skipped=self.stats['evaluations_skipped'],
+            repairs_attempted=self.stats['repairs_attempted'],
+            repairs_succeeded=self.stats['repairs_succeeded'],
+            reflexion_s=round(self.stats['reflexion_s'], 3)
         )
\ No newline at end of file
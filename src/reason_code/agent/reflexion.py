@@ -4,13 +4,19 @@
 import sys
 import os
 import re
+import asyncio
+import functools
 
 # 导入 LLM 接口
-from src.reason_code.models.llm import _local_model
+from src.reason_code.models.llm import _local_model, LLM_SCHEDULER
+from src.reason_code.models.scheduler import get_scheduler, PRIORITY_HIGH
 import structlog
 from src.reason_code.utils.logger import logger as global_logger
 logger = structlog.get_logger(__name__)
 
+# 修复输出大多照抄输入代码，适合 prompt_lookup 投机解码；未设置时沿用 LLM_DECODING
+REFLEXION_DECODING = os.getenv("REFLEXION_DECODING") or None
+
 def construct_fix_prompt(code: str, error_msg: str, test_runner: str) -> str:
     """构造修复 Prompt，利用报错信息"""
     return f"""
@@ -37,8 +43,8 @@ def construct_fix_prompt(code: str, error_msg: str, test_runner: str) -> str:
 
     [修复后的代码] """   
 
-async def attempt_fix(code: str, error_msg: str, test_runner: str) -> str: 
-    """尝试修复代码""" 
+async def attempt_fix(code: str, error_msg: str, test_runner: str, decoding: str = None) -> str: 
+    """尝试修复代码 (decoding: "sample" | "prompt_lookup"，默认取 REFLEXION_DECODING)""" 
     # 1. 先定义变量，解决"红线"问题 
     last_error = error_msg.splitlines()[-1] if error_msg else 'Unknown Error'
     # 2. 再打印日志
@@ -47,8 +53,18 @@ async def attempt_fix(code: str, error_msg: str, test_runner: str) -> str:
     prompt = construct_fix_prompt(code, error_msg, test_runner)
 
     try:
-    # 串行生成 1 个候选
-        candidates = _local_model.generate(prompt, num_return_sequences=1)
+    # 生成 1 个候选；代码之前的固定说明部分复用前缀 KV Cache
+        prefix_hint = prompt.split(code, 1)[0] if code else None
+        decoding = decoding or REFLEXION_DECODING
+        if LLM_SCHEDULER:
+            # 经调度器与其他请求合并成批，不阻塞事件循环
+            candidates = await get_scheduler(_local_model).submit(prompt, n=1, priority=PRIORITY_HIGH,
+                                                                  prefix_hint=prefix_hint, decoding=decoding)
+        else:
+            # 同步生成放到线程池，避免整个生成期间卡住事件循环
+            loop = asyncio.get_running_loop()
+            candidates = await loop.run_in_executor(None, functools.partial(
+                _local_model.generate, prompt, num_return_sequences=1, prefix_hint=prefix_hint, decoding=decoding))
     
         if candidates:
             fixed_code = candidates[0]
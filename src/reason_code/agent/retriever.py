@@ -1,8 +1,74 @@
-import json
+"""
+失败案例检索
+- BM25Index: 对 logs/fail_cases.jsonl 中候选代码与报错信息的 BM25 倒排索引
+  常驻内存，每次检索前只读取日志新增的字节；记录本身不进内存，只保存行偏移，命中后再按偏移读取
+  索引定期快照到磁盘 (gzip 压缩的 JSON，数组存为 base64 原始字节)，重启后从快照继续追读
+- DenseIndex: 稠密检索，哈希 n-gram 向量追加写入 float32 矩阵文件并 memmap，
+  记录多时用粗粒度 IVF 分区只扫描最近的几个簇
+- simple_retrieve: 旧接口，供 _build_prompt 使用，按 RETRIEVER_MODE 选择索引
+"""
 import os
-from typing import List, Dict
+import re
+import sys
+import gzip
+import json
+import base64
+import math
+import heapq
+import zlib
+import hashlib
+import threading
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+RETRIEVER_LOG_PATH = os.getenv("RETRIEVER_LOG_PATH", "logs/fail_cases.jsonl")
+# 索引快照路径 (空字符串关闭)；新增这么多条记录后重写一次快照
+RETRIEVER_INDEX_PATH = os.getenv("RETRIEVER_INDEX_PATH", "logs/fail_cases.bm25")
+RETRIEVER_SNAPSHOT_EVERY = int(os.getenv("RETRIEVER_SNAPSHOT_EVERY", "1000"))
+# 查询只保留 idf 最高的若干个词，长代码作为查询时延迟有上界
+RETRIEVER_MAX_QUERY_TERMS = int(os.getenv("RETRIEVER_MAX_QUERY_TERMS", "32"))
+# 每条记录最多索引的 token 数 (长 traceback 只看开头)
+RETRIEVER_MAX_DOC_TOKENS = int(os.getenv("RETRIEVER_MAX_DOC_TOKENS", "256"))
+# bm25 (词法) 或 dense (向量)
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "bm25").lower()
+# 稠密索引文件前缀 (.f32 向量 / .off 行偏移 / .meta.json / .ivf.npz)
+RETRIEVER_DENSE_PATH = os.getenv("RETRIEVER_DENSE_PATH", "logs/fail_cases.dense")
+RETRIEVER_DENSE_DIM = int(os.getenv("RETRIEVER_DENSE_DIM", "128"))
+# 记录数达到这个值后训练 IVF 分区，之前直接全量点积
+RETRIEVER_IVF_MIN = int(os.getenv("RETRIEVER_IVF_MIN", "50000"))
+# 每簇平均记录数 (簇数 = 记录数 / 它，不超过 RETRIEVER_IVF_MAX_LISTS)，查询扫描 NPROBE 个簇
+RETRIEVER_IVF_LIST_SIZE = int(os.getenv("RETRIEVER_IVF_LIST_SIZE", "128"))
+RETRIEVER_IVF_MAX_LISTS = int(os.getenv("RETRIEVER_IVF_MAX_LISTS", "16384"))
+RETRIEVER_IVF_NPROBE = int(os.getenv("RETRIEVER_IVF_NPROBE", "8"))
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+# 索引内容 (被索引的字段 / 分词) 变化时加一，旧快照和旧向量文件作废重建
+_SNAPSHOT_VERSION = 2
+# 快照里数组的原始字节按本机字节序与元素宽度写入，不一致的机器上读到的快照作废
+_ARRAY_LAYOUT = f"{sys.byteorder}:" + ",".join(f"{t}{array(t).itemsize}" for t in "qIH")
 
-def load_fail_cases(path="logs/fail_cases.jsonl"):
+
+def tokenize(text: str) -> List[str]:
+    """标识符 (连同按下划线拆开的部分) 与短数字，统一小写"""
+    tokens = []
+    for tok in _TOKEN_RE.findall(text):
+        if tok.isdigit():
+            # 行号、地址之类的长数字只会撑大词表
+            if len(tok) <= 3:
+                tokens.append(tok)
+            continue
+        tok = tok.lower()
+        tokens.append(tok)
+        if "_" in tok.strip("_"):
+            tokens.extend(part for part in tok.split("_") if len(part) > 1)
+    return tokens
+
+
+def load_fail_cases(path=RETRIEVER_LOG_PATH):
     if not os.path.exists(path):
         return []
     out = []
@@ -14,18 +80,589 @@ def load_fail_cases(path="logs/fail_cases.jsonl"):
                 pass
     return out
 
+
+def _iter_complete_lines(f, offset: int) -> Iterator[Tuple[int, bytes]]:
+    """从 offset 开始逐行返回 (行起始偏移, 行内容)；最后一行没写完 (没有换行符) 时停下"""
+    f.seek(offset)
+    for line in f:
+        if not line.endswith(b"\n"):
+            # 写入方还没写完这一行，下次再读
+            break
+        yield offset, line
+        offset += len(line)
+
+
+def _encode_array(arr: array) -> str:
+    return base64.b64encode(arr.tobytes()).decode("ascii")
+
+
+def _decode_array(typecode: str, data: str) -> array:
+    """base64 -> array；字节数不是元素宽度的整数倍时抛 ValueError"""
+    arr = array(typecode)
+    arr.frombytes(base64.b64decode(data, validate=True))
+    return arr
+
+
+def _read_records(path: str, offsets) -> List[Optional[dict]]:
+    """按行偏移读取记录 (只打开一次文件)，解析失败的位置为 None"""
+    out = []
+    with open(path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            try:
+                out.append(json.loads(f.readline()))
+            except ValueError:
+                out.append(None)
+    return out
+
+
+_RECORD_FIELDS = ("candidate", "stderr", "prompt")
+
+
+def _record_text(record: dict) -> str:
+    return "\n".join(str(record.get(field) or "") for field in _RECORD_FIELDS)
+
+
+def _record_tokens(record: dict) -> List[str]:
+    """每个字段各取前 RETRIEVER_MAX_DOC_TOKENS 个 token，长 prompt 不会挤掉代码和报错"""
+    tokens = []
+    for field in _RECORD_FIELDS:
+        tokens.extend(tokenize(str(record.get(field) or ""))[:RETRIEVER_MAX_DOC_TOKENS])
+    return tokens
+
+
+class BM25Index:
+    """
+    增量更新的 BM25 倒排索引 (Lucene 的 idf 形式，始终为正)，索引候选代码、报错信息与题目 prompt
+    postings: term -> (文档号 array('I'), 词频 array('H'))，文档号按追加顺序递增
+    打分优先用 NumPy，没有安装时退回纯 Python (结果相同，大索引上慢一些)
+    """
+
+    def __init__(self, path: str = RETRIEVER_LOG_PATH, snapshot_path: Optional[str] = RETRIEVER_INDEX_PATH,
+                 k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.snapshot_path = snapshot_path or None
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_offsets = array("q")
+        self.doc_lengths = array("I")
+        self.total_length = 0
+        self._offset = 0  # 已读取到的日志字节位置
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if self.snapshot_path:
+            self._load_snapshot()
+
+    def __len__(self) -> int:
+        return len(self.doc_offsets)
+
+    def _reset(self) -> None:
+        self.postings = {}
+        self.doc_offsets = array("q")
+        self.doc_lengths = array("I")
+        self.total_length = 0
+        self._offset = 0
+
+    def _add(self, offset: int, record: dict) -> None:
+        tokens = _record_tokens(record)
+        doc_id = len(self.doc_offsets)
+        self.doc_offsets.append(offset)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        counts: Dict[str, int] = {}
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, tf in counts.items():
+            entry = self.postings.get(tok)
+            if entry is None:
+                entry = self.postings[tok] = (array("I"), array("H"))
+            entry[0].append(doc_id)
+            entry[1].append(min(tf, 65535))
+
+    def refresh(self) -> int:
+        """读取日志新增的完整行并加入索引，返回新增记录数；日志被截断或轮转时重建"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return 0
+            if size < self._offset:
+                logger.info("retriever_log_truncated", path=self.path)
+                self._reset()
+            if size == self._offset:
+                return 0
+            added = 0
+            with open(self.path, "rb") as f:
+                for offset, line in _iter_complete_lines(f, self._offset):
+                    try:
+                        self._add(offset, json.loads(line))
+                        added += 1
+                    except (ValueError, UnicodeDecodeError):
+                        pass
+                    self._offset = offset + len(line)
+            self._unsaved += added
+            if self.snapshot_path and self._unsaved >= RETRIEVER_SNAPSHOT_EVERY:
+                self._save_snapshot()
+            return added
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, int]]:
+        """返回 [(score, 文档号)]，按分数从高到低，只包含分数 > 0 的文档"""
+        with self._lock:
+            # 持锁：NumPy 视图引用着 array 的缓冲区，期间不能被 refresh 扩容
+            return self._search(query, k)
+
+    def _search(self, query: str, k: int) -> List[Tuple[float, int]]:
+        n = len(self.doc_offsets)
+        terms = [t for t in set(tokenize(query)) if t in self.postings]
+        if not n or not terms:
+            return []
+        idf = {t: math.log(1 + (n - len(self.postings[t][0]) + 0.5) / (len(self.postings[t][0]) + 0.5)) for t in terms}
+        terms = sorted(terms, key=idf.get, reverse=True)[:RETRIEVER_MAX_QUERY_TERMS]
+        try:
+            return self._score_numpy(terms, idf, min(k, n))
+        except ImportError:
+            return self._score_python(terms, idf, min(k, n))
+
+    def _score_numpy(self, terms: List[str], idf: Dict[str, float], k: int) -> List[Tuple[float, int]]:
+        import numpy as np
+
+        n = len(self.doc_offsets)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32, count=n)
+        avg_len = self.total_length / n
+        scores = np.zeros(n, dtype=np.float32)
+        for t in terms:
+            ids_arr, tf_arr = self.postings[t]
+            ids = np.frombuffer(ids_arr, dtype=np.uint32)
+            tf = np.frombuffer(tf_arr, dtype=np.uint16).astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths[ids] / avg_len)
+            scores[ids] += idf[t] * tf * (self.k1 + 1) / (tf + norm)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), int(i)) for i in top if scores[i] > 0]
+
+    def _score_python(self, terms: List[str], idf: Dict[str, float], k: int) -> List[Tuple[float, int]]:
+        """只累加出现在 postings 里的文档，同分时文档号小的在前"""
+        lengths = self.doc_lengths
+        avg_len = self.total_length / len(self.doc_offsets)
+        scores: Dict[int, float] = {}
+        for t in terms:
+            ids, tfs = self.postings[t]
+            weight = idf[t] * (self.k1 + 1)
+            for doc_id, tf in zip(ids, tfs):
+                norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf / (tf + norm)
+        top = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(score, doc_id) for doc_id, score in top if score > 0]
+
+    def get(self, doc_id: int) -> Optional[dict]:
+        return self.get_many([doc_id])[0]
+
+    def get_many(self, doc_ids: List[int]) -> List[Optional[dict]]:
+        return _read_records(self.path, [self.doc_offsets[i] for i in doc_ids])
+
+    def _log_fingerprint(self, nbytes: int) -> str:
+        """日志开头 nbytes 字节的哈希，用来识别快照之后日志被替换的情况"""
+        try:
+            with open(self.path, "rb") as f:
+                return hashlib.sha256(f.read(nbytes)).hexdigest()
+        except OSError:
+            return ""
+
+    def _save_snapshot(self) -> None:
+        state = {
+            "version": _SNAPSHOT_VERSION,
+            "layout": _ARRAY_LAYOUT,
+            "fingerprint": self._log_fingerprint(min(self._offset, 4096)),
+            "offset": self._offset,
+            "postings": {t: [_encode_array(ids), _encode_array(tfs)] for t, (ids, tfs) in self.postings.items()},
+            "doc_offsets": _encode_array(self.doc_offsets),
+            "doc_lengths": _encode_array(self.doc_lengths),
+        }
+        tmp = f"{self.snapshot_path}.tmp-{os.getpid()}"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp, self.snapshot_path)
+            self._unsaved = 0
+        except OSError as e:
+            logger.warning("retriever_snapshot_failed", error=str(e))
+
+    def _load_snapshot(self) -> None:
+        """快照读不出、版本/布局不符、内容不自洽或与日志对不上时都不用它，索引从日志重建"""
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != _SNAPSHOT_VERSION or state.get("layout") != _ARRAY_LAYOUT:
+                return
+            offset = int(state["offset"])
+            doc_offsets = _decode_array("q", state["doc_offsets"])
+            doc_lengths = _decode_array("I", state["doc_lengths"])
+            n = len(doc_offsets)
+            postings = {}
+            for term, (ids, tfs) in state["postings"].items():
+                entry = (_decode_array("I", ids), _decode_array("H", tfs))
+                # 文档号越界会让打分时下标出错
+                if not entry[0] or len(entry[0]) != len(entry[1]) or max(entry[0]) >= n:
+                    raise ValueError(f"bad postings for {term!r}")
+                postings[term] = entry
+            if len(doc_lengths) != n or (n and (max(doc_offsets) >= offset or min(doc_offsets) < 0)):
+                raise ValueError("doc arrays do not match")
+        except (OSError, EOFError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning("retriever_snapshot_unreadable", path=self.snapshot_path, error=str(e))
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if offset > size or state.get("fingerprint") != self._log_fingerprint(min(offset, 4096)):
+            # 日志在快照之后被截断或替换，快照作废
+            return
+        self.postings = postings
+        self.doc_offsets = doc_offsets
+        self.doc_lengths = doc_lengths
+        self.total_length = sum(doc_lengths)
+        self._offset = offset
+
+
+_FEATURE_CACHE: Dict[str, Tuple[int, float]] = {}
+_FEATURE_CACHE_MAX = 200_000
+
+
+def _feature(feature: str, dim: int) -> Tuple[int, float]:
+    """特征串 -> (桶, 符号)；用 crc32 而不是 hash()，向量要跨进程复用"""
+    key = f"{dim}:{feature}"
+    hit = _FEATURE_CACHE.get(key)
+    if hit is None:
+        h = zlib.crc32(feature.encode("utf-8"))
+        hit = (h % dim, 1.0 if (h >> 31) & 1 else -1.0)
+        if len(_FEATURE_CACHE) < _FEATURE_CACHE_MAX:
+            _FEATURE_CACHE[key] = hit
+    return hit
+
+
+def hashed_embedding(text: str, dim: int = RETRIEVER_DENSE_DIM):
+    """哈希 n-gram 向量：词与相邻词对分别带符号哈希到 dim 个桶，按 sqrt(tf) 加权后 L2 归一化"""
+    import numpy as np
+
+    tokens = tokenize(text)[:RETRIEVER_MAX_DOC_TOKENS]
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return np.zeros(dim, dtype=np.float32)
+    counts: Dict[str, int] = {}
+    for feat in features:
+        counts[feat] = counts.get(feat, 0) + 1
+    buckets, weights = [], []
+    for feat, tf in counts.items():
+        bucket, sign = _feature(feat, dim)
+        buckets.append(bucket)
+        weights.append(sign * math.sqrt(tf))
+    vec = np.bincount(buckets, weights=weights, minlength=dim).astype(np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class DenseIndex:
+    """
+    向量检索：每条记录嵌入一次，追加写到 <prefix>.f32 (行主序 float32 矩阵)，行偏移写到 <prefix>.off
+    查询时两者都以 memmap 打开，记录本身不进内存
+    - 记录数 < RETRIEVER_IVF_MIN: 一次矩阵向量乘全量打分
+    - 之后训练球面 k-means 粗分区 (IVF)，查询只扫描最近的 RETRIEVER_IVF_NPROBE 个簇；记录数翻两番后重新训练
+    embed 可以换成本地模型的隐藏状态，只要输出 L2 归一化的 dim 维向量
+    """
+
+    def __init__(self, path: str = RETRIEVER_LOG_PATH, prefix: Optional[str] = RETRIEVER_DENSE_PATH,
+                 dim: int = RETRIEVER_DENSE_DIM, embed: Optional[Callable[[str], "object"]] = None):
+        import numpy as np
+
+        self.path = path
+        self.dim = dim
+        self.embed = embed or (lambda text: hashed_embedding(text, dim))
+        if prefix is None:
+            # 不落盘时放到临时目录 (测试 / benchmark)
+            import tempfile
+            self._tmpdir = tempfile.TemporaryDirectory(prefix="dense-index-")
+            prefix = os.path.join(self._tmpdir.name, "index")
+        self.prefix = prefix
+        self.count = 0
+        self._offset = 0  # 已读取到的日志字节位置
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._doc_offsets = np.zeros(0, dtype=np.int64)
+        # IVF: 质心与每条记录所属的簇
+        self._centroids = None
+        self._assign = array("i")
+        self._lists: List[array] = []
+        self._trained_count = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ---------- 持久化 ----------
+
+    def _file(self, suffix: str) -> str:
+        return f"{self.prefix}{suffix}"
+
+    def _load(self) -> None:
+        try:
+            with open(self._file(".meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if (not meta or meta.get("version") != _SNAPSHOT_VERSION or meta.get("dim") != self.dim
+                or meta["offset"] > self._log_size()
+                or meta.get("fingerprint") != self._log_fingerprint(min(meta["offset"], 4096))
+                or self._stored_rows() < meta["count"]):
+            # 没有索引、数据文件缺行，或日志在索引之后被截断 / 替换：从头建
+            self._truncate_files(0)
+            self._save_meta()
+            return
+        # 元数据之后写了一半的行直接截掉
+        self._truncate_files(meta["count"])
+        self.count = meta["count"]
+        self._offset = meta["offset"]
+        self._remap()
+        self._load_ivf()
+
+    def _save_meta(self) -> None:
+        meta = {"version": _SNAPSHOT_VERSION, "dim": self.dim, "count": self.count, "offset": self._offset,
+                "fingerprint": self._log_fingerprint(min(self._offset, 4096))}
+        tmp = f"{self._file('.meta.json')}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file(".meta.json"))
+
+    def _stored_rows(self) -> int:
+        try:
+            return min(os.path.getsize(self._file(".f32")) // (self.dim * 4), os.path.getsize(self._file(".off")) // 8)
+        except OSError:
+            return 0
+
+    def _truncate_files(self, rows: int) -> None:
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        for suffix, width in ((".f32", self.dim * 4), (".off", 8)):
+            with open(self._file(suffix), "ab") as f:
+                f.truncate(rows * width)
+        if rows == 0 and os.path.exists(self._file(".ivf.npz")):
+            os.remove(self._file(".ivf.npz"))
+
+    def _remap(self) -> None:
+        import numpy as np
+
+        if self.count == 0:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._doc_offsets = np.zeros(0, dtype=np.int64)
+            return
+        # 转成普通 ndarray 视图 (仍由 mmap 支撑)，省掉 np.memmap 子类在每次切片上的开销
+        self._vectors = np.asarray(np.memmap(self._file(".f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim)))
+        self._doc_offsets = np.memmap(self._file(".off"), dtype=np.int64, mode="r", shape=(self.count,))
+
+    def _log_size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _log_fingerprint(self, nbytes: int) -> str:
+        try:
+            with open(self.path, "rb") as f:
+                return hashlib.sha256(f.read(nbytes)).hexdigest()
+        except OSError:
+            return ""
+
+    # ---------- 写入 ----------
+
+    def refresh(self, batch: int = 4096) -> int:
+        """嵌入日志新增的完整行并追加到矩阵文件，返回新增记录数；日志被截断时重建"""
+        import numpy as np
+
+        with self._lock:
+            size = self._log_size()
+            if size < self._offset:
+                logger.info("retriever_log_truncated", path=self.path)
+                self._reset()
+            if size == self._offset:
+                return 0
+            added = 0
+            vectors, offsets = [], []
+            with open(self.path, "rb") as f:
+                for offset, line in _iter_complete_lines(f, self._offset):
+                    try:
+                        vectors.append(self.embed(_record_text(json.loads(line))))
+                        offsets.append(offset)
+                    except (ValueError, UnicodeDecodeError):
+                        pass
+                    end = offset + len(line)
+                    if len(vectors) >= batch:
+                        added += self._append(np.stack(vectors), offsets, end)
+                        vectors, offsets = [], []
+                    self._offset = end
+            added += self._append(np.stack(vectors) if vectors else None, offsets, self._offset)
+            self._remap()
+            if self.count >= RETRIEVER_IVF_MIN and self.count >= 4 * self._trained_count:
+                self._train_ivf()
+            elif self._unsaved >= RETRIEVER_SNAPSHOT_EVERY:
+                self._save_ivf()
+            return added
+
+    def _append(self, vectors, offsets: List[int], end_offset: int) -> int:
+        """追加一批向量：先写数据文件，最后写元数据，崩溃时元数据之后的半截数据会在加载时截掉"""
+        import numpy as np
+
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            with open(self._file(".f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file(".off"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            if self._centroids is not None:
+                self._extend_assign(vectors, self.count)
+            self.count += len(vectors)
+            self._unsaved += len(vectors)
+        self._offset = end_offset
+        self._save_meta()
+        return 0 if vectors is None else len(vectors)
+
+    def _reset(self) -> None:
+        self.count = 0
+        self._offset = 0
+        self._centroids = None
+        self._assign = array("i")
+        self._lists = []
+        self._trained_count = 0
+        self._remap()
+        self._truncate_files(0)
+        self._save_meta()
+
+    # ---------- IVF ----------
+
+    def _nearest(self, vectors):
+        import numpy as np
+
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _extend_assign(self, vectors, start: int, chunk: int = 8192) -> None:
+        for lo in range(0, len(vectors), chunk):
+            labels = self._nearest(vectors[lo:lo + chunk]).tolist()
+            self._assign.extend(labels)
+            for i, label in enumerate(labels, start + lo):
+                self._lists[label].append(i)
+
+    def _train_ivf(self, nlist: Optional[int] = None, iterations: int = 6, seed: int = 0) -> None:
+        """球面 k-means：在抽样上训练 nlist 个质心 (默认每簇约 RETRIEVER_IVF_LIST_SIZE 条)，再把全部记录分到最近的质心"""
+        import numpy as np
+
+        n = self.count
+        nlist = max(1, min(n, nlist or min(RETRIEVER_IVF_MAX_LISTS, n // RETRIEVER_IVF_LIST_SIZE)))
+        rng = np.random.default_rng(seed)
+        sample = self._vectors[np.sort(rng.choice(n, size=min(n, 32 * nlist, 65536), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.concatenate([np.argmax(sample[lo:lo + 8192] @ centroids.T, axis=1)
+                                     for lo in range(0, len(sample), 8192)])
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空簇保留旧质心
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+        self._centroids = centroids
+        self._assign = array("i")
+        self._lists = [array("I") for _ in range(nlist)]
+        self._extend_assign(self._vectors, 0)
+        self._trained_count = n
+        logger.info("retriever_ivf_trained", records=n, nlist=nlist)
+        self._save_ivf()
+
+    def _save_ivf(self) -> None:
+        import numpy as np
+
+        if self._centroids is None:
+            return
+        tmp = f"{self._file('.ivf')}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, centroids=self._centroids, assign=np.frombuffer(self._assign, dtype=np.int32),
+                 trained_count=self._trained_count)
+        os.replace(tmp, self._file(".ivf.npz"))
+        self._unsaved = 0
+
+    def _load_ivf(self) -> None:
+        import numpy as np
+
+        try:
+            data = np.load(self._file(".ivf.npz"))
+        except (OSError, ValueError):
+            return
+        if data["centroids"].shape[1] != self.dim:
+            return
+        self._centroids = data["centroids"]
+        assign = data["assign"][:self.count]
+        self._trained_count = int(data["trained_count"])
+        self._assign = array("i", assign.astype(np.int32).tobytes())
+        self._lists = [array("I") for _ in range(len(self._centroids))]
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+        for c in range(len(self._centroids)):
+            self._lists[c] = array("I", order[bounds[c]:bounds[c + 1]].astype(np.uint32).tobytes())
+        # 快照之后追加的记录补分配
+        if len(assign) < self.count:
+            self._extend_assign(self._vectors[len(assign):], len(assign))
+
+    # ---------- 查询 ----------
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, int]]:
+        """返回 [(余弦相似度, 文档号)]，按相似度从高到低，只包含相似度 > 0 的文档"""
+        import numpy as np
+
+        q = np.asarray(self.embed(query), dtype=np.float32)
+        with self._lock:
+            if self.count == 0 or not q.any():
+                return []
+            if self._centroids is None:
+                ids = None
+                scores = self._vectors @ q
+            else:
+                nprobe = min(RETRIEVER_IVF_NPROBE, len(self._centroids))
+                probe = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+                ids = np.concatenate([np.frombuffer(self._lists[c], dtype=np.uint32) for c in probe])
+                if not len(ids):
+                    return []
+                ids.sort()  # 按文件顺序读，memmap 访问更连续
+                scores = np.take(self._vectors, ids, axis=0) @ q
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(float(scores[i]), int(i if ids is None else ids[i])) for i in top if scores[i] > 0]
+
+    def get(self, doc_id: int) -> Optional[dict]:
+        return self.get_many([doc_id])[0]
+
+    def get_many(self, doc_ids: List[int]) -> List[Optional[dict]]:
+        return _read_records(self.path, [int(self._doc_offsets[i]) for i in doc_ids])
+
+
+# 全局单例：首次检索时才创建并加载
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """按 RETRIEVER_MODE 返回 BM25Index 或 DenseIndex"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DenseIndex() if RETRIEVER_MODE == "dense" else BM25Index()
+    return _index
+
+
 def simple_retrieve(query: str, k: int = 5):
-    cases = load_fail_cases()
-    scored = []
-    q = query.lower()
-    for c in cases:
-        score = 0
-        if q in (c.get("prompt","").lower()):
-            score += 3
-        if q in (c.get("candidate","").lower()):
-            score += 2
-        if q in (c.get("stderr","").lower()):
-            score += 1
-        scored.append((score, c))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [c for s,c in scored[:k] if s>0]
\ No newline at end of file
+    index = get_index()
+    index.refresh()
+    records = index.get_many([doc_id for _, doc_id in index.search(query, k)])
+    return [r for r in records if r is not None]
@@ -14,27 +14,29 @@ if project_root not in sys.path:
 
 import asyncio
 from fastapi import FastAPI, BackgroundTasks
+from typing import Optional
 from pydantic import BaseModel
 import uvicorn
 
 # 现在 Python 知道根目录了，我们可以从 src. 开始导入
-from src.reason_code.agent.mcts import EnhancedMCTS
+from src.reason_code.agent.mcts import EnhancedMCTS, SearchBudget
+from src.reason_code.utils.config import MCTS_CHECKPOINT_DIR
 # 引入 Logger
 from src.reason_code.utils.logger import logger
 
-# --- 引入 Phoenix 监控 (让 Trace 生效) ---
-import phoenix as px
-from openinference.instrumentation.openai import OpenAIInstrumentor
-from opentelemetry import trace as trace_api
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
-
 app = FastAPI()
 
-# --- 初始化 Phoenix 监控 ---
+# --- 初始化 Phoenix 监控 (让 Trace 生效) ---
+# Phoenix / OpenInference / OTLP 导入较慢，放到服务启动时再导入，import app 本身保持轻量
+@app.on_event("startup")
 def setup_phoenix():
     try:
+        from openinference.instrumentation.openai import OpenAIInstrumentor
+        from opentelemetry import trace as trace_api
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
         # 配置 OpenTelemetry 发送数据给本地的 Phoenix
         endpoint = os.getenv("PHOENIX_COLLECTOR_ENDPOINT", "http://127.0.0.1:6006/v1/traces")
         tracer_provider = TracerProvider()
@@ -47,31 +49,48 @@ def setup_phoenix():
     except Exception as e:
         logger.warning("phoenix_setup_failed", error=str(e))
 
-setup_phoenix()
-
 class TaskRequest(BaseModel):
     prompt: str
     test_runner: str
+    n_simulations: int = 1
+    # 搜索预算 (不填表示不限制)，到达任一预算即返回目前最好的代码
+    deadline_s: Optional[float] = None
+    max_llm_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_sandbox_runs: Optional[int] = None
+    stop_on_solution: bool = True
+    plateau_patience: Optional[int] = None
+
+    def budget(self) -> SearchBudget:
+        return SearchBudget(deadline_s=self.deadline_s, max_llm_calls=self.max_llm_calls, max_tokens=self.max_tokens,
+                            max_sandbox_runs=self.max_sandbox_runs, stop_on_solution=self.stop_on_solution,
+                            plateau_patience=self.plateau_patience)
 
 # 模拟数据库
 TASKS = {}
 
-async def run_mcts_task(task_id: str, prompt: str, runner: str):
+async def run_mcts_task(task_id: str, prompt: str, runner: str, n_simulations: int = 1,
+                        budget: Optional[SearchBudget] = None):
     """后台运行 MCTS 的工作函数"""
     logger.info("task_started", task_id=task_id)
     TASKS[task_id] = {"status": "running"}
     try:
         # 实例化 MCTS
-        mcts = EnhancedMCTS(root_code=prompt, n_simulations=1, n_candidates=1)
+        # 设置了 MCTS_CHECKPOINT_DIR 时，同一 prompt + test_runner 的重试从检查点继续
+        mcts = EnhancedMCTS(root_code=prompt, n_simulations=n_simulations, n_candidates=1,
+                            checkpoint_dir=MCTS_CHECKPOINT_DIR)
         # 运行搜索
-        best_code = await mcts.run(runner)
+        result = await mcts.run_anytime(runner, budget)
         
         TASKS[task_id] = {
             "status": "completed", 
-            "result": best_code,
+            "result": result.code,
+            "reward": result.reward,
+            "stop_reason": result.stop_reason,
+            "simulations": result.simulations,
             "message": "Optimization success"
         }
-        logger.info("task_completed", task_id=task_id)
+        logger.info("task_completed", task_id=task_id, stop_reason=result.stop_reason)
     except Exception as e:
         logger.error("task_failed", task_id=task_id, error=str(e))
         TASKS[task_id] = {"status": "failed", "error": str(e)}
@@ -85,7 +104,7 @@ async def reason_and_code(req: TaskRequest, background_tasks: BackgroundTasks):
     task_id = str(uuid.uuid4())
     
     # 放入后台任务队列 (Async + Queue 模式)
-    background_tasks.add_task(run_mcts_task, task_id, req.prompt, req.test_runner)
+    background_tasks.add_task(run_mcts_task, task_id, req.prompt, req.test_runner, req.n_simulations, req.budget())
     
     logger.info("request_received", task_id=task_id, prompt_preview=req.prompt[:50])
     
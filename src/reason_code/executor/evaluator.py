@@ -3,11 +3,25 @@ import subprocess
 import tempfile
 import os
 import asyncio
+import sys
 import json
+import hashlib
 from functools import lru_cache
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any, List, Optional
 from datetime import datetime
 
+import structlog
+
+from src.reason_code.executor.execution import as_execution_result, TIMEOUT_WALL
+from src.reason_code.utils.cache import LRUCache, SQLiteCache, TieredCache, make_cache_key
+from src.reason_code.utils.code_hash import code_hash
+from src.reason_code.utils.config import (
+    SANDBOX_BACKEND, SANDBOX_IMAGE, SANDBOX_TIMEOUT, SANDBOX_CPU_TIMEOUT, SANDBOX_MEM_LIMIT, SANDBOX_CPU_QUOTA,
+    EVAL_CACHE_SIZE, EVAL_CACHE_DB, EVAL_CACHE_DISK_TTL,
+)
+
+logger = structlog.get_logger(__name__)
+
 def _ensure_logs_dir():
     os.makedirs("logs", exist_ok=True)
 
@@ -67,26 +81,92 @@ def validate_repair(original: str, repaired: str, test_runner: str, timeout: int
         except Exception:
             return False
 
+# 执行超时的候选：跑起来了但没在时限内结束，分数低于普通的运行时失败，也不交给 Reflexion 修复
+TIMEOUT_REWARD = 0.5
+
+# 评估结果的格式变化时加一，旧的缓存条目随之失效
+_EVAL_CACHE_VERSION = 2
+
+
+def sandbox_fingerprint() -> Dict[str, Any]:
+    """影响执行结果的沙箱配置：换镜像 / 解释器或改时限后不复用旧结果"""
+    fingerprint = {"backend": SANDBOX_BACKEND, "timeout": SANDBOX_TIMEOUT, "cpu_timeout": SANDBOX_CPU_TIMEOUT,
+                   "mem_limit": SANDBOX_MEM_LIMIT}
+    if SANDBOX_BACKEND == "local":
+        fingerprint["python"] = sys.version
+    else:
+        fingerprint.update(image=SANDBOX_IMAGE, cpu_quota=SANDBOX_CPU_QUOTA)
+    return fingerprint
+
+
+def evaluation_cache_key(code: str, test_runner: str) -> str:
+    """只差空白 / 注释的候选共用一个键；docstring 保留在键里，doctest 或读 __doc__ 的测试会受它影响"""
+    test_hash = hashlib.sha256(test_runner.encode("utf-8")).hexdigest()
+    return make_cache_key("evaluation", _EVAL_CACHE_VERSION, code_hash(code), test_hash,
+                          sandbox_fingerprint())
+
+
+def build_evaluation_cache() -> TieredCache:
+    memory = LRUCache(maxsize=EVAL_CACHE_SIZE, ttl=None)
+    disk = None
+    if EVAL_CACHE_DB:
+        try:
+            disk = SQLiteCache(EVAL_CACHE_DB, namespace="evaluations", ttl=EVAL_CACHE_DISK_TTL)
+        except Exception as e:
+            logger.warning("disk_cache_unavailable", path=EVAL_CACHE_DB, error=str(e))
+    return TieredCache(memory, disk)
+
+
+def _cacheable(results: Dict[str, Any]) -> bool:
+    """
+    语法 / 静态分析的结果和沙箱里确定的执行结果可以缓存；
+    墙钟超时 (受机器负载影响)、沙箱本身出错和没有经过沙箱的回退路径不缓存
+    """
+    overall = results["overall"]
+    if overall["failed_at"] in ("level_1", "level_2"):
+        return True
+    execution = results.get("level_3", {}).get("execution")
+    return execution is not None and execution.get("timeout") != TIMEOUT_WALL
+
+
 class CodeEvaluator:
-    """三级评估：语法 -> 静态分析 -> 运行时测试"""
+    """
+    三级评估：语法 -> 静态分析 -> 运行时测试
+    每一级返回 (passed, message) 或 (passed, message, 附加信息)，附加信息合并进该级结果；
+    运行时测试的附加信息里有资源占用 (execution)，超时时 failure 为 "timeout"
+    """
 
-    def __init__(self):
+    def __init__(self, cache: Optional[TieredCache] = None):
         self.levels = [
             self._syntax_check,
             self._static_analysis,
             self._runtime_test
         ]
+        # 评估结果缓存 (None 表示不缓存)
+        self.cache = cache
 
     def evaluate(self, code: str, test_runner: str, prompt: str = "") -> Dict[str, Any]:
         """
         同步接口，返回每一级的结果与 overall 信息
-        overall.reward in [0,1]
+        overall.reward in [0,1]；命中缓存时 overall.cached 为 True (不再执行，也不再写样本日志)
         """
+        if self.cache is None:
+            return self._evaluate_levels(code, test_runner, prompt)
+        key = evaluation_cache_key(code, test_runner)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, overall=dict(cached["overall"], cached=True))
+        results = self._evaluate_levels(code, test_runner, prompt)
+        if _cacheable(results):
+            self.cache.set(key, results)
+        return results
+
+    def _evaluate_levels(self, code: str, test_runner: str, prompt: str) -> Dict[str, Any]:
         results: Dict[str, Any] = {}
         for i, level_func in enumerate(self.levels, start=1):
             level_name = f"level_{i}"
-            passed, message = level_func(code, test_runner)
-            results[level_name] = {"passed": passed, "message": message}
+            passed, message, *extra = level_func(code, test_runner)
+            results[level_name] = {"passed": passed, "message": message, **(extra[0] if extra else {})}
 
             if not passed:
                 # 只有运行时失败才写入 failure log（避免大量语法/风格噪声）
@@ -95,11 +175,14 @@ class CodeEvaluator:
                         log_failure(prompt, code, message, test_runner)
                     except Exception:
                         pass
+                failure = results[level_name].get("failure")
                 results["overall"] = {
                     "passed": False,
                     "failed_at": level_name,
-                    "reward": self._calculate_reward(i, passed)
+                    "reward": TIMEOUT_REWARD if failure == "timeout" else self._calculate_reward(i, passed)
                 }
+                if failure:
+                    results["overall"]["failure"] = failure
                 return results
 
         results["overall"] = {"passed": True, "failed_at": None, "reward": 1.0}
@@ -149,17 +232,24 @@ class CodeEvaluator:
     def _runtime_test(self, code: str, test_runner: str):
         try:
             try:
-                from src.reason_code.executor.sandbox import PersistentSandbox
-
-                if not hasattr(self, '_sandbox'):
-                    self._sandbox = PersistentSandbox()
+                from src.reason_code.executor.sandbox_pool import get_pool
 
-                exit_code, stdout, stderr = self._sandbox.execute_code(code, test_runner)
+                # 从沙箱池借一个容器：并发评估的候选分散到不同容器
+                with get_pool().lease() as sandbox:
+                    result = as_execution_result(sandbox.execute_code(code, test_runner))
 
-                if exit_code == 0:
-                    return True, f"测试通过: {stdout.strip() or '无输出'}"
+                info = {"execution": result.usage()}
+                if result.exception:
+                    # 常驻 runner 回传的异常摘要 (类型 / 信息 / 出错行)
+                    info["exception"] = result.exception
+                if result.timed_out:
+                    info["failure"] = "timeout"
+                    output = "\n".join(part for part in (result.stderr, result.stdout.strip()) if part)
+                    return False, f"执行超时: {output}", info
+                if result.exit_code == 0:
+                    return True, f"测试通过: {result.stdout.strip() or '无输出'}", info
                 else:
-                    return False, f"测试失败: {(stderr or stdout).strip()}"
+                    return False, f"测试失败: {(result.stderr or result.stdout).strip()}", info
 
             except ImportError:
                 ok = validate_repair("", code, test_runner, timeout=8)
@@ -171,8 +261,8 @@ class CodeEvaluator:
         except Exception as e:
             return False, f"运行时错误: {e}"
 
-# 全局评估器
-evaluator = CodeEvaluator()
+# 全局评估器 (带评估结果缓存)
+evaluator = CodeEvaluator(cache=build_evaluation_cache())
 
 # 同步入口，保持向后兼容
 def evaluate_code(code: str, test_runner: str, prompt: str = "") -> Dict[str, Any]:
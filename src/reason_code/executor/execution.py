@@ -0,0 +1,55 @@
+"""
+沙箱执行结果
+各个沙箱后端的 execute_code 都返回 ExecutionResult：退出码、输出，以及墙钟时间 / CPU 时间 / 峰值内存和超时类别
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# 超时类别：墙钟时限 (含 sleep / 等待 IO) 与 CPU 时限
+TIMEOUT_WALL = "wall"
+TIMEOUT_CPU = "cpu"
+
+
+@dataclass
+class ExecutionResult:
+    """可以按 (exit_code, stdout, stderr) 解包，兼容原来返回三元组的调用方"""
+    exit_code: int
+    stdout: str
+    stderr: str
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_memory_kb: int = 0
+    timeout: Optional[str] = None  # None / TIMEOUT_WALL / TIMEOUT_CPU
+    # 代码抛出的异常摘要 {"type", "message", "file", "line"} (常驻 runner 才有)
+    exception: Optional[Dict[str, Any]] = None
+
+    @property
+    def timed_out(self) -> bool:
+        return self.timeout is not None
+
+    def __iter__(self):
+        return iter((self.exit_code, self.stdout, self.stderr))
+
+    def note_timeout(self, wall_limit: float, cpu_limit: float) -> "ExecutionResult":
+        """超时时在 stderr 末尾注明超的是哪个时限"""
+        if self.timed_out:
+            limit = wall_limit if self.timeout == TIMEOUT_WALL else cpu_limit
+            self.stderr = f"{self.stderr}\n执行超时 ({self.timeout} > {limit}s)".lstrip()
+        return self
+
+    def usage(self) -> Dict[str, Any]:
+        """资源占用摘要 (写进评估结果)"""
+        return {
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "peak_memory_kb": self.peak_memory_kb,
+            "timeout": self.timeout,
+        }
+
+
+def as_execution_result(value) -> ExecutionResult:
+    """把旧式的 (exit_code, stdout, stderr) 三元组包装成 ExecutionResult"""
+    if isinstance(value, ExecutionResult):
+        return value
+    exit_code, stdout, stderr = value
+    return ExecutionResult(exit_code, stdout, stderr)
@@ -0,0 +1,314 @@
+"""
+沙箱的 fork server (独立脚本，只依赖标准库)
+local 后端由 local_sandbox.LocalForkSandbox 在本机启动；Docker 后端在每个容器里常驻一个，经 docker exec 的 socket 通信
+- 启动时预先导入常用模块，之后每个请求 fork 一个子进程执行，省掉解释器启动和导入的时间
+- 测试 harness 按 harness_id 编译一次缓存在 server 里 (同一道题的所有候选共用)，子进程继承编译好的代码对象
+- server 启动时进入一个空的网络命名空间 (有权限时)，子进程继承，执行时没有网络
+- 子进程：独立进程组 + 私有临时目录 + rlimit (CPU / 地址空间 / 文件大小 / 进程数)
+- 父进程按墙钟时限收集输出，超时杀掉整个进程树 (进程组 + /proc 里的所有后代)；CPU 时限由 RLIMIT_CPU 执行，资源占用取自 wait4 的 rusage
+单次模式 (不用常驻 runner 时 Docker 后端的执行方式)：python fork_server.py --run <代码文件> <墙钟秒数> <CPU 秒数>，
+  结果以 RESULT_MARKER + JSON 打印在 stdout 最后
+协议 (stdin / stdout)：4 字节大端长度 + JSON
+  请求 {"candidate": 候选代码, "harness_id": ..., "harness": 测试代码 (server 没缓存时才带), "timeout": 墙钟秒数,
+        "limits": {"cpu_s": ..., ...}}；也可以用 {"code": 完整代码} 代替 candidate / harness；{"ping": true} 用于健康检查
+  响应 {"exit_code", "stdout", "stderr", "wall_s", "cpu_s", "peak_memory_kb", "timeout": null / "wall" / "cpu",
+        "exception": null 或 {"type", "message", "file", "line"}}；harness 未缓存时为 {"error": "unknown_harness"}
+"""
+import gc
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import signal
+import struct
+import tempfile
+import traceback
+import importlib
+import selectors
+from collections import OrderedDict
+
+# 每路输出最多保留的字节数，超出部分读出后丢弃
+MAX_OUTPUT = 1 << 20
+TIMEOUT_EXIT_CODE = -signal.SIGKILL
+RESULT_MARKER = "__SANDBOX_RESULT__"
+# server 里最多缓存多少个编译好的测试 harness
+MAX_HARNESSES = 64
+_harnesses: "OrderedDict[str, object]" = OrderedDict()
+
+
+def read_message(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    (size,) = struct.unpack(">I", header)
+    return json.loads(stream.read(size))
+
+
+def write_message(stream, message) -> None:
+    data = json.dumps(message).encode("utf-8")
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def _disable_network() -> None:
+    """新建一个空的网络命名空间 (需要权限，失败时忽略)；每次执行都建的话要多花几毫秒，所以只在 server 启动时做一次"""
+    CLONE_NEWNET = 0x40000000
+    try:
+        if hasattr(os, "unshare"):
+            os.unshare(CLONE_NEWNET)
+            return
+        import ctypes
+        ctypes.CDLL(None, use_errno=True).unshare(CLONE_NEWNET)
+    except Exception:
+        pass
+
+
+def _apply_limits(limits) -> None:
+    import resource
+
+    def set_limit(name, soft, hard):
+        if soft and hasattr(resource, name):
+            try:
+                resource.setrlimit(getattr(resource, name), (int(soft), int(hard)))
+            except (ValueError, OSError):
+                pass
+
+    # CPU：到软限制收到 SIGXCPU，再多 1 秒到硬限制直接 SIGKILL
+    cpu_s = limits.get("cpu_s")
+    if cpu_s:
+        set_limit("RLIMIT_CPU", math.ceil(cpu_s), math.ceil(cpu_s) + 1)
+    for name, key in (("RLIMIT_AS", "memory_bytes"), ("RLIMIT_FSIZE", "file_bytes"), ("RLIMIT_NPROC", "nproc")):
+        set_limit(name, limits.get(key), limits.get(key))
+
+
+def _exception_info(e: BaseException):
+    """异常的结构化摘要：类型、信息，以及出错位置在候选 / 测试代码里的最内层一帧"""
+    file = line = None
+    for frame, lineno in traceback.walk_tb(e.__traceback__):
+        if frame.f_code.co_filename in ("test_code.py", "test_runner.py"):
+            file, line = frame.f_code.co_filename, lineno
+    return {"type": type(e).__name__, "message": str(e)[:1000], "file": file, "line": line}
+
+
+def _child(program, workdir: str, limits, out_fd: int, err_fd: int, result_fd: int) -> None:
+    """
+    子进程：重定向输出、收紧权限后依次执行 program 里的 (源码或代码对象, 文件名)，共用一个全局命名空间；
+    失败时把异常摘要写进 result_fd。永不返回
+    """
+    rc = 1
+    exception = None
+    try:
+        os.setsid()
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        sys.stdout = sys.__stdout__
+        os.chdir(workdir)
+        os.environ["TMPDIR"] = os.environ["HOME"] = workdir
+        tempfile.tempdir = workdir
+        _apply_limits(limits)
+        sys.argv = ["test_code.py"]
+        namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+        for code, filename in program:
+            exec(compile(code, filename, "exec") if isinstance(code, str) else code, namespace)
+        rc = 0
+    except SystemExit as e:
+        rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if not isinstance(e.code, (int, type(None))):
+            print(e.code, file=sys.stderr)
+    except BaseException as e:
+        # 去掉 fork server 自己的栈帧，traceback 从 test_code.py 开始
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exception = _exception_info(e)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if exception is not None:
+                os.write(result_fd, json.dumps(exception).encode("utf-8"))
+        finally:
+            os._exit(rc)
+
+
+def _descendants(root: int):
+    """从 /proc 找出 root 的所有后代进程 (包括已经另起会话、不在进程组里的)"""
+    children = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # 第二列是带括号的进程名，可能含空格，从最后一个 ')' 之后开始解析
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [root]
+    while stack:
+        for pid in children.get(stack.pop(), []):
+            found.append(pid)
+            stack.append(pid)
+    return found
+
+
+def _kill_tree(pid: int) -> None:
+    for target in _descendants(pid):
+        try:
+            os.kill(target, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _collect(pid: int, readers, deadline: float):
+    """读子进程输出直到两路都 EOF 且子进程退出；超过 deadline 杀掉进程组。返回 (wait 状态, rusage, 输出, 是否超时)"""
+    buffers = {fd: bytearray() for fd in readers}
+    sel = selectors.DefaultSelector()
+    for fd in readers:
+        sel.register(fd, selectors.EVENT_READ)
+    timed_out = False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        if not sel.get_map():
+            # 输出已经关闭，等子进程退出
+            waited, status, rusage = os.wait4(pid, os.WNOHANG)
+            if waited:
+                break
+            time.sleep(min(0.001, remaining))
+            continue
+        for key, _ in sel.select(remaining):
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                sel.unregister(key.fd)
+            elif len(buffers[key.fd]) < MAX_OUTPUT:
+                buffers[key.fd] += chunk[:MAX_OUTPUT - len(buffers[key.fd])]
+    sel.close()
+    if timed_out:
+        _kill_tree(pid)
+        _, status, rusage = os.wait4(pid, 0)
+    outputs = [bytes(buffers[fd]).decode("utf-8", errors="replace") for fd in readers]
+    return status, rusage, outputs, timed_out
+
+
+def _program(request):
+    """请求 -> 子进程要执行的 program；harness 不在缓存里 (也没随请求带来) 时返回 None"""
+    if "code" in request:
+        return [(request["code"], "test_code.py")]
+    harness_id = request["harness_id"]
+    if request.get("harness") is not None:
+        _harnesses[harness_id] = compile(f"if __name__ == '__main__':\n{request['harness']}", "test_runner.py", "exec")
+        while len(_harnesses) > MAX_HARNESSES:
+            _harnesses.popitem(last=False)
+    harness = _harnesses.get(harness_id)
+    if harness is None:
+        return None
+    _harnesses.move_to_end(harness_id)
+    return [(request["candidate"], "test_code.py"), (harness, "test_runner.py")]
+
+
+def handle(request) -> dict:
+    try:
+        program = _program(request)
+    except SyntaxError as e:
+        # 测试代码本身有语法错误：每个候选都会失败，不缓存
+        return {"exit_code": 1, "stdout": "", "stderr": f"SyntaxError in test harness: {e}", "wall_s": 0.0,
+                "cpu_s": 0.0, "peak_memory_kb": 0, "timeout": None, "exception": _exception_info(e)}
+    if program is None:
+        return {"error": "unknown_harness"}
+    workdir = tempfile.mkdtemp(prefix="sandbox-run-")
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    res_r, res_w = os.pipe()
+    limits = request.get("limits", {})
+    try:
+        started = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            os.close(out_r)
+            os.close(err_r)
+            os.close(res_r)
+            _child(program, workdir, limits, out_w, err_w, res_w)
+        for fd in (out_w, err_w, res_w):
+            os.close(fd)
+        status, rusage, (stdout, stderr), timed_out = _collect(pid, [out_r, err_r], started + request["timeout"])
+        wall_s = time.monotonic() - started
+        cpu_s = rusage.ru_utime + rusage.ru_stime
+        timeout = None
+        if timed_out:
+            timeout = "wall"
+        elif os.WIFSIGNALED(status) and (os.WTERMSIG(status) == signal.SIGXCPU or (
+                os.WTERMSIG(status) == signal.SIGKILL and limits.get("cpu_s") and cpu_s >= limits["cpu_s"])):
+            # 软限制先发 SIGXCPU，忽略它的代码在硬限制处被 SIGKILL
+            timeout = "cpu"
+        # 子进程已经退出；留在后台的后代进程可能还持有写端，所以不阻塞读
+        os.set_blocking(res_r, False)
+        try:
+            exception = json.loads(os.read(res_r, 65536) or b"null")
+        except (BlockingIOError, ValueError):
+            exception = None
+        return {
+            "exit_code": TIMEOUT_EXIT_CODE if timed_out else os.waitstatus_to_exitcode(status),
+            "stdout": stdout,
+            "stderr": stderr,
+            "wall_s": wall_s,
+            "cpu_s": cpu_s,
+            "peak_memory_kb": rusage.ru_maxrss,  # Linux 上单位是 KB
+            "timeout": timeout,
+            "exception": exception,
+        }
+    finally:
+        for fd in (out_r, err_r, res_r):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_once(path: str, wall_s: float, cpu_s: int) -> None:
+    """单次模式：执行一个文件，结果打印到 stdout"""
+    with open(path, encoding="utf-8") as f:
+        code = f.read()
+    result = handle({"code": code, "timeout": wall_s, "limits": {"cpu_s": cpu_s}})
+    sys.stdout.write(f"{RESULT_MARKER}{json.dumps(result)}\n")
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run_once(sys.argv[2], float(sys.argv[3]), int(sys.argv[4]))
+        return
+    for name in filter(None, (sys.argv[1] if len(sys.argv) > 1 else "").split(",")):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    _disable_network()
+    # 预导入的对象移出 GC 跟踪，子进程里的回收不会去写这些页，减少写时复制
+    gc.freeze()
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # 协议只走原始的 stdin / stdout，其余输出 (包括子进程继承的) 不能混进来
+    sys.stdout = sys.stderr
+    write_message(stdout, {"ready": True, "pid": os.getpid()})
+    while True:
+        request = read_message(stdin)
+        if request is None:
+            return
+        if request.get("ping"):
+            write_message(stdout, {"pong": True})
+            continue
+        write_message(stdout, handle(request))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+本地进程沙箱 (SANDBOX_BACKEND=local)
+不依赖 Docker：每个沙箱是一个常驻的 fork server (executor/fork_server.py)，常用模块已预先导入，
+每次执行只 fork 一个子进程，省掉解释器启动，单次开销在毫秒级；同一道题的测试 harness 只编译一次
+接口与 PersistentSandbox 相同 (execute_code / is_healthy / cleanup)，可直接作为 SandboxPool 的 factory
+"""
+import os
+import sys
+import threading
+import subprocess
+
+import structlog
+
+from src.reason_code.executor.execution import ExecutionResult
+from src.reason_code.executor.runner_session import RunnerSession
+from src.reason_code.utils.config import (
+    SANDBOX_TIMEOUT, SANDBOX_CPU_TIMEOUT, SANDBOX_MEM_LIMIT,
+    SANDBOX_PRELOAD, SANDBOX_LOCAL_FILE_LIMIT, SANDBOX_LOCAL_NPROC,
+)
+from src.reason_code.utils.trace import trace_span
+
+logger = structlog.get_logger(__name__)
+
+_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fork_server.py")
+_UNITS = {"b": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+
+
+def parse_mem_limit(value: str) -> int:
+    """把 Docker 风格的内存限制 ("256m" / "1g" / 字节数) 换算成字节"""
+    value = value.strip().lower()
+    if value and value[-1] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+class LocalForkSandbox:
+    """一个 fork server 进程；同一时刻只执行一段代码 (并发由 SandboxPool 里的多个实例提供)"""
+
+    def __init__(self, timeout: int = SANDBOX_TIMEOUT, cpu_timeout: int = SANDBOX_CPU_TIMEOUT,
+                 preload: str = SANDBOX_PRELOAD):
+        self.timeout = timeout
+        self.cpu_timeout = cpu_timeout
+        self.preload = preload
+        self.limits = {
+            "cpu_s": cpu_timeout,
+            "memory_bytes": parse_mem_limit(SANDBOX_MEM_LIMIT),
+            "file_bytes": SANDBOX_LOCAL_FILE_LIMIT,
+            "nproc": SANDBOX_LOCAL_NPROC,
+        }
+        self.process = None
+        self.session = None
+        self._lock = threading.Lock()
+        self._start_server()
+
+    def _start_server(self) -> None:
+        # -I: 忽略 PYTHON* 环境变量和用户 site-packages；独立会话，终端的 Ctrl-C 不会打断执行中的请求
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", _SERVER_SCRIPT, self.preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self.session = RunnerSession(self.process.stdout, self.process.stdin)
+        try:
+            self.session.hello()
+        except RuntimeError:
+            self._stop()
+            raise
+        logger.info("local_sandbox_started", pid=self.process.pid)
+
+    @trace_span(span_name="sandbox_execute")
+    def execute_code(self, code: str, test_runner: str) -> ExecutionResult:
+        with self._lock:
+            if self.process is None:
+                self._start_server()
+            try:
+                result = self.session.run(code, test_runner, self.timeout, self.limits)
+            except RuntimeError:
+                # server 已经退出：抛异常，由沙箱池按崩溃回收
+                self._stop()
+                raise
+        return ExecutionResult(**result).note_timeout(self.timeout, self.cpu_timeout)
+
+    def is_healthy(self) -> bool:
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                return False
+            try:
+                return self.session.ping()
+            except RuntimeError:
+                self._stop()
+                return False
+
+    def _stop(self) -> None:
+        process, self.process = self.process, None
+        self.session = None
+        if process is None:
+            return
+        try:
+            # 关掉 stdin，server 读到 EOF 自行退出
+            process.stdin.close()
+            process.wait(timeout=1)
+        except Exception:
+            process.kill()
+            process.wait()
+        finally:
+            process.stdout.close()
+
+    def cleanup(self) -> None:
+        with self._lock:
+            self._stop()
+        logger.info("local_sandbox_cleaned_up")
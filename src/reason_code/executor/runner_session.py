@@ -0,0 +1,53 @@
+"""
+与一个 fork server (executor/fork_server.py) 的会话
+local 后端走子进程的 stdin / stdout，Docker 后端走 docker exec 附加的 socket；
+会话记住对方已经缓存了哪些测试 harness，同一道题的后续候选只发候选代码
+"""
+import hashlib
+from typing import Any, Dict
+
+from src.reason_code.executor.fork_server import read_message, write_message
+
+
+def harness_id(test_runner: str) -> str:
+    return hashlib.sha256(test_runner.encode("utf-8")).hexdigest()[:16]
+
+
+class RunnerSession:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._loaded = set()
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            write_message(self.writer, message)
+            response = read_message(self.reader)
+        except (OSError, ValueError):
+            response = None
+        if response is None:
+            raise RuntimeError("fork server exited")
+        return response
+
+    def hello(self) -> Dict[str, Any]:
+        """读 server 启动后发来的就绪消息"""
+        message = read_message(self.reader)
+        if not message or not message.get("ready"):
+            raise RuntimeError("fork server failed to start")
+        return message
+
+    def run(self, candidate: str, test_runner: str, timeout: float, limits: Dict[str, Any]) -> Dict[str, Any]:
+        key = harness_id(test_runner)
+        message = {"candidate": candidate, "harness_id": key, "timeout": timeout, "limits": limits}
+        if key not in self._loaded:
+            message["harness"] = test_runner
+        response = self.request(message)
+        if response.get("error") == "unknown_harness":
+            # server 的 harness 缓存满了，已经把它淘汰
+            message["harness"] = test_runner
+            response = self.request(message)
+        self._loaded.add(key)
+        return response
+
+    def ping(self) -> bool:
+        return self.request({"ping": True}).get("pong", False)
@@ -3,21 +3,102 @@
 针对M1 Mac优化的Docker执行环境
 """
 
-import docker
 import tarfile
 import io
 import time
 import os
-from typing import Tuple
+import json
+import uuid
+import shlex
+import struct
+import atexit
+import threading
+from typing import Dict, Optional
 from src.reason_code.utils.trace import trace_span
 from opentelemetry import context
-from src.reason_code.utils.config import SANDBOX_IMAGE, SANDBOX_TIMEOUT, SANDBOX_MEM_LIMIT, SANDBOX_CPU_QUOTA
+from src.reason_code.executor.execution import ExecutionResult, TIMEOUT_WALL
+from src.reason_code.executor.fork_server import RESULT_MARKER
+from src.reason_code.executor.runner_session import RunnerSession
+from src.reason_code.utils.config import (
+    SANDBOX_IMAGE, SANDBOX_TIMEOUT, SANDBOX_CPU_TIMEOUT, SANDBOX_MEM_LIMIT, SANDBOX_CPU_QUOTA,
+    SANDBOX_PRELOAD, SANDBOX_RUNNER,
+)
+
+# 等待容器进入 running 状态的上限与轮询间隔 (秒)
+_STARTUP_TIMEOUT = 10.0
+_STARTUP_POLL = 0.05
+# 执行器自身卡住时 (比如容器内进程表满了)，外层 timeout 命令在墙钟时限之后再等这么久强制结束
+_KILL_GRACE = 5
+# 容器里的执行器就是 fork_server.py：常驻 runner 或单次模式，时限、杀进程树和资源统计与 local 后端是同一份代码
+_RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fork_server.py")
+_RUNNER_CONTAINER_PATH = "/workspace/.runner/runner.py"
 import structlog
 # 引入 Logger
 from src.reason_code.utils.logger import logger as global_logger
 logger = structlog.get_logger(__name__)
 
 
+def parse_runner_output(output: str, exit_code: int, wall_s: float, timeout: int, cpu_timeout: int) -> ExecutionResult:
+    """解析容器里 fork_server.py --run 打印的结果行 (exit_code / wall_s 是外层命令的，runner 没跑完时才用)"""
+    _, marker, tail = output.rpartition(RESULT_MARKER)
+    if marker:
+        result = ExecutionResult(**json.loads(tail))
+    else:
+        # runner 没跑完 (被外层 timeout 杀掉，或者根本没启动)
+        kind = TIMEOUT_WALL if exit_code == 128 + 9 else None
+        result = ExecutionResult(exit_code, "", output, wall_s=wall_s, timeout=kind)
+    return result.note_timeout(timeout, cpu_timeout)
+
+
+class _ExecSocketStream:
+    """
+    docker exec 附加的 socket (tty=False)：写入的字节就是 runner 的 stdin；
+    读到的是多路复用帧 (8 字节头：流编号 + 长度)，只保留 stdout 帧，stderr 帧记日志后丢弃
+    """
+
+    def __init__(self, sock, timeout: float):
+        self._sock = getattr(sock, "_sock", sock)
+        # 超过时限还没有回应说明 runner 卡住了：recv 抛 socket.timeout (OSError)，会话按崩溃处理
+        self._sock.settimeout(timeout)
+        self._buffer = bytearray()
+
+    def _recv_exactly(self, n: int) -> Optional[bytes]:
+        data = bytearray()
+        while len(data) < n:
+            chunk = self._sock.recv(n - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return bytes(data)
+
+    def read(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            header = self._recv_exactly(8)
+            if header is None:
+                break
+            stream, size = struct.unpack(">BxxxL", header)
+            data = self._recv_exactly(size) or b""
+            if stream == 1:
+                self._buffer += data
+            elif data:
+                logger.warning("sandbox_runner_stderr", output=data[-500:].decode("utf-8", errors="ignore"))
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    def write(self, data: bytes) -> None:
+        self._sock.sendall(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
 @trace_span(span_name="sandbox_execute")
 class PersistentSandbox:
     """
@@ -25,10 +106,21 @@ class PersistentSandbox:
     针对M1芯片和Docker Desktop优化
     """
     
-    def __init__(self, image: str = SANDBOX_IMAGE, timeout: int = SANDBOX_TIMEOUT):
+    def __init__(self, image: str = SANDBOX_IMAGE, timeout: int = SANDBOX_TIMEOUT, cpu_timeout: int = SANDBOX_CPU_TIMEOUT,
+                 use_runner: bool = SANDBOX_RUNNER):
+        # docker SDK 导入较慢，只在真正需要沙箱时导入
+        import docker
         self.client = docker.from_env()
         self.image = image
         self.timeout = timeout
+        self.cpu_timeout = cpu_timeout
+        with open(_RUNNER_PATH, encoding="utf-8") as f:
+            self._runner = f.read()
+        # 常驻 runner：首次执行时在容器里启动，起不来就退回每次 exec_run 新起解释器
+        self.use_runner = use_runner
+        self._session: Optional[RunnerSession] = None
+        self._stream: Optional[_ExecSocketStream] = None
+        self._runner_lock = threading.Lock()
         self.container = None
         self._initialize_container()
     
@@ -46,7 +138,7 @@ class PersistentSandbox:
                 working_dir="/workspace",
                 tty=True 
             )
-            time.sleep(3)
+            self._wait_until_running()
             # 记录容器启动成功
             logger.info("sandbox_container_started", container_id=self.container.id[:12])
             
@@ -55,8 +147,20 @@ class PersistentSandbox:
             logger.error("sandbox_init_failed", error=str(e))
             self.container = None
 
+    def _wait_until_running(self) -> None:
+        """轮询容器状态，running 后立即返回 (代替固定的 sleep)"""
+        deadline = time.monotonic() + _STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            self.container.reload()
+            if self.container.status == "running":
+                return
+            if self.container.status in ("exited", "dead"):
+                raise RuntimeError(f"container {self.container.status}")
+            time.sleep(_STARTUP_POLL)
+        raise TimeoutError("container did not start in time")
+
     @trace_span(span_name="sandbox_execute")
-    def execute_code(self, code: str, test_runner: str) -> Tuple[int, str, str]:
+    def execute_code(self, code: str, test_runner: str) -> ExecutionResult:
         # 获取当前的上下文 (Token)
         ctx = context.get_current()
         
@@ -69,28 +173,91 @@ class PersistentSandbox:
                 if not self.container:
                     self._initialize_container()
                     if not self.container:
-                        return -1, "", "容器未就绪"
+                        # 抛异常：沙箱池按崩溃回收，评估结果也不会被当作确定的失败缓存下来
+                        raise RuntimeError("容器未就绪")
                 
+                if self.use_runner:
+                    result = self._execute_in_runner(code, test_runner)
+                    if result is not None:
+                        return result
+
+                # 每次执行用独立的工作目录，并发执行互不覆盖；执行完在同一条命令里删掉
+                workdir = f"/workspace/run-{uuid.uuid4().hex}"
                 full_code = f"{code}\n\nif __name__ == '__main__':\n{test_runner}"
-                self._upload_to_container("/workspace/test_code.py", full_code)
-                result = self.container.exec_run("python /workspace/test_code.py", stdout=True, stderr=True)
+                self._upload_to_container({f"{workdir}/test_code.py": full_code, f"{workdir}/runner.py": self._runner})
+                # runner.py 负责墙钟 / CPU 时限和资源统计；外层 timeout 兜底，runner 自己卡住也会被杀掉
+                script = (f"cd {shlex.quote(workdir)} && timeout -s KILL {self.timeout + _KILL_GRACE} "
+                          f"python runner.py --run test_code.py {self.timeout} {self.cpu_timeout}; "
+                          f"rc=$?; rm -rf {shlex.quote(workdir)}; exit $rc")
+                started = time.monotonic()
+                result = self.container.exec_run(["sh", "-c", script], stdout=True, stderr=True)
                 output = result.output.decode("utf-8", errors="ignore")
-                return result.exit_code, output, ""
+                return parse_runner_output(output, result.exit_code, time.monotonic() - started,
+                                           self.timeout, self.cpu_timeout)
             finally:
                 context.detach(token)
 
         
         return _run_in_thread()
+
+    def _start_runner(self) -> None:
+        """上传 runner 并在容器里常驻运行，stdin / stdout 经 docker exec 的 socket 收发"""
+        self._upload_to_container({_RUNNER_CONTAINER_PATH: self._runner})
+        exec_result = self.container.exec_run(["python", _RUNNER_CONTAINER_PATH, SANDBOX_PRELOAD],
+                                              stdin=True, socket=True, workdir="/workspace")
+        stream = _ExecSocketStream(exec_result.output, self.timeout + _KILL_GRACE)
+        session = RunnerSession(stream, stream)
+        try:
+            session.hello()
+        except Exception:
+            stream.close()
+            raise
+        self._stream, self._session = stream, session
+        logger.info("sandbox_runner_started", container_id=self.container.id[:12])
+
+    def _stop_runner(self) -> None:
+        stream, self._stream, self._session = self._stream, None, None
+        if stream is not None:
+            # 关掉连接，runner 读到 EOF 自行退出
+            stream.close()
+
+    def _execute_in_runner(self, code: str, test_runner: str) -> Optional[ExecutionResult]:
+        """交给常驻 runner 执行 (同一道题的 harness 只上传、编译一次)；runner 起不来时返回 None"""
+        with self._runner_lock:
+            if self._session is None:
+                try:
+                    self._start_runner()
+                except Exception as e:
+                    logger.warning("sandbox_runner_unavailable", error=str(e))
+                    self.use_runner = False
+                    return None
+            try:
+                result = self._session.run(code, test_runner, self.timeout, {"cpu_s": self.cpu_timeout})
+            except RuntimeError:
+                # runner 退出或卡住：抛出去由沙箱池回收整个容器
+                self._stop_runner()
+                raise
+        return ExecutionResult(**result).note_timeout(self.timeout, self.cpu_timeout)
     
-    def _upload_to_container(self, container_path: str, content: str) -> None:
-        """通过tar格式上传文件到容器 - M1兼容版本"""
+    def _upload_to_container(self, files: Dict[str, str]) -> None:
+        """通过tar格式上传文件到容器 - M1兼容版本 (路径位于 /workspace 下，父目录随归档一起创建)"""
         try:
             tar_buffer = io.BytesIO()
             with tarfile.open(fileobj=tar_buffer, mode='w') as tar:
-                data = content.encode("utf-8")
-                file_info = tarfile.TarInfo(name="test_code.py")
-                file_info.size = len(data)
-                tar.addfile(file_info, io.BytesIO(data))
+                parents = set()
+                for container_path, content in files.items():
+                    relpath = os.path.relpath(container_path, "/workspace")
+                    parent = os.path.dirname(relpath)
+                    if parent and parent not in parents:
+                        parents.add(parent)
+                        dir_info = tarfile.TarInfo(name=parent)
+                        dir_info.type = tarfile.DIRTYPE
+                        dir_info.mode = 0o755
+                        tar.addfile(dir_info)
+                    data = content.encode("utf-8")
+                    file_info = tarfile.TarInfo(name=relpath)
+                    file_info.size = len(data)
+                    tar.addfile(file_info, io.BytesIO(data))
             
             tar_buffer.seek(0)
             self.container.put_archive("/workspace", tar_buffer)
@@ -99,8 +266,27 @@ class PersistentSandbox:
             # 🔧 修正：记录上传失败
             logger.error("sandbox_upload_failed", error=str(e))
     
+    def is_healthy(self) -> bool:
+        """容器仍在运行且能执行命令 (runner 已启动时要求它能应答)"""
+        if not self.container:
+            return False
+        try:
+            self.container.reload()
+            if self.container.status != "running":
+                return False
+            with self._runner_lock:
+                if self._session is not None:
+                    # 常驻 runner 能应答就说明容器和 runner 都正常
+                    return self._session.ping()
+            return self.container.exec_run(["true"]).exit_code == 0
+        except Exception as e:
+            logger.warning("sandbox_health_check_failed", error=str(e))
+            return False
+
     def cleanup(self) -> None:
         """清理容器资源"""
+        with self._runner_lock:
+            self._stop_runner()
         if self.container:
             try:
                 self.container.stop()
@@ -110,11 +296,25 @@ class PersistentSandbox:
                 # 🔧 修正
                 logger.error("sandbox_cleanup_failed", error=str(e))
 
-# --- 全局单例 ---
-_global_sandbox = PersistentSandbox()
+# --- 全局单例 (首次执行代码时才创建容器) ---
+_global_sandbox: Optional[PersistentSandbox] = None
+_sandbox_lock = threading.Lock()
 
-def execute_code(code: str, test_runner: str) -> Tuple[int, str, str]:
-    return _global_sandbox.execute_code(code, test_runner)
 
-import atexit
-atexit.register(_global_sandbox.cleanup)
\ No newline at end of file
+def get_sandbox() -> PersistentSandbox:
+    global _global_sandbox
+    if _global_sandbox is None:
+        with _sandbox_lock:
+            if _global_sandbox is None:
+                sandbox = PersistentSandbox()
+                atexit.register(sandbox.cleanup)
+                _global_sandbox = sandbox
+    return _global_sandbox
+
+
+def execute_code(code: str, test_runner: str) -> ExecutionResult:
+    """从沙箱池借一个容器执行 (并发调用分散到不同容器)"""
+    from src.reason_code.executor.sandbox_pool import get_pool
+
+    with get_pool().lease() as sandbox:
+        return sandbox.execute_code(code, test_runner)
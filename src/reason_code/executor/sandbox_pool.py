@@ -0,0 +1,227 @@
+"""
+沙箱容器池
+- 预热 N 个常驻容器 (默认每个 CPU 核一个)，并发评估分散到不同容器，不再挤在同一个容器上串行执行
+- 同步借还 (lease，评估器在执行器线程里用) 与异步借还 (checkout，不占事件循环)
+- 容器执行 SANDBOX_MAX_RUNS 次后、执行中抛异常或健康检查失败时回收，后台补一个新的预热容器
+- 空闲超过 SANDBOX_HEALTH_INTERVAL 秒的容器借出前先做健康检查
+"""
+import time
+import atexit
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Optional
+
+import structlog
+
+from src.reason_code.utils.config import SANDBOX_BACKEND, SANDBOX_POOL_SIZE, SANDBOX_MAX_RUNS, SANDBOX_HEALTH_INTERVAL
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass
+class _Slot:
+    sandbox: Any
+    runs: int = 0
+    last_used: float = 0.0
+
+
+def _default_factory():
+    """按 SANDBOX_BACKEND 创建沙箱：local 为本机 fork server，其余为 Docker 容器"""
+    if SANDBOX_BACKEND == "local":
+        from src.reason_code.executor.local_sandbox import LocalForkSandbox
+        return LocalForkSandbox()
+    from src.reason_code.executor.sandbox import PersistentSandbox
+    return PersistentSandbox()
+
+
+class SandboxPool:
+    """
+    固定大小的沙箱池；factory 返回带 execute_code / cleanup (可选 is_healthy) 的对象
+    容器按需创建：start() 在后台把池子补满，借出时池子没满且没有空闲容器就在调用线程里创建
+    """
+
+    def __init__(self, size: int = SANDBOX_POOL_SIZE, factory: Optional[Callable[[], Any]] = None,
+                 max_runs: int = SANDBOX_MAX_RUNS, health_interval: float = SANDBOX_HEALTH_INTERVAL):
+        self.size = max(1, size)
+        self.factory = factory or _default_factory
+        self.max_runs = max(1, max_runs)
+        self.health_interval = health_interval
+        self._idle: Deque[_Slot] = deque()
+        self._total = 0  # 已创建 + 正在创建的容器数
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {
+            "created": 0,
+            "create_failures": 0,
+            "checkouts": 0,
+            "waits": 0,  # 借出时没有空闲容器、需要等待的次数
+            "recycled": 0,
+            "crashed": 0,
+            "health_failures": 0,
+        }
+
+    # ---------- 创建与回收 ----------
+
+    def start(self) -> None:
+        """后台并行预热到 size 个容器 (不阻塞)"""
+        with self._cond:
+            missing = self.size - self._total
+            self._total += missing
+        for _ in range(missing):
+            threading.Thread(target=self._warm_one, name="sandbox-warmup", daemon=True).start()
+
+    def _create(self) -> _Slot:
+        try:
+            sandbox = self.factory()
+        except BaseException:
+            with self._cond:
+                self._total -= 1
+                self.stats["create_failures"] += 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self.stats["created"] += 1
+        return _Slot(sandbox, last_used=time.monotonic())
+
+    def _warm_one(self) -> None:
+        try:
+            slot = self._create()
+        except Exception as e:
+            logger.error("sandbox_pool_warmup_failed", error=str(e))
+            return
+        with self._cond:
+            if self._closed:
+                self._total -= 1
+            else:
+                self._idle.append(slot)
+                self._cond.notify()
+                return
+        self._dispose(slot)
+
+    def _dispose(self, slot: _Slot) -> None:
+        try:
+            slot.sandbox.cleanup()
+        except Exception as e:
+            logger.warning("sandbox_pool_cleanup_failed", error=str(e))
+
+    def _recycle(self, slot: _Slot, reason: str) -> None:
+        """丢弃容器并在后台补一个新的"""
+        logger.info("sandbox_recycled", reason=reason, runs=slot.runs)
+        with self._cond:
+            self.stats["recycled"] += 1
+            self._total -= 1
+        threading.Thread(target=self._dispose, args=(slot,), name="sandbox-cleanup", daemon=True).start()
+        if not self._closed:
+            self.start()
+
+    def _healthy(self, slot: _Slot) -> bool:
+        check = getattr(slot.sandbox, "is_healthy", None)
+        return check is None or check()
+
+    # ---------- 借还 ----------
+
+    def acquire(self, timeout: Optional[float] = None) -> _Slot:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            slot = None
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("sandbox pool closed")
+                if not self._idle and self._total >= self.size:
+                    self.stats["waits"] += 1
+                while not self._idle and self._total >= self.size:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("no sandbox available")
+                    self._cond.wait(remaining)
+                    if self._closed:
+                        raise RuntimeError("sandbox pool closed")
+                if self._idle:
+                    slot = self._idle.popleft()
+                else:
+                    self._total += 1
+            if slot is None:
+                # 池子没满：在调用线程里直接创建 (失败时把异常交给调用方)
+                slot = self._create()
+            elif time.monotonic() - slot.last_used > self.health_interval and not self._healthy(slot):
+                with self._cond:
+                    self.stats["health_failures"] += 1
+                self._recycle(slot, "health_check")
+                continue
+            with self._cond:
+                self.stats["checkouts"] += 1
+            return slot
+
+    def release(self, slot: _Slot, broken: bool = False) -> None:
+        slot.runs += 1
+        slot.last_used = time.monotonic()
+        if broken:
+            with self._cond:
+                self.stats["crashed"] += 1
+            self._recycle(slot, "crash")
+            return
+        if slot.runs >= self.max_runs:
+            self._recycle(slot, "max_runs")
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append(slot)
+                self._cond.notify()
+                return
+            self._total -= 1
+        self._dispose(slot)
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """同步借出一个沙箱；块内抛异常视为容器崩溃，归还时回收"""
+        slot = self.acquire(timeout)
+        broken = False
+        try:
+            yield slot.sandbox
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            self.release(slot, broken)
+
+    @asynccontextmanager
+    async def checkout(self, timeout: Optional[float] = None):
+        """异步借出：等待空闲容器放在线程里，不阻塞事件循环"""
+        slot = await asyncio.to_thread(self.acquire, timeout)
+        broken = False
+        try:
+            yield slot.sandbox
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            self.release(slot, broken)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for slot in idle:
+            self._dispose(slot)
+
+
+# --- 全局单例 (首次执行代码时才创建并开始预热) ---
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SandboxPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = SandboxPool()
+                pool.start()
+                atexit.register(pool.close)
+                _pool = pool
+    return _pool
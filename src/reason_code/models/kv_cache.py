@@ -0,0 +1,109 @@
+"""
+前缀 KV Cache：复用固定 system prompt / 当前节点代码前缀的 past_key_values
+"""
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# 当前搜索的统计字典 (EnhancedMCTS.stats)，命中/未命中会同时累加到这里
+_search_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("prefix_cache_search_stats", default=None)
+
+
+def bind_search_stats(stats: Dict[str, Any]):
+    """把命中统计绑定到当前上下文 (返回 token，可用于 reset)"""
+    return _search_stats.set(stats)
+
+
+def prefix_key(model_name: str, token_ids: Sequence[int]) -> str:
+    """缓存键：模型名 + 前缀 token 序列的哈希"""
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    h.update(",".join(map(str, token_ids)).encode("ascii"))
+    return h.hexdigest()
+
+
+def cache_layers(cache: Any) -> List[Tuple[Any, Any]]:
+    """按层取出 DynamicCache 的 (key, value) 张量 (兼容新旧版 transformers)"""
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        return [(layer.keys, layer.values) for layer in layers if getattr(layer, "keys", None) is not None]
+    return list(zip(getattr(cache, "key_cache", []), getattr(cache, "value_cache", [])))
+
+
+def cache_nbytes(cache: Any) -> int:
+    """估算 DynamicCache 占用的字节数"""
+    total = 0
+    for k, v in cache_layers(cache):
+        total += k.nelement() * k.element_size() + v.nelement() * v.element_size()
+    return total
+
+
+class PrefixKVCache:
+    """
+    LRU + 字节预算的前缀 KV Cache
+    存入与取出都是深拷贝，调用方可以放心地在拿到的 cache 上继续预填充/解码
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count("misses")
+                return None
+            self._entries.move_to_end(key)
+            self._count("hits")
+            return copy.deepcopy(entry[0])
+
+    def put(self, key: str, cache: Any) -> None:
+        nbytes = cache_nbytes(cache)
+        if nbytes > self.max_bytes:
+            logger.debug("prefix_cache_skip_oversized", nbytes=nbytes, max_bytes=self.max_bytes)
+            return
+        snapshot = copy.deepcopy(cache)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            while self._entries and self._bytes + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[key] = (snapshot, nbytes)
+            self._bytes += nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, field: str) -> None:
+        setattr(self, field, getattr(self, field) + 1)
+        search_stats = _search_stats.get()
+        if search_stats is not None:
+            key = f"prefix_cache_{field}"
+            search_stats[key] = search_stats.get(key, 0) + 1
@@ -8,16 +8,26 @@ load_dotenv()
 import os
 import re
 import ast
+import copy
+import time
 import asyncio
+import functools
+import threading
+import contextvars
 import logging
+from importlib.util import find_spec
 import structlog
 from src.reason_code.utils.logger import logger as global_logger
 from src.reason_code.models.base import BaseModel
 logger = structlog.get_logger(__name__)
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from src.reason_code.utils.trace import trace_span
-from datetime import datetime, timedelta
-import httpx
+from src.reason_code.models.kv_cache import PrefixKVCache, prefix_key, cache_layers
+from src.reason_code.models.scheduler import get_scheduler, PRIORITY_NORMAL
+from src.reason_code.models.streaming import CodeBlockStoppingCriteria, truncate_at_completion
+from src.reason_code.models.speculative import prompt_lookup_generate
+from src.reason_code.models.local_backend import load_local_model
+from src.reason_code.utils.cache import LRUCache, SQLiteCache, TieredCache, make_cache_key
 
 # 环境变量
 LLM_API_KEY = os.getenv("LLM_API_KEY")
@@ -30,54 +40,85 @@ LLM_DEBUG = os.getenv("LLM_DEBUG", "False") == "True"
 LORA_MODEL_PATH = os.getenv("LORA_MODEL_PATH", "lora-reason-coder-v3")
 BASE_MODEL_NAME = os.getenv("BASE_MODEL_NAME", "Qwen/Qwen2.5-Coder-1.5B-Instruct")
 USE_LOCAL_LORA = os.getenv("USE_LOCAL_LORA", "True") == "True"
+# 推理后端：peft (FP16 基座 + LoRA 包装) | merged (合并后 fp32) | merged_int8 | merged_bf16
+LLM_BACKEND = os.getenv("LLM_BACKEND", "peft")
+
+# 采样配置
+LLM_MAX_NEW_TOKENS = int(os.getenv("LLM_MAX_NEW_TOKENS", "512"))
+_SAMPLING_TEMPERATURE = 0.7
+_SAMPLING_TOP_P = 0.9
+
+# 批量采样：一次预填充 prompt，同一批内并行解码多个候选
+# LLM_GEN_MEMORY_MB 是批量解码可用的 KV Cache 预算，超出时才拆成多个小批次
+LLM_BATCHED_SAMPLING = os.getenv("LLM_BATCHED_SAMPLING", "True") == "True"
+LLM_GEN_MEMORY_MB = int(os.getenv("LLM_GEN_MEMORY_MB", "2048"))
+
+# 前缀 KV Cache：复用 system prompt / 节点代码前缀的预填充结果
+LLM_PREFIX_CACHE = os.getenv("LLM_PREFIX_CACHE", "True") == "True"
+LLM_PREFIX_CACHE_MB = int(os.getenv("LLM_PREFIX_CACHE_MB", "256"))
+
+# 推理调度器：并发请求合并成批次，由唯一的模型副本执行
+LLM_SCHEDULER = os.getenv("LLM_SCHEDULER", "True") == "True"
+
+# 提前停止：代码块闭合 (或完整 def 之后回到第 0 列) 就结束解码
+LLM_EARLY_STOP = os.getenv("LLM_EARLY_STOP", "True") == "True"
+
+# 解码模式：sample (普通采样) | prompt_lookup (从 prompt 复制 n-gram 草稿的投机解码)
+# prompt_lookup 与 sample 按同一 generation_config 采样 (见 _speculative_sampling)，逐序列解码，适合大段照抄输入代码的修复任务
+LLM_DECODING = os.getenv("LLM_DECODING", "sample")
+LLM_SPEC_DRAFT_TOKENS = int(os.getenv("LLM_SPEC_DRAFT_TOKENS", "10"))
+LLM_SPEC_NGRAM = int(os.getenv("LLM_SPEC_NGRAM", "3"))
+DECODING_MODES = ("sample", "prompt_lookup")
 
 # 缓存配置
 _CACHE_MAXSIZE = 128
 _CACHE_TTL_SECONDS = 300
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+# 设置后启用 SQLite 磁盘层：候选在重启后仍可命中，并在多个 worker 之间共享
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+LLM_CACHE_DISK_TTL = int(os.getenv("LLM_CACHE_DISK_TTL", "86400"))
 
 # 并发控制
 _MAX_CONCURRENT_REQUESTS = 5
 _semaphore = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
 
 
-# 尝试导入本地推理依赖
-try:
+# 检查本地推理依赖是否安装；torch / transformers 导入需要数秒，推迟到模型初始化时
+_LOCAL_INFERENCE_DEPS = ("torch", "transformers", "peft")
+_missing_deps = [name for name in _LOCAL_INFERENCE_DEPS if find_spec(name) is None]
+LOCAL_INFERENCE_AVAILABLE = not _missing_deps
+if _missing_deps:
+    logger.warning("dependency_check_failed", missing=_missing_deps, status="fallback_to_api")
+
+
+def _import_inference_deps() -> None:
+    """首次初始化本地模型时导入推理依赖，绑定为模块级名字供 LocalLoraModel 使用"""
+    global torch, F, AutoTokenizer, DynamicCache, LogitsProcessorList, StoppingCriteriaList, TextIteratorStreamer
     import torch
-    from transformers import AutoTokenizer, AutoModelForCausalLM
-    from peft import PeftModel
-    LOCAL_INFERENCE_AVAILABLE = True
+    import torch.nn.functional as F
+    from transformers import AutoTokenizer, DynamicCache, LogitsProcessorList, StoppingCriteriaList, TextIteratorStreamer
     logger.info("dependency_check", status="local_inference_available")
-except ImportError as e:
-    LOCAL_INFERENCE_AVAILABLE = False
-    logger.warning("dependency_check_failed", error=str(e), status="fallback_to_api")
-
-class TTLCache:
-    def __init__(self, maxsize: int = _CACHE_MAXSIZE, ttl: int = _CACHE_TTL_SECONDS):
-        self.maxsize = maxsize
-        self.ttl = ttl
-        self._cache: Dict[str, Any] = {}
-        self._access_times: Dict[str, datetime] = {}
-
-    def get(self, key: str) -> Optional[Any]:
-        now = datetime.utcnow()
-        if key in self._cache:
-            if now - self._access_times.get(key, now) < timedelta(seconds=self.ttl):
-                self._access_times[key] = now
-                return self._cache[key]
-            else:
-                self._cache.pop(key, None)
-                self._access_times.pop(key, None)
-        return None
 
-    def set(self, key: str, value: Any):
-        if len(self._cache) >= self.maxsize:
-            oldest_key = min(self._access_times, key=lambda k: self._access_times[k])
-            self._cache.pop(oldest_key, None)
-            self._access_times.pop(oldest_key, None)
-        self._cache[key] = value
-        self._access_times[key] = datetime.utcnow()
 
-_candidate_cache = TTLCache()
+def _build_candidate_cache() -> TieredCache:
+    memory = LRUCache(maxsize=_CACHE_MAXSIZE, ttl=_CACHE_TTL_SECONDS, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024)
+    disk = None
+    if LLM_CACHE_DB:
+        try:
+            disk = SQLiteCache(LLM_CACHE_DB, namespace="candidates", ttl=LLM_CACHE_DISK_TTL)
+        except Exception as e:
+            logger.warning("disk_cache_unavailable", path=LLM_CACHE_DB, error=str(e))
+    return TieredCache(memory, disk)
+
+
+def candidate_cache_key(prompt: str, model_id: str, n: int,
+                        temperature: float = _SAMPLING_TEMPERATURE, top_p: float = _SAMPLING_TOP_P) -> str:
+    """候选缓存键：prompt + 模型 + 候选数 + 采样参数"""
+    return make_cache_key("candidates", prompt, model_id, n, temperature, top_p)
+
+
+_candidate_cache = _build_candidate_cache()
+_prefix_cache = PrefixKVCache(max_bytes=LLM_PREFIX_CACHE_MB * 1024 * 1024)
 
 class LocalLoraModel(BaseModel):
     """LoRA本地模型管理 - Qwen 适配版"""
@@ -91,6 +132,13 @@ class LocalLoraModel(BaseModel):
         self.model = None
         self.tokenizer = None
         self._initialized = False
+        # 模型标识 (基座 + 适配器 + 后端)，用于各级缓存的键；不同后端的数值结果不同
+        self.model_id = f"{BASE_MODEL_NAME}:{LORA_MODEL_PATH}"
+        if LLM_BACKEND != "peft":
+            self.model_id += f":{LLM_BACKEND}"
+        # 累计生成统计，供 benchmark / 监控读取
+        self.metrics = {"calls": 0, "sequences": 0, "batches": 0, "new_tokens": 0,
+                        "spec_forward_passes": 0, "spec_drafted": 0, "spec_accepted": 0, "spec_new_tokens": 0}
         # 强制使用 CPU 以规避 MPS 的 4GB 张量限制
         # M1 CPU 跑 1.5B 模型速度很快，且极其稳定
         self.device = "cpu"
@@ -113,7 +161,8 @@ class LocalLoraModel(BaseModel):
             return False
         
         try:
-            logger.info("model_loading_start", base_model=BASE_MODEL_NAME, device=self.device)
+            _import_inference_deps()
+            logger.info("model_loading_start", base_model=BASE_MODEL_NAME, device=self.device, backend=LLM_BACKEND)
             
             # 加载 Tokenizer
             self.tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME)
@@ -122,17 +171,8 @@ class LocalLoraModel(BaseModel):
             # 强制限制为 2048 (足够代码修复使用)
             self.tokenizer.model_max_length = 2048
             
-            # 加载基座模型 (FP16以节省显存)
-            base_model = AutoModelForCausalLM.from_pretrained(
-                BASE_MODEL_NAME,
-                torch_dtype=torch.float16,
-                device_map=self.device
-            )
-            
-            logger.info("loading_lora_weights", path=LORA_MODEL_PATH)
-            # 加载 LoRA 适配器
-            self.model = PeftModel.from_pretrained(base_model, LORA_MODEL_PATH)
-            self.model.eval() # 切换到推理模式
+            # 加载基座模型 + LoRA 适配器 (peft 后端为 FP16 包装；合并后端读取缓存的合并产物)
+            self.model = load_local_model(LLM_BACKEND, BASE_MODEL_NAME, LORA_MODEL_PATH, self.device)
             
             self._initialized = True
             logger.info("✅ LoRA模型加载完成")
@@ -143,171 +183,532 @@ class LocalLoraModel(BaseModel):
             return False
     
     @trace_span(span_name="llm_generate_local")
-    def generate(self, code_snippet: str, num_return_sequences: int = 3) -> List[str]:
-        """使用LoRA模型生成代码 - 串行生成以避免MPS内存溢出"""
+    def generate(self, code_snippet: str, num_return_sequences: int = 3, batched: Optional[bool] = None,
+                 prefix_hint: Optional[str] = None, decoding: Optional[str] = None) -> List[str]:
+        """
+        使用LoRA模型生成代码
+        batched=True: 预填充一次 prompt，批量解码全部候选 (CPU 默认)
+        batched=False: 逐个串行生成 (规避 MPS 的 4GB 张量限制)
+        prefix_hint: code_snippet 中可跨调用复用的开头部分 (如当前节点代码)，其 KV 会被缓存
+        decoding: "sample" | "prompt_lookup"，默认取 LLM_DECODING
+        """
         if not self._initialized and not self.initialize():
             return []
-        
-        candidates = []
-        import gc
-        
+
+        decoding = decoding or LLM_DECODING
+        if batched is None:
+            batched = LLM_BATCHED_SAMPLING and self.device != "mps"
+
         try:
-            # 使用 Chat Template 构建 Prompt
-            messages = [
-                {"role": "system", "content": "你是一个Python代码修复专家。请修复输入的代码错误，仅输出修复后的完整代码，不要解释。"},
-                {"role": "user", "content": code_snippet}
-            ]
-            
-            text_prompt = self.tokenizer.apply_chat_template(
-                messages, 
-                tokenize=False, 
-                add_generation_prompt=True
-            )
-            
-            inputs = self.tokenizer(text_prompt, return_tensors="pt").to(self.device)
-            
-            # MPS 限制单张量 < 4GB。并行生成多个序列容易触发此限制。
-            # 改为循环生成，每次生成一个，用完立即清理显存。
-            for i in range(num_return_sequences):
-                try:
-                    with torch.no_grad():
-                        outputs = self.model.generate(
-                            **inputs,
-                            max_new_tokens=512,
-                            num_return_sequences=1,  # 每次只生成 1 个
-                            temperature=0.7,
-                            top_p=0.9,
-                            do_sample=True,
-                            pad_token_id=self.tokenizer.eos_token_id
-                        )
-                    
-                    full_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                    
-                    # 提取逻辑
-                    if "assistant" in full_text:
-                        clean_code = full_text.split("assistant")[-1].strip()
-                    elif code_snippet in full_text:
-                        clean_code = full_text.replace(code_snippet, "").strip()
-                        if "你是一个Python代码修复专家" in clean_code:
-                             clean_code = clean_code.split("不要解释。")[-1].strip()
-                    else:
-                        clean_code = full_text
-
-                    code = self._extract_generated_code(clean_code)
-                    if code and self._is_valid_syntax(code):
-                        candidates.append(code)
-                    
-                except Exception as inner_e:
-                    logger.warning("generation_attempt_failed", error=str(inner_e))
-                    continue
-                finally:
-                    # === 显存清理 ===
-                    # 每次生成后强制清理 MPS 缓存
-                    if self.device == "mps":
-                        torch.mps.empty_cache()
-                        gc.collect()
-
-            # 去重
-            unique_candidates = list(set(candidates))
+            if batched or decoding == "prompt_lookup":
+                candidates = self.generate_batch([code_snippet], [num_return_sequences], [prefix_hint], decoding=decoding)[0]
+            else:
+                inputs, _ = self._build_inputs(code_snippet)
+                self.metrics["calls"] += 1
+                candidates = self._generate_sequential(inputs, code_snippet, num_return_sequences)
+
+            # 去重 (保持生成顺序)
+            unique_candidates = list(dict.fromkeys(candidates))
             if len(unique_candidates) > 0:
-                logger.info("generation_complete", count=len(unique_candidates), method="lora_local")
+                logger.info("generation_complete", count=len(unique_candidates), method="lora_local", batched=batched)
             return unique_candidates
             
         except Exception as e:
             logger.error("generation_loop_failed", error=str(e))
             return []
 
+    def _build_inputs(self, code_snippet: str, prefix_hint: Optional[str] = None):
+        """
+        使用 Chat Template 构建 Prompt 并编码
+        返回 (inputs, boundaries)，boundaries 为可复用前缀的 token 长度 (system 前缀、节点前缀)
+        """
+        messages = [
+            {"role": "system", "content": "你是一个Python代码修复专家。请修复输入的代码错误，仅输出修复后的完整代码，不要解释。"},
+            {"role": "user", "content": code_snippet}
+        ]
+        
+        text_prompt = self.tokenizer.apply_chat_template(
+            messages, 
+            tokenize=False, 
+            add_generation_prompt=True
+        )
+        
+        # user 内容之前的部分 (system 消息 + 模板标记) 对所有调用都相同
+        user_start = text_prompt.rfind(code_snippet)
+        if not LLM_PREFIX_CACHE or user_start < 0:
+            return self.tokenizer(text_prompt, return_tensors="pt").to(self.device), []
+
+        segments = [text_prompt[:user_start]]
+        rest_start = user_start
+        if prefix_hint and code_snippet.startswith(prefix_hint):
+            segments.append(prefix_hint)
+            rest_start += len(prefix_hint)
+        segments.append(text_prompt[rest_start:])
+
+        # 分段编码，保证同一前缀总是得到同一串 token
+        token_ids: List[int] = []
+        boundaries = []
+        for i, segment in enumerate(segments):
+            token_ids.extend(self.tokenizer(segment, add_special_tokens=(i == 0))["input_ids"])
+            boundaries.append(len(token_ids))
+
+        input_ids = torch.tensor([token_ids], device=self.device)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        return inputs, boundaries[:-1]
+
+    def _sampling_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            max_new_tokens=LLM_MAX_NEW_TOKENS,
+            temperature=_SAMPLING_TEMPERATURE,
+            top_p=_SAMPLING_TOP_P,
+            do_sample=True,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+
+    def _speculative_sampling(self, prompt_len: int):
+        """
+        投机解码用的 (logits 处理链, eos 列表)，与 generate 的采样路径按同一 generation_config 构造：
+        模型自带的 top_k / repetition_penalty 等与这里的 temperature / top_p 一起生效，遇到任一 eos 停止
+        """
+        config = copy.deepcopy(self.model.generation_config)
+        config.update(**self._sampling_kwargs())
+        processor = self.model._get_logits_processor(
+            generation_config=config,
+            input_ids_seq_length=prompt_len,
+            encoder_input_ids=None,
+            prefix_allowed_tokens_fn=None,
+            logits_processor=LogitsProcessorList(),
+            device=self.device,
+        )
+        eos = config.eos_token_id if config.eos_token_id is not None else self.tokenizer.eos_token_id
+        return processor, [eos] if isinstance(eos, int) else list(eos)
+
+    def _stopping_kwargs(self, prompt_len: int, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        if not LLM_EARLY_STOP and cancel_event is None:
+            return {}
+        criteria = CodeBlockStoppingCriteria(self.tokenizer, prompt_len, enabled=LLM_EARLY_STOP, cancel_event=cancel_event)
+        return {"stopping_criteria": StoppingCriteriaList([criteria])}
+
+    def _generate_sequential(self, inputs, code_snippet: str, num_return_sequences: int) -> List[str]:
+        """串行生成：每次生成一个，用完立即清理显存"""
+        candidates = []
+        import gc
+
+        # MPS 限制单张量 < 4GB。并行生成多个序列容易触发此限制。
+        # 改为循环生成，每次生成一个，用完立即清理显存。
+        for i in range(num_return_sequences):
+            try:
+                with torch.no_grad():
+                    outputs = self.model.generate(
+                        **inputs,
+                        num_return_sequences=1,  # 每次只生成 1 个
+                        **self._sampling_kwargs(),
+                        **self._stopping_kwargs(inputs["input_ids"].shape[1])
+                    )
+                self.metrics["batches"] += 1
+                self.metrics["sequences"] += 1
+                self.metrics["new_tokens"] += self._count_new_tokens(outputs[0, inputs["input_ids"].shape[1]:])
+                
+                full_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+                
+                # 提取逻辑
+                if "assistant" in full_text:
+                    clean_code = full_text.split("assistant")[-1].strip()
+                elif code_snippet in full_text:
+                    clean_code = full_text.replace(code_snippet, "").strip()
+                    if "你是一个Python代码修复专家" in clean_code:
+                         clean_code = clean_code.split("不要解释。")[-1].strip()
+                else:
+                    clean_code = full_text
+
+                code = self._extract_generated_code(truncate_at_completion(clean_code))
+                if code and self._is_valid_syntax(code):
+                    candidates.append(code)
+                
+            except Exception as inner_e:
+                logger.warning("generation_attempt_failed", error=str(inner_e))
+                continue
+            finally:
+                # === 显存清理 ===
+                # 每次生成后强制清理 MPS 缓存
+                if self.device == "mps":
+                    torch.mps.empty_cache()
+                    gc.collect()
+
+        return candidates
+
+    def generate_batch(self, prompts: List[str], ns: List[int],
+                       prefix_hints: Optional[List[Optional[str]]] = None,
+                       contexts: Optional[List[contextvars.Context]] = None,
+                       decoding: Optional[str] = None) -> List[List[str]]:
+        """
+        批量生成：每个 prompt 只预填充一次，KV Cache 左填充对齐后与其他 prompt 合并解码
+        仅当内存预算放不下全部序列时才拆成多个批次
+        decoding="prompt_lookup" 时改为逐序列投机解码 (草稿长度因行而异，无法合并成批)
+        返回与 prompts 一一对应的候选列表 (已去重、已过语法检查)
+        """
+        if not self._initialized and not self.initialize():
+            return [[] for _ in prompts]
+
+        decoding = decoding or LLM_DECODING
+        if decoding not in DECODING_MODES:
+            raise ValueError(f"unknown decoding mode: {decoding}")
+
+        prefix_hints = prefix_hints or [None] * len(prompts)
+        results: List[List[str]] = [[] for _ in prompts]
+        self.metrics["calls"] += len(prompts)
+
+        with torch.no_grad():
+            prefilled = []
+            for i, prompt in enumerate(prompts):
+                inputs, boundaries = self._build_inputs(prompt, prefix_hints[i])
+                input_ids = inputs["input_ids"]
+                # 前缀缓存命中统计记到提交该请求的上下文 (所属搜索) 里
+                if contexts:
+                    cache = contexts[i].run(self._prefill, input_ids, boundaries)
+                else:
+                    cache = self._prefill(input_ids, boundaries)
+                prefilled.append((input_ids, cache_layers(cache)))
+
+            # 展开成逐行的 prompt 序号，再按内存预算切分批次
+            rows = [i for i, n in enumerate(ns) for _ in range(n)]
+            if decoding == "prompt_lookup":
+                for i in rows:
+                    try:
+                        self._decode_prompt_lookup(i, prefilled, results)
+                    except Exception as inner_e:
+                        logger.warning("generation_attempt_failed", error=str(inner_e), decoding=decoding)
+                return [list(dict.fromkeys(r)) for r in results]
+
+            max_batch = self._max_batch_size(max(ids.shape[1] for ids, _ in prefilled))
+            for start in range(0, len(rows), max_batch):
+                chunk = rows[start:start + max_batch]
+                try:
+                    self._decode_rows(chunk, prefilled, results)
+                except Exception as inner_e:
+                    logger.warning("generation_attempt_failed", error=str(inner_e), batch_size=len(chunk))
+
+        return [list(dict.fromkeys(r)) for r in results]
+
+    def _decode_rows(self, rows: List[int], prefilled, results: List[List[str]]) -> None:
+        """把若干行 (可能来自不同 prompt) 的输入与 KV Cache 左填充到同一宽度后一次 generate"""
+        width = max(prefilled[i][0].shape[1] for i in rows)
+        pad_id = self.tokenizer.pad_token_id
+        if pad_id is None:
+            pad_id = self.tokenizer.eos_token_id
+
+        # 每个 prompt 只填充一次，再按行索引拼接
+        padded = {}
+        for i in dict.fromkeys(rows):
+            input_ids, layers = prefilled[i]
+            pad = width - input_ids.shape[1]
+            padded[i] = (
+                F.pad(input_ids, (pad, 0), value=pad_id),
+                F.pad(torch.ones_like(input_ids), (pad, 0), value=0),
+                [(F.pad(k, (0, 0, pad, 0)), F.pad(v, (0, 0, pad, 0))) for k, v in layers],
+            )
+
+        cache = DynamicCache(config=self.model.config)
+        for layer_idx in range(len(padded[rows[0]][2])):
+            cache.update(
+                torch.cat([padded[i][2][layer_idx][0] for i in rows]),
+                torch.cat([padded[i][2][layer_idx][1] for i in rows]),
+                layer_idx,
+            )
+
+        outputs = self.model.generate(
+            input_ids=torch.cat([padded[i][0] for i in rows]),
+            attention_mask=torch.cat([padded[i][1] for i in rows]),
+            past_key_values=cache,
+            **self._sampling_kwargs(),
+            **self._stopping_kwargs(width)
+        )
+
+        self.metrics["batches"] += 1
+        self.metrics["sequences"] += len(rows)
+        for i, row in zip(rows, outputs[:, width:]):
+            self.metrics["new_tokens"] += self._count_new_tokens(row)
+            text = self.tokenizer.decode(row, skip_special_tokens=True)
+            code = self._extract_generated_code(truncate_at_completion(text))
+            if code and self._is_valid_syntax(code):
+                results[i].append(code)
+
+    def _decode_prompt_lookup(self, i: int, prefilled, results: List[List[str]]) -> None:
+        """对第 i 个 prompt 做一次 prompt-lookup 投机解码"""
+        input_ids, layers = prefilled[i]
+        cache = DynamicCache(config=self.model.config)
+        for layer_idx, (k, v) in enumerate(layers):
+            cache.update(k, v, layer_idx)
+
+        processor, eos = self._speculative_sampling(input_ids.shape[1])
+        tokens, stats = prompt_lookup_generate(
+            self.model, input_ids, cache,
+            max_new_tokens=LLM_MAX_NEW_TOKENS,
+            eos_token_id=eos,
+            temperature=_SAMPLING_TEMPERATURE,
+            top_p=_SAMPLING_TOP_P,
+            num_draft=LLM_SPEC_DRAFT_TOKENS,
+            max_ngram=LLM_SPEC_NGRAM,
+            stopping_criteria=self._stopping_kwargs(input_ids.shape[1]).get("stopping_criteria"),
+            logits_processor=processor,
+        )
+
+        self.metrics["batches"] += 1
+        self.metrics["sequences"] += 1
+        self.metrics["spec_forward_passes"] += stats.forward_passes
+        self.metrics["spec_drafted"] += stats.drafted
+        self.metrics["spec_accepted"] += stats.accepted
+        self.metrics["spec_new_tokens"] += stats.new_tokens
+        row = torch.tensor(tokens, dtype=torch.long)
+        self.metrics["new_tokens"] += self._count_new_tokens(row)
+        logger.debug("prompt_lookup_decode", **stats.as_dict())
+
+        text = self.tokenizer.decode(row, skip_special_tokens=True)
+        code = self._extract_generated_code(truncate_at_completion(text))
+        if code and self._is_valid_syntax(code):
+            results[i].append(code)
+
+    def speculative_stats(self) -> Dict[str, float]:
+        """投机解码累计统计：接受率，以及每次前向产出的 token 数 (相对逐 token 解码的理论加速比)"""
+        m = self.metrics
+        return {
+            "acceptance_rate": m["spec_accepted"] / m["spec_drafted"] if m["spec_drafted"] else 0.0,
+            "tokens_per_forward": m["spec_new_tokens"] / m["spec_forward_passes"] if m["spec_forward_passes"] else 0.0,
+        }
+
+    async def astream(self, code_snippet: str, prefix_hint: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        流式生成单个候选：边解码边产出文本片段，代码完整后自动停止
+        调用方可以提前开始解析；中途退出时请用 contextlib.aclosing 包裹，关闭迭代器会通知解码线程停止
+        """
+        if not self._initialized and not self.initialize():
+            return
+
+        loop = asyncio.get_running_loop()
+        inputs, boundaries = self._build_inputs(code_snippet, prefix_hint)
+        input_ids = inputs["input_ids"]
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancel_event = threading.Event()
+
+        def _run():
+            try:
+                with torch.no_grad():
+                    cache = self._prefill(input_ids, boundaries)
+                    outputs = self.model.generate(
+                        input_ids=input_ids,
+                        attention_mask=inputs["attention_mask"],
+                        past_key_values=cache,
+                        streamer=streamer,
+                        **self._sampling_kwargs(),
+                        **self._stopping_kwargs(input_ids.shape[1], cancel_event)
+                    )
+                self.metrics["calls"] += 1
+                self.metrics["sequences"] += 1
+                self.metrics["new_tokens"] += self._count_new_tokens(outputs[0, input_ids.shape[1]:])
+            except Exception:
+                streamer.end()
+                raise
+
+        # 与调度器共用同一个推理线程，保证同一时刻只有一个批次占用模型
+        generation = loop.run_in_executor(get_scheduler(self).executor, contextvars.copy_context().run, _run)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, streamer, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    yield chunk
+        finally:
+            cancel_event.set()
+            await generation
+
+    def _prefill(self, input_ids, boundaries: List[int]):
+        """
+        预填充到倒数第二个 token，最后一个 token 留给 generate 驱动第一步解码
+        命中前缀 KV Cache 时只计算前缀之后的部分，并把新算出的前缀写回缓存
+        """
+        target = input_ids.shape[1] - 1
+        boundaries = [b for b in boundaries if 0 < b <= target]
+        keys = {b: prefix_key(self.model_id, input_ids[0, :b].tolist()) for b in boundaries}
+
+        # 优先复用最长的已缓存前缀
+        cache, done = None, 0
+        for b in reversed(boundaries):
+            cache = _prefix_cache.get(keys[b])
+            if cache is not None:
+                done = b
+                break
+        if cache is None:
+            cache = DynamicCache(config=self.model.config)
+
+        for b in boundaries + [target]:
+            if b <= done:
+                continue
+            self.model(input_ids=input_ids[:, done:b], past_key_values=cache, use_cache=True)
+            done = b
+            if b in keys:
+                _prefix_cache.put(keys[b], cache)
+        return cache
+
+    def _max_batch_size(self, prompt_len: int) -> int:
+        """按 KV Cache 占用估算单批可容纳的序列数"""
+        config = self.model.config
+        n_layers = config.num_hidden_layers
+        n_heads = config.num_attention_heads
+        n_kv_heads = getattr(config, "num_key_value_heads", None) or n_heads
+        head_dim = getattr(config, "head_dim", None) or config.hidden_size // n_heads
+        dtype_bytes = next(self.model.parameters()).element_size()
+
+        seq_len = prompt_len + LLM_MAX_NEW_TOKENS
+        kv_bytes = 2 * n_layers * n_kv_heads * head_dim * seq_len * dtype_bytes
+        # 每步采样时的 fp32 logits / 概率分布
+        logits_bytes = 2 * config.vocab_size * 4
+        per_sequence = kv_bytes + logits_bytes
+
+        budget = LLM_GEN_MEMORY_MB * 1024 * 1024
+        return max(1, budget // per_sequence)
+
+    def _count_new_tokens(self, row) -> int:
+        return int((row != self.tokenizer.eos_token_id).sum())
+
     def name(self) -> str:
         return "Qwen-1.5B-LoRA"
     
     def _extract_generated_code(self, text: str) -> str:
         """从生成文本中提取代码"""
-        # 1. 尝试提取 Markdown 代码块
-        code_blocks = re.findall(r'```python\s*(.*?)\s*```', text, re.DOTALL)
-        if code_blocks:
-            return code_blocks[0].strip()
-        
-        code_blocks_generic = re.findall(r'```\s*(.*?)\s*```', text, re.DOTALL)
-        if code_blocks_generic:
-            return code_blocks_generic[0].strip()
-
-        # 2. 如果没有代码块，尝试提取纯代码
-        # 移除可能存在的自然语言前缀 (e.g., "Here is the fixed code:")
-        lines = text.split('\n')
-        code_lines = []
-        started = False
-        
-        for line in lines:
-            # 简单的启发式：如果是 def, import, class 开头，或者有缩进
-            if line.strip().startswith('def ') or line.strip().startswith('import ') or line.strip().startswith('from ') or line.strip().startswith('class '):
-                started = True
-            
-            if started:
-                code_lines.append(line)
-        
-        if code_lines:
-            return '\n'.join(code_lines).strip()
-        
-        # 3. 实在不行返回原文本，交给语法检查器去判断
-        return text.strip()
+        return extract_generated_code(text)
     
     def _is_valid_syntax(self, code: str) -> bool:
         """验证代码语法"""
-        if not code: return False
-        try:
-            ast.parse(code)
-            return True
-        except SyntaxError:
-            return False
+        return is_valid_syntax(code)
+
+
+def approx_token_count(text: str) -> int:
+    """不依赖 tokenizer 的估算：ASCII 约 4 字符/token，中文约 1 字/token"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return -(-(len(text) - non_ascii) // 4) + non_ascii
+
+
+def extract_generated_code(text: str) -> str:
+    """从生成文本中提取代码 (本地模型与远程 API 共用)"""
+    # 1. 尝试提取 Markdown 代码块
+    code_blocks = re.findall(r'```python\s*(.*?)\s*```', text, re.DOTALL)
+    if code_blocks:
+        return code_blocks[0].strip()
+    
+    code_blocks_generic = re.findall(r'```\s*(.*?)\s*```', text, re.DOTALL)
+    if code_blocks_generic:
+        return code_blocks_generic[0].strip()
+
+    # 2. 如果没有代码块，尝试提取纯代码
+    # 移除可能存在的自然语言前缀 (e.g., "Here is the fixed code:")
+    lines = text.split('\n')
+    code_lines = []
+    started = False
+    
+    for line in lines:
+        # 简单的启发式：如果是 def, import, class 开头，或者有缩进
+        if line.strip().startswith('def ') or line.strip().startswith('import ') or line.strip().startswith('from ') or line.strip().startswith('class '):
+            started = True
+        
+        if started:
+            code_lines.append(line)
+    
+    if code_lines:
+        return '\n'.join(code_lines).strip()
+    
+    # 3. 实在不行返回原文本，交给语法检查器去判断
+    return text.strip()
+
+
+def is_valid_syntax(code: str) -> bool:
+    """验证代码语法"""
+    if not code: return False
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
 
 # 全局LoRA模型实例
 _local_model = LocalLoraModel()
 
-async def generate_code_candidates(prompt: str, n: int = 3, use_lora: bool = None, debug: bool = False) -> List[str]:
+async def generate_code_candidates(prompt: str, n: int = 3, use_lora: bool = None, debug: bool = False,
+                                   prefix_hint: Optional[str] = None, priority: int = PRIORITY_NORMAL,
+                                   decoding: Optional[str] = None) -> List[str]:
     """
     生成代码修复候选
-    集成 Model Router：根据任务复杂度自动选择模型
+    集成 Model Router：按各后端实测的延迟、成功率与排队情况选择模型 (ROUTER_MODE=heuristic 时沿用长度/关键词规则)
+    prefix_hint: prompt 中可复用的开头部分，本地模型会缓存它的 KV
+    priority: 本地推理调度器中的优先级 (越小越先执行)
+    decoding: 本地模型的解码模式 (None 取 LLM_DECODING)；两种模式都按模型的 generation_config 采样 (同一套 logits 处理器与 eos)，
+              输出分布相同，因此共用候选缓存
     """
     if debug:
         logger.setLevel(logging.DEBUG)
     
-    # 1. 检查缓存 (保持不变)
-    cached = _candidate_cache.get(prompt)
-    if cached:
-        logger.debug("cache_hit", count=len(cached))
-        return cached
+    # 1. 引入 Router (延迟导入，防止循环引用)
+    from src.reason_code.models.router import get_router
+    router = get_router()
 
-    # 2. 引入 Router (延迟导入，防止循环引用)
-    from src.reason_code.models.router import router
+    # 2-3. 估算 prompt token 数并选择后端 (Router 会决定给 Qwen 还是 GPT-4)
+    decision = router.select(prompt, n)
+    model = decision.model
 
-    # 3. 判断任务复杂度 (Heuristic / 启发式策略)
-    # 逻辑：如果 Prompt 很长(>1000字符)，或者包含复杂的关键词，算 Hard 任务
-    is_hard_task = len(prompt) > 1000 or "class " in prompt
-    complexity = "hard" if is_hard_task else "easy"
+    logger.info("model_routed", selected_model=model.name() if model else None, backend=decision.backend,
+                reason=decision.reason)
+    if model is None:
+        # 没有可路由的后端 (本地模型不可用、远程只有 Mock 或超预算)：直接走 API / 规则兜底
+        logger.warning("triggering_final_fallback", reason=decision.reason)
+        return await _generate_via_api(prompt, n, debug)
 
-    # 4. 获取模型实例 (Router 会决定给 Qwen 还是 GPT-4)
-    model = router.get_model(complexity)
-    
-    logger.info("model_routed", selected_model=model.name(), complexity=complexity)
+    # 4. 检查缓存：键包含模型与采样参数，n 不同的请求不会互相命中
+    cache_key = candidate_cache_key(prompt, getattr(model, "model_id", None) or model.name(), n)
+    cached = _candidate_cache.get(cache_key)
+    if cached:
+        logger.debug("cache_hit", count=len(cached), hit_ratio=_candidate_cache.stats()["hit_ratio"])
+        return cached
 
     # 5. 执行推理
     # 只要模型可用，就尝试生成
     # 注意：这里我们假设所有 Model 类都继承自 BaseModel 并实现了 generate 和 is_available
     # 如果 Base 没定义 is_available，可以默认 True 或 try-catch
+    start = time.perf_counter()
+    candidates, cancelled = [], False
     try:
         loop = asyncio.get_running_loop()
         
-        # 统一调用接口：model.generate
-        candidates = await loop.run_in_executor(None, model.generate, prompt, n)
+        if isinstance(model, LocalLoraModel) and LLM_SCHEDULER:
+            # 本地模型：交给调度器与其他并发请求合并成批
+            candidates = await get_scheduler(model).submit(prompt, n, priority=priority, prefix_hint=prefix_hint,
+                                                           decoding=decoding)
+        elif isinstance(model, LocalLoraModel):
+            call = functools.partial(model.generate, prompt, n, prefix_hint=prefix_hint, decoding=decoding)
+            candidates = await loop.run_in_executor(None, contextvars.copy_context().run, call)
+        elif hasattr(model, "agenerate"):
+            # 远程模型：异步调用，共享连接池，不占用线程
+            candidates = await model.agenerate(prompt, n)
+        else:
+            # 统一调用接口：model.generate
+            # 在复制的上下文中执行，让 trace 跟随当前搜索
+            call = functools.partial(model.generate, prompt, n)
+            candidates = await loop.run_in_executor(None, contextvars.copy_context().run, call)
         
         if candidates:
-            _candidate_cache.set(prompt, candidates)
+            _candidate_cache.set(cache_key, candidates)
             return candidates
         else:
             logger.warning("model_returned_empty", model=model.name())
             
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
     except Exception as e:
         logger.error("inference_failed", model=model.name(), error=str(e))
+    finally:
+        # 成功 = 至少拿到一个有效候选；取消的请求不计入
+        if not cancelled:
+            router.record(decision.backend, time.perf_counter() - start, bool(candidates), decision.prompt_tokens)
 
     # 6. 回退机制 (Fallback)
     # 如果 Router 选的模型挂了，或者没生成出来，走最后的兜底逻辑
@@ -319,9 +720,28 @@ async def generate_code_candidates(prompt: str, n: int = 3, use_lora: bool = Non
 
 # ----------------- 保持 API 回退逻辑不变 -----------------
 async def _generate_via_api(prompt: str, n: int = 3, debug: bool = False) -> List[str]:
-    """通过API生成候选 (Fallback)"""
-    # ... (保持原有的 API 调用代码不变) ...
-    # 重点是上面的 LocalLoraModel 类和 generate_code_candidates 函数。
+    """通过API生成候选 (Fallback)：LLM_API_BASE 指向任意 OpenAI 兼容服务"""
+    if LLM_API_BASE:
+        from src.reason_code.models.remote_client import get_client
+        messages = [
+            {"role": "system", "content": "你是一个Python代码修复专家。请修复输入的代码错误，仅输出修复后的完整代码，不要解释。"},
+            {"role": "user", "content": prompt},
+        ]
+        try:
+            # 并发上限与重试由共享客户端负责
+            contents = await get_client(LLM_API_BASE, LLM_API_KEY).chat(
+                messages, model=LLM_MODEL, n=n,
+                temperature=_SAMPLING_TEMPERATURE, top_p=_SAMPLING_TOP_P, max_tokens=LLM_MAX_NEW_TOKENS,
+            )
+            candidates = [code for code in (extract_generated_code(c) for c in contents) if is_valid_syntax(code)]
+            candidates = list(dict.fromkeys(candidates))
+            if candidates:
+                logger.info("generation_complete", count=len(candidates), method="api", model=LLM_MODEL)
+                return candidates
+            logger.warning("api_returned_empty", model=LLM_MODEL)
+        except Exception as e:
+            logger.error("api_generation_failed", model=LLM_MODEL, error=str(e))
+
     logger.warning("fallback_triggered", reason="local_model_unavailable_or_failed")
     fallback = _intelligent_fallback_generation(prompt, n)
     return fallback
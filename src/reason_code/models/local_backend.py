@@ -0,0 +1,162 @@
+"""
+本地推理后端：原始 PEFT 包装 / 合并 LoRA 后的 fp32、bf16、int8 动态量化模型
+合并后的模型作为缓存产物保存在磁盘上 (按基座 + 适配器 + 变体哈希)，之后启动直接加载
+torch / transformers / peft 只在加载模型时导入
+"""
+import os
+import json
+import shutil
+import hashlib
+import platform
+from pathlib import Path
+from typing import Any, Dict
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+BACKENDS = ("peft", "merged", "merged_int8", "merged_bf16")
+
+# 合并产物的缓存目录
+LLM_ARTIFACT_DIR = os.getenv("LLM_ARTIFACT_DIR", os.path.join(Path.home(), ".cache", "reason_code", "merged"))
+
+_INT8_WEIGHTS = "model_int8.pt"
+_READY_MARKER = "artifact.json"
+
+
+def cpu_supports_bf16() -> bool:
+    """CPU 是否有原生 bf16 指令 (没有时 bf16 matmul 反而比 fp32 慢)"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+    except OSError:
+        # macOS: Apple M2 及之后的芯片支持 bf16，这里无法区分 M1，保守返回 False
+        return False
+
+
+def _hash_path(h, path: str, full: bool) -> None:
+    """full=True 时哈希文件内容 (适配器很小)，否则只哈希文件名、大小与修改时间 (基座权重太大)"""
+    if not os.path.exists(path):
+        # Hub 模型名：只能按名字区分
+        h.update(path.encode("utf-8"))
+        return
+    files = [path] if os.path.isfile(path) else sorted(
+        os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+    )
+    for file in files:
+        h.update(os.path.relpath(file, path).encode("utf-8"))
+        if full:
+            with open(file, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+        else:
+            stat = os.stat(file)
+            h.update(f"{stat.st_size}:{int(stat.st_mtime)}".encode("utf-8"))
+
+
+def artifact_key(base_model: str, adapter_path: str, variant: str) -> str:
+    """产物键：基座 + 适配器内容 + 变体 + torch 版本 (int8 权重是 pickle 的量化张量)"""
+    import torch
+    h = hashlib.sha256()
+    _hash_path(h, base_model, full=False)
+    _hash_path(h, adapter_path, full=True)
+    h.update(f"{variant}:{torch.__version__}".encode("utf-8"))
+    return h.hexdigest()[:24]
+
+
+def resolve_backend(variant: str) -> str:
+    if variant not in BACKENDS:
+        raise ValueError(f"unknown LLM_BACKEND: {variant} (expected one of {BACKENDS})")
+    if variant == "merged_bf16" and not cpu_supports_bf16():
+        logger.warning("bf16_unsupported", fallback="merged", machine=platform.machine())
+        return "merged"
+    return variant
+
+
+def load_local_model(variant: str, base_model: str, adapter_path: str, device: str = "cpu"):
+    """按后端变体加载模型；合并变体优先读取缓存产物，不存在时构建并保存"""
+    import torch
+    from transformers import AutoModelForCausalLM
+    from peft import PeftModel
+
+    variant = resolve_backend(variant)
+    if variant == "peft":
+        # 原始路径：FP16 基座 + LoRA 包装
+        model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=torch.float16, device_map=device)
+        logger.info("loading_lora_weights", path=adapter_path)
+        return PeftModel.from_pretrained(model, adapter_path).eval()
+
+    path = os.path.join(LLM_ARTIFACT_DIR, f"{variant}-{artifact_key(base_model, adapter_path, variant)}")
+    if os.path.exists(os.path.join(path, _READY_MARKER)):
+        try:
+            model = _load_artifact(path, variant)
+            logger.info("merged_artifact_loaded", path=path, variant=variant)
+            return model.eval()
+        except Exception as e:
+            logger.warning("merged_artifact_corrupt", path=path, error=str(e))
+            shutil.rmtree(path, ignore_errors=True)
+
+    model = build_merged(variant, base_model, adapter_path)
+    try:
+        save_artifact(model, path, variant, {"base_model": base_model, "adapter": os.path.abspath(adapter_path)})
+    except Exception as e:
+        # 保存失败不影响本次使用
+        logger.warning("merged_artifact_save_failed", path=path, error=str(e))
+    return model.eval()
+
+
+def build_merged(variant: str, base_model: str, adapter_path: str):
+    """把 LoRA 合并进基座权重；int8 在 fp32 合并后对 Linear 做动态量化"""
+    import torch
+    from transformers import AutoModelForCausalLM
+    from peft import PeftModel
+
+    dtype = torch.bfloat16 if variant == "merged_bf16" else torch.float32
+    logger.info("merging_lora_weights", base_model=base_model, adapter=adapter_path, variant=variant)
+    model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=dtype)
+    model = PeftModel.from_pretrained(model, adapter_path).merge_and_unload().eval()
+    if variant == "merged_int8":
+        model = _quantize_int8(model)
+    return model
+
+
+def _quantize_int8(model):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def save_artifact(model, path: str, variant: str, meta: Dict[str, Any]) -> None:
+    """先写临时目录再整体改名，并发启动的进程不会读到写了一半的产物"""
+    import torch
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    if variant == "merged_int8":
+        # 量化模块无法 save_pretrained：保存配置 + 量化后的 state_dict
+        model.config.save_pretrained(tmp)
+        torch.save(model.state_dict(), os.path.join(tmp, _INT8_WEIGHTS))
+    else:
+        model.save_pretrained(tmp)
+    with open(os.path.join(tmp, _READY_MARKER), "w", encoding="utf-8") as f:
+        json.dump({**meta, "variant": variant, "torch": torch.__version__}, f, ensure_ascii=False)
+
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # 另一个进程已经写好了
+        shutil.rmtree(tmp, ignore_errors=True)
+    logger.info("merged_artifact_saved", path=path, variant=variant)
+
+
+def _load_artifact(path: str, variant: str):
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    if variant == "merged_int8":
+        config = AutoConfig.from_pretrained(path)
+        model = _quantize_int8(AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32).eval())
+        model.load_state_dict(torch.load(os.path.join(path, _INT8_WEIGHTS), weights_only=False))
+        return model
+    dtype = torch.bfloat16 if variant == "merged_bf16" else torch.float32
+    return AutoModelForCausalLM.from_pretrained(path, torch_dtype=dtype)
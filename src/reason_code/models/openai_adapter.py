@@ -1,38 +1,59 @@
 import os
-import time
-from typing import List
+import asyncio
+from typing import AsyncIterator, List, Optional
 from src.reason_code.models.base import BaseModel
+from src.reason_code.models.remote_client import get_client, run_sync
 from src.reason_code.utils.trace import trace_span
 
+# Mock 模式下模拟的网络延迟 (秒)
+OPENAI_MOCK_LATENCY = float(os.getenv("OPENAI_MOCK_LATENCY", "1"))
+
+
 class OpenAIModel(BaseModel):
-    def __init__(self, model_name="gpt-4o"):
+    def __init__(self, model_name="gpt-4o", base_url: Optional[str] = None, api_key: Optional[str] = None):
         self.model_name = model_name
         # 检查有没有 Key，如果没有，我们就进入"模拟模式"
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.is_mock = not self.api_key 
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.is_mock = not self.api_key
+
+    def _mock_result(self) -> str:
+        # 返回一个假的修复结果，或者直接把 Prompt 稍微改改返回
+        return f"# Generated by Mock {self.model_name}\ndef solution():\n    pass"
 
     @trace_span(span_name="llm_generate_openai")
-    def generate(self, prompt: str, n: int = 1) -> List[str]:
+    async def agenerate(self, prompt: str, n: int = 1) -> List[str]:
+        """异步生成：共享连接池，不占用线程"""
         if self.is_mock:
             # === 模拟模式  ===
             print(f"💰 [Mock] Pretending to call {self.model_name}...")
-            time.sleep(1) # 模拟网络延迟
-            # 返回一个假的修复结果，或者直接把 Prompt 稍微改改返回
-            return [f"# Generated by Mock {self.model_name}\ndef solution():\n    pass"]
-        
+            await asyncio.sleep(OPENAI_MOCK_LATENCY)  # 模拟网络延迟
+            return [self._mock_result()]
+
         # === 真实模式 ===
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                n=n
-            )
-            return [c.message.content for c in response.choices]
+            from src.reason_code.models.llm import extract_generated_code
+            client = get_client(self.base_url, self.api_key)
+            contents = await client.chat([{"role": "user", "content": prompt}], model=self.model_name, n=n)
+            return [extract_generated_code(c) for c in contents if c]
         except Exception as e:
             print(f"OpenAI API Error: {e}")
             return []
 
+    def generate(self, prompt: str, n: int = 1) -> List[str]:
+        """同步接口：在后台事件循环上执行 agenerate"""
+        return run_sync(self.agenerate(prompt, n))
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """流式生成单个候选，逐段产出文本"""
+        if self.is_mock:
+            await asyncio.sleep(OPENAI_MOCK_LATENCY)
+            for line in self._mock_result().splitlines(keepends=True):
+                yield line
+            return
+        client = get_client(self.base_url, self.api_key)
+        async for chunk in client.stream_chat([{"role": "user", "content": prompt}], model=self.model_name):
+            yield chunk
+
     def name(self) -> str:
-        return f"{self.model_name}{' (Mock)' if self.is_mock else ''}"
\ No newline at end of file
+        return f"{self.model_name}{' (Mock)' if self.is_mock else ''}"
@@ -0,0 +1,196 @@
+"""
+OpenAI 兼容接口的异步客户端：共享 httpx.AsyncClient (keep-alive 连接池，可用时启用 HTTP/2)，
+并发上限、带抖动的指数退避重试，以及 SSE 流式响应
+"""
+import os
+import json
+import random
+import asyncio
+import threading
+from importlib.util import find_spec
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# 远程调用配置
+LLM_API_MAX_CONCURRENCY = int(os.getenv("LLM_API_MAX_CONCURRENCY", "8"))
+LLM_API_MAX_RETRIES = int(os.getenv("LLM_API_MAX_RETRIES", "3"))
+LLM_API_BACKOFF_BASE = float(os.getenv("LLM_API_BACKOFF_BASE", "0.5"))
+LLM_API_BACKOFF_MAX = float(os.getenv("LLM_API_BACKOFF_MAX", "8"))
+LLM_API_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+# 可重试的状态码：限流、超时与服务端错误
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+class RemoteAPIError(Exception):
+    """远程接口返回不可重试的错误，或重试次数用尽"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class OpenAICompatibleClient:
+    """
+    /chat/completions 客户端
+    - 每个事件循环一个 AsyncClient (httpx 的连接绑定在创建它的事件循环上)，循环内所有调用共享连接池
+    - 信号量限制同时在途的请求数，连接池大小与之相同
+    - 连接错误与可重试状态码按 full-jitter 指数退避重试，优先遵守 Retry-After
+    - transport 可注入 (测试时用 httpx.ASGITransport 指向本地替身服务)
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, timeout: float = LLM_API_TIMEOUT,
+                 max_concurrency: int = LLM_API_MAX_CONCURRENCY, max_retries: int = LLM_API_MAX_RETRIES,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, http2: Optional[bool] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.transport = transport
+        self.http2 = _HTTP2_AVAILABLE if http2 is None else http2
+        self._clients: Dict[int, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient, asyncio.Semaphore]] = {}
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "streams": 0}
+
+    def _session(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(id(loop))
+        if entry is None or entry[0] is not loop or entry[1].is_closed:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                http2=self.http2 and self.transport is None,
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            entry = (loop, client, asyncio.Semaphore(self.max_concurrency))
+            self._clients[id(loop)] = entry
+        return entry[1], entry[2]
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), LLM_API_BACKOFF_MAX)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(LLM_API_BACKOFF_MAX, LLM_API_BACKOFF_BASE * (2 ** attempt)))
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client, semaphore = self._session()
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with semaphore:
+                    self.stats["requests"] += 1
+                    response = await client.post(path, json=payload)
+                if response.status_code < 400:
+                    return response.json()
+                if response.status_code not in _RETRY_STATUS:
+                    raise RemoteAPIError(f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+                error: Exception = RemoteAPIError(f"HTTP {response.status_code}", response.status_code)
+            except (httpx.TransportError, json.JSONDecodeError) as e:
+                error = e
+
+            if attempt == self.max_retries:
+                self.stats["failures"] += 1
+                raise RemoteAPIError(f"retries exhausted: {error}", getattr(error, "status", None))
+            delay = self._backoff(attempt, response)
+            self.stats["retries"] += 1
+            logger.warning("remote_api_retry", path=path, attempt=attempt + 1, delay=round(delay, 3), error=str(error))
+            await asyncio.sleep(delay)
+        raise RemoteAPIError("unreachable")
+
+    async def chat(self, messages: List[Dict[str, str]], model: str, n: int = 1, **params) -> List[str]:
+        """非流式调用，返回各 choice 的文本"""
+        data = await self._post("/chat/completions", {"model": model, "messages": messages, "n": n, **params})
+        return [c["message"]["content"] or "" for c in data.get("choices", [])]
+
+    async def stream_chat(self, messages: List[Dict[str, str]], model: str, **params) -> AsyncIterator[str]:
+        """
+        SSE 流式调用，逐段产出增量文本
+        只在收到第一个片段之前重试；中途断开直接抛出，避免重复输出
+        """
+        client, semaphore = self._session()
+        payload = {"model": model, "messages": messages, "stream": True, **params}
+        self.stats["streams"] += 1
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with semaphore:
+                    self.stats["requests"] += 1
+                    async with client.stream("POST", "/chat/completions", json=payload) as response:
+                        if response.status_code >= 400:
+                            await response.aread()
+                            if response.status_code not in _RETRY_STATUS or attempt == self.max_retries:
+                                self.stats["failures"] += 1
+                                raise RemoteAPIError(f"HTTP {response.status_code}", response.status_code)
+                            delay = self._backoff(attempt, response)
+                        else:
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    return
+                                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                                if delta:
+                                    started = True
+                                    yield delta
+                            return
+            except httpx.TransportError as e:
+                if started or attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise RemoteAPIError(f"stream failed: {e}") from e
+                delay = self._backoff(attempt)
+            self.stats["retries"] += 1
+            logger.warning("remote_api_retry", path="/chat/completions", attempt=attempt + 1, stream=True)
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的连接池"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.pop(id(loop), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+
+# (base_url, api_key) -> 客户端
+_clients: Dict[Tuple[str, Optional[str]], OpenAICompatibleClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url: str, api_key: Optional[str] = None) -> OpenAICompatibleClient:
+    """同一个服务端共用一个客户端 (连接池)"""
+    key = (base_url.rstrip("/"), api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAICompatibleClient(base_url, api_key)
+            _clients[key] = client
+    return client
+
+
+# 同步调用方 (BaseModel.generate) 使用的后台事件循环：所有同步调用共用一个连接池
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+
+
+def run_sync(coro):
+    """在后台事件循环上执行协程并阻塞等待结果"""
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="remote-api-loop", daemon=True).start()
+            _background_loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
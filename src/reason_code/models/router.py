@@ -1,5 +1,15 @@
 import os
-from src.reason_code.models.llm import LocalLoraModel
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import structlog
+from src.reason_code.models.llm import _local_model, LLM_MAX_NEW_TOKENS, approx_token_count
+from src.reason_code.models.scheduler import find_scheduler, LLM_MAX_BATCH_ROWS
+
+logger = structlog.get_logger(__name__)
 
 # 尝试导入 OpenAIAdapter
 try:
@@ -7,15 +17,106 @@ try:
 except ImportError:
     OpenAIModel = None
 
+# 路由配置
+# adaptive: 按实测延迟/成功率选择预期"拿到有效候选"最快的后端；heuristic: 原来的长度/关键词规则
+ROUTER_MODE = os.getenv("ROUTER_MODE", "adaptive")
+ROUTER_LATENCY_BUDGET_S = float(os.getenv("ROUTER_LATENCY_BUDGET_S", "60"))
+# 单次请求的费用上限 (美元)，0 表示不限制
+ROUTER_COST_BUDGET = float(os.getenv("ROUTER_COST_BUDGET", "0"))
+ROUTER_REMOTE_COST_PER_1K = float(os.getenv("ROUTER_REMOTE_COST_PER_1K", "0.005"))
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))
+# 以小概率尝试非最优后端，避免统计长期不更新
+ROUTER_EXPLORE = float(os.getenv("ROUTER_EXPLORE", "0.05"))
+
+# 没有观测数据时的先验 (秒 / 成功率)，按 _PRIOR_WEIGHT 个伪样本参与平均
+_PRIORS = {
+    "local": (float(os.getenv("ROUTER_LOCAL_PRIOR_S", "8")), 0.8),
+    "remote": (float(os.getenv("ROUTER_REMOTE_PRIOR_S", "3")), 0.9),
+}
+_PRIOR_WEIGHT = 2.0
+
+
+def heuristic_complexity(prompt: str) -> str:
+    """原始规则：Prompt 很长(>1000字符)，或者包含复杂的关键词，算 Hard 任务"""
+    return "hard" if len(prompt) > 1000 or "class " in prompt else "easy"
+
+
+class BackendStats:
+    """单个后端的滑动窗口统计：延迟 (随 prompt token 数线性变化) 与成功率"""
+
+    def __init__(self, name: str, window: int = ROUTER_WINDOW):
+        self.name = name
+        self.prior_latency, self.prior_success = _PRIORS.get(name, (5.0, 0.8))
+        self.samples: Deque[Tuple[float, bool, int]] = deque(maxlen=window)
+
+    def record(self, latency_s: float, success: bool, prompt_tokens: int) -> None:
+        self.samples.append((latency_s, success, prompt_tokens))
+
+    def success_rate(self, prompt_tokens: Optional[int] = None) -> float:
+        """整体成功率 (带先验)；给定 token 数时优先看长度相近 (0.5x~2x) 的样本，整体成功率作为先验"""
+        successes = sum(1 for _, ok, _ in self.samples if ok)
+        overall = (successes + self.prior_success * _PRIOR_WEIGHT) / (len(self.samples) + _PRIOR_WEIGHT)
+        if prompt_tokens is None:
+            return overall
+        near = [ok for _, ok, t in self.samples if prompt_tokens / 2 <= t <= prompt_tokens * 2]
+        return (sum(near) + overall * _PRIOR_WEIGHT) / (len(near) + _PRIOR_WEIGHT)
+
+    def latency(self, prompt_tokens: int) -> float:
+        """最小二乘拟合 latency = a + b * tokens；样本不足或 token 数没有差异时退化为均值"""
+        n = len(self.samples)
+        if n == 0:
+            return self.prior_latency
+        xs = [t for _, _, t in self.samples]
+        ys = [lat for lat, _, _ in self.samples]
+        mean_x, mean_y = sum(xs) / n, sum(ys) / n
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if n < 5 or var_x == 0:
+            return (mean_y * n + self.prior_latency * _PRIOR_WEIGHT) / (n + _PRIOR_WEIGHT)
+        slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x)
+        return max(0.0, mean_y + slope * (prompt_tokens - mean_x))
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(lat for lat, _, _ in self.samples)
+        return {
+            "samples": len(self.samples),
+            "success_rate": round(self.success_rate(), 3),
+            "p50_latency_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        }
+
+
+@dataclass
+class RouteDecision:
+    model: Any
+    backend: str
+    prompt_tokens: int
+    expected_s: float
+    cost: float
+    reason: str
+    estimates: Dict[str, float] = field(default_factory=dict)
+
+
 class ModelRouter:
-    def __init__(self):
-        self.local_model = LocalLoraModel()
-        self.remote_model = None
+    def __init__(self, local_model: Any = None, remote_model: Any = None, mode: str = ROUTER_MODE,
+                 latency_budget_s: float = ROUTER_LATENCY_BUDGET_S, cost_budget: float = ROUTER_COST_BUDGET,
+                 explore: float = ROUTER_EXPLORE, rng: Optional[random.Random] = None):
+        # 与 Reflexion 共用同一个模型副本 (调度器按模型合并批次)
+        self.local_model = local_model or _local_model
+        self.remote_model = remote_model
 
         # Adapter 内部会自动判断：没 Key -> Mock模式；有 Key -> 真实模式
-        if OpenAIModel:
+        if self.remote_model is None and OpenAIModel:
             self.remote_model = OpenAIModel()
 
+        self.mode = mode
+        self.latency_budget_s = latency_budget_s
+        self.cost_budget = cost_budget
+        self.explore = explore
+        self.rng = rng or random.Random()
+        self.backends = {"local": BackendStats("local"), "remote": BackendStats("remote")}
+        # 本地模型可用性探测 (检查 LoRA 路径) 的结果，首次路由时探测一次
+        self._local_available: Optional[bool] = None
+        self.metrics = {"decisions": {"local": 0, "remote": 0}, "explored": 0, "over_budget": 0, "no_backend": 0}
+
     def get_model(self, complexity: str = "easy"):
         """
         根据任务复杂度选择模型
@@ -23,9 +124,122 @@ class ModelRouter:
         # 如果任务难，且远程模型可用（无论是 Mock 还是 Real），就切过去
         if complexity == "hard" and self.remote_model:
             return self.remote_model
-        
+
         # 默认回退到本地模型
         return self.local_model
 
-# 全局单例
-router = ModelRouter()
\ No newline at end of file
+    def estimate_tokens(self, prompt: str) -> int:
+        """本地 tokenizer 已加载时精确计数，否则按字符估算"""
+        if getattr(self.local_model, "tokenizer", None) is not None:
+            return self.local_model.count_tokens(prompt)
+        return approx_token_count(prompt)
+
+    def _queue_factor(self, n: int) -> float:
+        """本地调度器前面排队的批次数 (同一批内的请求共享一次解码)"""
+        scheduler = find_scheduler(self.local_model)
+        if scheduler is None:
+            return 0.0
+        return scheduler.queue_depth * n / LLM_MAX_BATCH_ROWS
+
+    def _cost(self, backend: str, prompt_tokens: int, n: int) -> float:
+        if backend == "local":
+            return 0.0
+        return (prompt_tokens + n * LLM_MAX_NEW_TOKENS) / 1000 * ROUTER_REMOTE_COST_PER_1K
+
+    def _local_ready(self) -> bool:
+        if getattr(self.local_model, "_initialized", False):
+            return True
+        if self._local_available is None:
+            self._local_available = bool(self.local_model.is_available())
+        return self._local_available
+
+    def _candidates(self) -> List[Tuple[str, Any]]:
+        candidates = []
+        if self.local_model is not None and self._local_ready():
+            candidates.append(("local", self.local_model))
+        # Mock 远程模型只返回占位代码，不参与路由 (否则占位代码会被当成有效候选，跳过 API / 规则兜底)
+        if self.remote_model is not None and not getattr(self.remote_model, "is_mock", False):
+            candidates.append(("remote", self.remote_model))
+        return candidates
+
+    def select(self, prompt: str, n: int = 1) -> RouteDecision:
+        """
+        选择预期"拿到有效候选"耗时最短的后端
+        预期耗时 = 单次延迟 (含本地排队) / 成功率 (失败后重试的几何期望)；费用超出预算的后端不参与
+        """
+        prompt_tokens = self.estimate_tokens(prompt)
+        if self.mode == "heuristic":
+            complexity = heuristic_complexity(prompt)
+            model = self.get_model(complexity)
+            backend = "remote" if model is self.remote_model and model is not None else "local"
+            return self._decide(model, backend, prompt_tokens, 0.0, self._cost(backend, prompt_tokens, n), complexity, {})
+
+        estimates: Dict[str, float] = {}
+        affordable = []
+        for backend, model in self._candidates():
+            stats = self.backends[backend]
+            latency = stats.latency(prompt_tokens)
+            if backend == "local":
+                latency *= 1 + self._queue_factor(n)
+            estimates[backend] = latency / max(stats.success_rate(prompt_tokens), 1e-3)
+            cost = self._cost(backend, prompt_tokens, n)
+            if not self.cost_budget or cost <= self.cost_budget:
+                affordable.append((estimates[backend], backend, model, cost))
+
+        if not affordable:
+            # 没有可用后端，或可用的都超预算 (本地模型不花钱，此时一定不可用)：model 为 None，由调用方走 API / 规则兜底
+            reason = "no_backend_within_budget" if estimates else "no_backend_available"
+            return self._decide(None, "none", prompt_tokens, 0.0, 0.0, reason, estimates)
+
+        affordable.sort(key=lambda c: c[0])
+        reason = "fastest"
+        if len(affordable) > 1 and self.rng.random() < self.explore:
+            affordable = affordable[1:] + affordable[:1]
+            reason = "explore"
+            self.metrics["explored"] += 1
+        expected, backend, model, cost = affordable[0]
+        if expected > self.latency_budget_s:
+            reason = "over_latency_budget"
+            self.metrics["over_budget"] += 1
+        return self._decide(model, backend, prompt_tokens, expected, cost, reason, estimates)
+
+    def _decide(self, model, backend: str, prompt_tokens: int, expected: float, cost: float,
+                reason: str, estimates: Dict[str, float]) -> RouteDecision:
+        if model is None:
+            self.metrics["no_backend"] += 1
+        else:
+            self.metrics["decisions"][backend] += 1
+        decision = RouteDecision(model=model, backend=backend, prompt_tokens=prompt_tokens,
+                                 expected_s=expected, cost=cost, reason=reason,
+                                 estimates={k: round(v, 3) for k, v in estimates.items()})
+        logger.info("route_decision", backend=backend, model=model.name() if model else None, reason=reason,
+                    prompt_tokens=prompt_tokens, expected_s=round(expected, 3), cost=round(cost, 5),
+                    estimates=decision.estimates)
+        return decision
+
+    def record(self, backend: str, latency_s: float, success: bool, prompt_tokens: int) -> None:
+        """上报一次调用结果：success 表示拿到了至少一个有效候选"""
+        self.backends[backend].record(latency_s, success, prompt_tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.metrics, "backends": {name: s.snapshot() for name, s in self.backends.items()}}
+
+# 全局单例：首次访问 router 时才创建
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
+
+
+def __getattr__(name: str):
+    # 兼容 `from ...router import router`
+    if name == "router":
+        return get_router()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
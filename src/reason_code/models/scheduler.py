@@ -0,0 +1,216 @@
+"""
+推理调度器：把所有调用方 (MCTS 扩展、Reflexion 修复、工作流节点) 的生成请求排队，
+在一个很短的等待窗口内合并成填充批次，交给唯一的本地模型副本执行
+"""
+import os
+import time
+import asyncio
+import itertools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# 调度配置
+LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", "20"))
+LLM_MAX_BATCH_ROWS = int(os.getenv("LLM_MAX_BATCH_ROWS", "16"))
+
+# 优先级：数值越小越先执行
+PRIORITY_HIGH = 0     # Reflexion 修复：尽快完成正在进行的节点
+PRIORITY_NORMAL = 10  # MCTS 扩展
+PRIORITY_LOW = 20     # 工作流 / 后台任务
+
+
+@dataclass(order=True)
+class GenerationRequest:
+    priority: int
+    seq: int
+    prompt: str = field(compare=False)
+    n: int = field(compare=False)
+    prefix_hint: Optional[str] = field(compare=False, default=None)
+    decoding: Optional[str] = field(compare=False, default=None)
+    future: Optional[asyncio.Future] = field(compare=False, default=None)
+    context: Optional[contextvars.Context] = field(compare=False, default=None)
+    enqueued_at: float = field(compare=False, default=0.0)
+
+
+class InferenceScheduler:
+    """
+    连续批处理调度器
+    - 请求进入优先级队列，工作协程取出最高优先级的请求后，等待 max_wait 窗口再合并其余请求
+    - 每批最多 max_batch_rows 行 (各请求 n 之和)，放不下的请求留到下一批
+    - 只合并解码模式相同的请求，其余请求留到下一批
+    - 模型在单线程执行器上运行：同一时刻只有一个批次占用模型，避免线程争抢
+    - 调用方取消 await 即取消请求：排队中的请求直接丢弃，执行中的结果被忽略
+    """
+
+    def __init__(self, model: Any, max_batch_rows: int = LLM_MAX_BATCH_ROWS, max_wait_ms: float = LLM_BATCH_WAIT_MS):
+        self.model = model
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.loop = asyncio.get_running_loop()
+        self._queue: "asyncio.PriorityQueue[GenerationRequest]" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "rows": 0,
+            "cancelled": 0,
+            "queue_wait_s": 0.0,
+        }
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """执行模型的单线程执行器 (流式生成等绕过队列的调用也应在这里执行)"""
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, prompt: str, n: int = 1, priority: int = PRIORITY_NORMAL,
+                     prefix_hint: Optional[str] = None, decoding: Optional[str] = None) -> List[str]:
+        """提交一个生成请求并等待结果"""
+        if self._worker is None or self._worker.done():
+            self._worker = self.loop.create_task(self._run())
+
+        request = GenerationRequest(
+            priority=priority,
+            seq=next(self._seq),
+            prompt=prompt,
+            n=n,
+            prefix_hint=prefix_hint,
+            decoding=decoding,
+            future=self.loop.create_future(),
+            context=contextvars.copy_context(),
+            enqueued_at=time.perf_counter(),
+        )
+        self.stats["requests"] += 1
+        await self._queue.put(request)
+        try:
+            return await request.future
+        except asyncio.CancelledError:
+            request.future.cancel()
+            self.stats["cancelled"] += 1
+            raise
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first.future.done():
+                continue
+            batch = await self._collect(first)
+            if not batch:
+                continue
+            await self._execute(batch)
+
+    async def _collect(self, first: GenerationRequest) -> List[GenerationRequest]:
+        """从 first 开始，等待窗口到期后把队列里的请求按优先级凑成一个批次"""
+        batch = [first]
+        rows = first.n
+        if rows < self.max_batch_rows and self.max_wait > 0:
+            await asyncio.sleep(self.max_wait)
+
+        deferred = []
+        while rows < self.max_batch_rows and not self._queue.empty():
+            request = self._queue.get_nowait()
+            if request.future.done():
+                continue
+            if request.decoding != first.decoding:
+                deferred.append(request)
+                continue
+            if rows + request.n > self.max_batch_rows:
+                # 放不下就留给下一批 (按原优先级/顺序重新排队)
+                deferred.append(request)
+                break
+            batch.append(request)
+            rows += request.n
+        for request in deferred:
+            self._queue.put_nowait(request)
+        return [r for r in batch if not r.future.done()]
+
+    async def _execute(self, batch: List[GenerationRequest]) -> None:
+        now = time.perf_counter()
+        for r in batch:
+            self.stats["queue_wait_s"] += now - r.enqueued_at
+        self.stats["batches"] += 1
+        self.stats["rows"] += sum(r.n for r in batch)
+        logger.debug("inference_batch", requests=len(batch), rows=sum(r.n for r in batch), queue_depth=self.queue_depth)
+
+        try:
+            results = await self.loop.run_in_executor(
+                self._executor,
+                self.model.generate_batch,
+                [r.prompt for r in batch],
+                [r.n for r in batch],
+                [r.prefix_hint for r in batch],
+                [r.context for r in batch],
+                batch[0].decoding,
+            )
+        except Exception as e:
+            logger.error("inference_batch_failed", error=str(e), requests=len(batch))
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(e)
+            return
+
+        for r, candidates in zip(batch, results):
+            if not r.future.done():
+                r.future.set_result(candidates)
+
+    def close(self) -> None:
+        """停止工作协程并关闭执行器 (不等待执行中的批次，线程跑完后自行退出)"""
+        if self._worker is not None and not self.loop.is_closed():
+            self._worker.cancel()
+        self._executor.shutdown(wait=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "queue_depth": self.queue_depth,
+            "avg_batch_rows": round(self.stats["rows"] / batches, 2) if batches else 0.0,
+        }
+
+
+# 每个模型一个调度器，绑定到创建它的事件循环
+_schedulers: Dict[int, InferenceScheduler] = {}
+
+
+def _drop_closed_loops() -> None:
+    """关闭并移除事件循环已关闭的调度器 (每次 asyncio.run 结束后留下的)，释放执行器线程和模型引用"""
+    for key, scheduler in list(_schedulers.items()):
+        if scheduler.loop.is_closed():
+            scheduler.close()
+            del _schedulers[key]
+
+
+def get_scheduler(model: Any) -> InferenceScheduler:
+    """获取绑定到当前事件循环的调度器 (事件循环变化时关闭旧的并重建)"""
+    loop = asyncio.get_running_loop()
+    _drop_closed_loops()
+    scheduler = _schedulers.get(id(model))
+    if scheduler is None or scheduler.loop is not loop:
+        if scheduler is not None:
+            scheduler.close()
+        scheduler = InferenceScheduler(model)
+        _schedulers[id(model)] = scheduler
+    return scheduler
+
+
+def find_scheduler(model: Any) -> Optional[InferenceScheduler]:
+    """返回当前事件循环上已存在的调度器 (不创建)，没有运行中的事件循环时返回 None"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    scheduler = _schedulers.get(id(model))
+    if scheduler is None or scheduler.loop is not loop:
+        return None
+    return scheduler
@@ -0,0 +1,179 @@
+"""
+Prompt-Lookup 投机解码：从 prompt (以及已生成部分) 中按 n-gram 复制草稿 token，
+一次前向同时验证整段草稿。修复类输出大段照抄输入代码，接受率很高，且不需要额外的草稿模型
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+
+@dataclass
+class SpeculativeStats:
+    forward_passes: int = 0
+    drafted: int = 0
+    accepted: int = 0
+    new_tokens: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def tokens_per_forward(self) -> float:
+        return self.new_tokens / self.forward_passes if self.forward_passes else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "forward_passes": self.forward_passes,
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "new_tokens": self.new_tokens,
+            "acceptance_rate": round(self.acceptance_rate, 4),
+            "tokens_per_forward": round(self.tokens_per_forward, 3),
+        }
+
+
+class NgramIndex:
+    """
+    增量 n-gram 索引：记录每个 n-gram 最近一次出现之后的位置
+    查找时优先匹配最长的 n-gram，返回其后续 token 作为草稿
+    """
+
+    def __init__(self, tokens: List[int], max_ngram: int = 3):
+        self.max_ngram = max_ngram
+        self.tokens: List[int] = []
+        self._index: List[Dict[Tuple[int, ...], int]] = [{} for _ in range(max_ngram + 1)]
+        self.extend(tokens)
+
+    def extend(self, tokens: List[int]) -> None:
+        for token in tokens:
+            pos = len(self.tokens)
+            # 以 pos 为"后续起点"登记所有结束于 pos-1 的 n-gram
+            for n in range(1, self.max_ngram + 1):
+                if pos >= n:
+                    self._index[n][tuple(self.tokens[pos - n:pos])] = pos
+            self.tokens.append(token)
+
+    def draft(self, num_draft: int) -> List[int]:
+        if num_draft <= 0:
+            return []
+        for n in range(min(self.max_ngram, len(self.tokens)), 0, -1):
+            start = self._index[n].get(tuple(self.tokens[-n:]))
+            if start is not None:
+                return self.tokens[start:start + num_draft]
+        return []
+
+
+def _target_probs(logits, temperature: float, top_p: float, logits_processor=None, input_ids=None):
+    """
+    目标分布：给了 logits_processor 时按它处理 logits (input_ids 为该位置之前的全部 token)，
+    否则只做 temperature + top-p
+    """
+    import torch
+    if logits_processor is not None:
+        return torch.softmax(logits_processor(input_ids, logits.float()[None])[0], dim=-1)
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    if top_p < 1.0:
+        sorted_probs, sorted_idx = torch.sort(probs, descending=True)
+        cumulative = torch.cumsum(sorted_probs, dim=-1)
+        # 保留累计概率首次超过 top_p 的那个 token
+        remove = cumulative - sorted_probs > top_p
+        sorted_probs[remove] = 0.0
+        probs = torch.zeros_like(probs).scatter_(-1, sorted_idx, sorted_probs)
+        probs = probs / probs.sum()
+    return probs
+
+
+def _greedy_token(logits, logits_processor=None, input_ids=None) -> int:
+    if logits_processor is not None:
+        logits = logits_processor(input_ids, logits.float()[None])[0]
+    return int(logits.argmax())
+
+
+def prompt_lookup_generate(model, input_ids, cache, max_new_tokens: int,
+                           eos_token_id: Union[int, Iterable[int], None],
+                           temperature: float = 0.7, top_p: float = 0.9,
+                           num_draft: int = 10, max_ngram: int = 3,
+                           stopping_criteria=None, logits_processor=None) -> Tuple[List[int], SpeculativeStats]:
+    """
+    单序列投机采样
+    cache 为已预填充到 input_ids 倒数第二个 token 的 DynamicCache (会被原地修改)
+    草稿是确定性的 (点分布)，因此以 p(d) 的概率接受草稿 token d；拒绝时从去掉 d 后重新归一化的 p 中采样，
+    输出分布与按 p 逐 token 采样一致。temperature <= 0 时退化为贪心校验
+    p 默认只做 temperature + top-p；要与 HF generate 的采样一致，须传入按同一 generation_config 构造的
+    logits_processor (含 top_k / repetition_penalty 等，此时忽略 temperature / top_p 参数) 和完整的 eos 列表
+    返回 (新生成的 token 列表, 统计)
+    """
+    import torch
+
+    stats = SpeculativeStats()
+    eos = {eos_token_id} if isinstance(eos_token_id, int) else set(eos_token_id or ())
+    index = NgramIndex(input_ids[0].tolist(), max_ngram=max_ngram)
+    pending = index.tokens[cache.get_seq_length():]
+    generated: List[int] = []
+    device = input_ids.device
+
+    while len(generated) < max_new_tokens:
+        # 至少留一个位置给校验后必然产生的新 token
+        draft = index.draft(min(num_draft, max_new_tokens - len(generated) - 1))
+        feed = pending + draft
+        logits = model(input_ids=torch.tensor([feed], device=device), past_key_values=cache, use_cache=True).logits[0]
+        stats.forward_passes += 1
+        stats.drafted += len(draft)
+        # 第 j 个校验位置之前的 token 为 context[:, :len(index.tokens) + j] (repetition_penalty 等处理器要用)
+        context = torch.tensor([index.tokens + draft], device=device) if logits_processor is not None else None
+        prefix = len(index.tokens)
+
+        base = len(pending) - 1
+        new_tokens: List[int] = []
+        accepted = 0
+        for j, token in enumerate(draft):
+            step_logits = logits[base + j]
+            step_ids = context[:, :prefix + j] if context is not None else None
+            if temperature <= 0:
+                best = _greedy_token(step_logits, logits_processor, step_ids)
+                new_tokens.append(best)
+                if best != token:
+                    break
+                accepted += 1
+                continue
+            probs = _target_probs(step_logits, temperature, top_p, logits_processor, step_ids)
+            if torch.rand(()) < probs[token]:
+                new_tokens.append(token)
+                accepted += 1
+                continue
+            probs[token] = 0.0
+            new_tokens.append(int(torch.multinomial(probs / probs.sum(), 1)))
+            break
+        else:
+            # 草稿全部接受 (或没有草稿)：用最后一个位置的分布再采一个 token
+            step_logits = logits[base + len(draft)]
+            if temperature <= 0:
+                new_tokens.append(_greedy_token(step_logits, logits_processor, context))
+            else:
+                probs = _target_probs(step_logits, temperature, top_p, logits_processor, context)
+                new_tokens.append(int(torch.multinomial(probs, 1)))
+
+        stats.accepted += accepted
+
+        # 丢弃被拒绝草稿的 KV：保留 pending 与被接受的草稿
+        rejected = len(draft) - accepted
+        if rejected:
+            cache.crop(-rejected)
+
+        stop = next((k for k, t in enumerate(new_tokens) if t in eos), None)
+        if stop is not None:
+            new_tokens = new_tokens[:stop + 1]
+        new_tokens = new_tokens[:max_new_tokens - len(generated)]
+        generated.extend(new_tokens)
+        index.extend(new_tokens)
+        pending = [new_tokens[-1]]
+
+        if new_tokens[-1] in eos:
+            break
+        if stopping_criteria is not None:
+            ids = torch.tensor([index.tokens], device=device)
+            if any(bool(c(ids, None)[0]) for c in stopping_criteria):
+                break
+
+    stats.new_tokens = len(generated)
+    return generated, stats
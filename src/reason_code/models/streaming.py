@@ -0,0 +1,84 @@
+"""
+流式解码与提前停止：代码块一旦完整就停止生成，避免模型在 ``` 之后继续"闲聊"
+"""
+import re
+import ast
+from typing import Optional
+
+_FENCE_RE = re.compile(r"```[^\n]*\n.*?```", re.DOTALL)
+_DEF_RE = re.compile(r"^(async\s+def|def|class)\s")
+# 回到第 0 列但仍属于当前代码的行
+_CONTINUATION_PREFIXES = ("def ", "async def ", "class ", "@", "#", "import ", "from ",
+                          ")", "]", "}", "else", "elif", "except", "finally")
+
+
+def find_completion(text: str) -> Optional[int]:
+    """
+    判断生成文本中的代码是否已经完整，返回应截断的位置 (None 表示尚未完整)
+    1. 出现闭合的 ``` 代码块：截到闭合 fence 之后
+    2. 没有 fence 时，完整的 def 之后出现回到第 0 列的新语句且 ast.parse 通过：截到该行之前
+    """
+    if "```" in text:
+        match = _FENCE_RE.search(text)
+        return match.end() if match else None
+
+    lines = text.split("\n")
+    # 最后一段没有换行，还不是完整的行
+    complete = lines[:-1]
+    start = next((i for i, line in enumerate(complete) if _DEF_RE.match(line)), None)
+    if start is None:
+        return None
+
+    # 只检查最新一行，流式调用时每行只会被检查一次
+    last = len(complete) - 1
+    line = complete[last]
+    if last <= start or not line.strip() or line[0].isspace() or line.startswith(_CONTINUATION_PREFIXES):
+        return None
+
+    code = "\n".join(complete[start:last])
+    try:
+        ast.parse(code)
+    except SyntaxError:
+        return None
+    return len("\n".join(lines[:last]))
+
+
+def truncate_at_completion(text: str) -> str:
+    """截掉代码完整之后的多余输出"""
+    end = find_completion(text)
+    return text if end is None else text[:end]
+
+
+class CodeBlockStoppingCriteria:
+    """
+    transformers 停止条件 (鸭子类型，不继承 StoppingCriteria，导入本模块无需 transformers)：逐行为每个序列检查 find_completion
+    只有新 token 含换行或反引号时才解码整段文本，避免每步的解码开销
+    cancel_event 被置位时整批立即停止 (流式调用方提前退出)
+    """
+
+    def __init__(self, tokenizer, prompt_len: int, enabled: bool = True, cancel_event=None):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.enabled = enabled
+        self.cancel_event = cancel_event
+        self._done = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        batch = input_ids.shape[0]
+        if self._done is None or self._done.shape[0] != batch:
+            self._done = input_ids.new_zeros(batch).bool()
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self._done[:] = True
+        if not self.enabled or input_ids.shape[1] <= self.prompt_len:
+            return self._done.clone()
+
+        for row in range(batch):
+            if self._done[row]:
+                continue
+            last_piece = self.tokenizer.decode(input_ids[row, -1:], skip_special_tokens=True)
+            if "\n" not in last_piece and "`" not in last_piece:
+                continue
+            text = self.tokenizer.decode(input_ids[row, self.prompt_len:], skip_special_tokens=True)
+            if find_completion(text) is not None:
+                self._done[row] = True
+        return self._done.clone()
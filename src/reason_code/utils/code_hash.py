@@ -0,0 +1,36 @@
+"""
+代码的规范化哈希：只差空白或注释的代码得到同一个哈希
+用作 MCTS 置换表与评估结果缓存的键；docstring 默认保留 (doctest / __doc__ 会影响执行结果)
+"""
+import ast
+import hashlib
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                # 保留一个 pass，避免函数体变空
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalize_code(code: str, keep_docstrings: bool = True) -> str:
+    """
+    规范化表示：能解析时用 AST dump (不含行列号；keep_docstrings=False 时去掉 docstring)
+    语法错误的代码退化为逐行去掉首尾空白、丢弃空行和注释行后的文本
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        lines = (line.strip() for line in code.splitlines())
+        return "\n".join(line for line in lines if line and not line.startswith("#"))
+    if not keep_docstrings:
+        tree = _strip_docstrings(tree)
+    return ast.dump(tree, annotate_fields=False, include_attributes=False)
+
+
+def code_hash(code: str, keep_docstrings: bool = True) -> str:
+    return hashlib.sha256(normalize_code(code, keep_docstrings).encode("utf-8")).hexdigest()
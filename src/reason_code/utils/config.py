@@ -17,11 +17,60 @@ LLM_DEBUG = os.getenv("LLM_DEBUG", "False").lower() == "true"
 
 # MCTS配置
 MCTS_C = float(os.getenv("MCTS_C", "1.4"))
+# 同时在途的模拟数 (1 = 串行)；>1 时叶并行，用虚拟损失把模拟分散到不同叶子
+MCTS_PARALLELISM = int(os.getenv("MCTS_PARALLELISM", "1"))
+# 每个在途模拟给路径上节点加的虚拟访问次数 (按 0 奖励计)
+MCTS_VIRTUAL_LOSS = float(os.getenv("MCTS_VIRTUAL_LOSS", "1"))
+# 渐进展开 (默认关闭，保持原来的展开方式)：节点最多持有 ceil(MCTS_PW_C * visits^MCTS_PW_ALPHA) 个子节点，访问越多允许的分支越多
+MCTS_PROGRESSIVE_WIDENING = os.getenv("MCTS_PROGRESSIVE_WIDENING", "false").lower() == "true"
+MCTS_PW_C = float(os.getenv("MCTS_PW_C", "1.0"))
+MCTS_PW_ALPHA = float(os.getenv("MCTS_PW_ALPHA", "0.5"))
+# 自适应候选数的上限 (运行时失败的节点多要候选，反复产出语法错误的节点少要)
+MCTS_MAX_CANDIDATES = int(os.getenv("MCTS_MAX_CANDIDATES", "5"))
+# 搜索树检查点目录 (API / HumanEval 使用；默认为空不保存)，以及每隔多少次模拟保存一次
+# 设置后同一 prompt + test_runner 会从上次的树继续，已经解出的题可能不跑新的模拟就返回
+MCTS_CHECKPOINT_DIR = os.getenv("MCTS_CHECKPOINT_DIR", "")
+MCTS_CHECKPOINT_EVERY = int(os.getenv("MCTS_CHECKPOINT_EVERY", "5"))
+# 每次搜索最多用 Reflexion 修复的候选数 (0 关闭修复)
+MCTS_REPAIR_BUDGET = int(os.getenv("MCTS_REPAIR_BUDGET", "8"))
+# 节点代码按父节点差分存储 (agent/code_store.py，默认关闭：每节点约省 11% 内存，但读取慢约 100 倍，
+# 只在树极大、内存吃紧时打开)；每隔多少层存一份全文，以及缓存多少个还原后的全文
+MCTS_DIFF_CODE = os.getenv("MCTS_DIFF_CODE", "false").lower() == "true"
+MCTS_KEYFRAME_INTERVAL = int(os.getenv("MCTS_KEYFRAME_INTERVAL", "16"))
+MCTS_CODE_CACHE_SIZE = int(os.getenv("MCTS_CODE_CACHE_SIZE", "256"))
+# 节点上保存的评估信息 (stdout / traceback) 最多保留的字符数
+MCTS_EVAL_MESSAGE_CHARS = int(os.getenv("MCTS_EVAL_MESSAGE_CHARS", "1000"))
 
 # 沙箱配置
 SANDBOX_IMAGE = os.getenv("SANDBOX_IMAGE", "python:3.10-slim")
+# 每次执行的墙钟时限与 CPU 时限 (秒)，超出后杀掉执行进程树
 SANDBOX_TIMEOUT = int(os.getenv("SANDBOX_TIMEOUT", "10"))
+SANDBOX_CPU_TIMEOUT = int(os.getenv("SANDBOX_CPU_TIMEOUT", str(SANDBOX_TIMEOUT)))
 SANDBOX_MEM_LIMIT = os.getenv("SANDBOX_MEM_LIMIT", "256m")
 
 # Docker CPU配额，默认100000 (100% CPU)
-SANDBOX_CPU_QUOTA = int(os.getenv("SANDBOX_CPU_QUOTA", "100000"))
\ No newline at end of file
+SANDBOX_CPU_QUOTA = int(os.getenv("SANDBOX_CPU_QUOTA", "100000"))
+# 沙箱池：常驻容器数 (默认每个 CPU 核一个，每个容器配额一个核)、每个容器执行多少次后回收重建、
+# 空闲超过多少秒的容器在借出前先做健康检查
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", str(max(1, os.cpu_count() or 1))))
+SANDBOX_MAX_RUNS = int(os.getenv("SANDBOX_MAX_RUNS", "200"))
+SANDBOX_HEALTH_INTERVAL = float(os.getenv("SANDBOX_HEALTH_INTERVAL", "30"))
+# 沙箱后端：docker (常驻容器) 或 local (本机 fork server，不需要 Docker daemon)
+SANDBOX_BACKEND = os.getenv("SANDBOX_BACKEND", "docker").lower()
+# fork server (local 后端的沙箱进程 / 容器里的常驻 runner) 启动时预先导入的模块
+SANDBOX_PRELOAD = os.getenv(
+    "SANDBOX_PRELOAD",
+    "math,re,json,heapq,bisect,random,string,typing,itertools,functools,collections,operator,"
+    "statistics,fractions,decimal,datetime,copy,traceback",
+)
+# local 后端子进程的文件大小 / 进程数上限 (CPU 时间用 SANDBOX_CPU_TIMEOUT，地址空间用 SANDBOX_MEM_LIMIT)
+SANDBOX_LOCAL_FILE_LIMIT = int(os.getenv("SANDBOX_LOCAL_FILE_LIMIT", str(16 * 1024 * 1024)))
+SANDBOX_LOCAL_NPROC = int(os.getenv("SANDBOX_LOCAL_NPROC", "64"))
+# Docker 后端在每个容器里常驻一个 runner (fork server)，候选经 docker exec 的 socket 发过去；关闭时每次执行都新起解释器
+SANDBOX_RUNNER = os.getenv("SANDBOX_RUNNER", "true").lower() == "true"
+
+# 评估结果缓存：键为 (候选的 AST 哈希 (保留 docstring), 测试代码哈希, 沙箱配置)
+# 内存层的条目数；SQLite 共享层的路径 (多个进程共用，默认为空只用内存层) 与有效期 (秒)
+EVAL_CACHE_SIZE = int(os.getenv("EVAL_CACHE_SIZE", "4096"))
+EVAL_CACHE_DB = os.getenv("EVAL_CACHE_DB", "")
+EVAL_CACHE_DISK_TTL = int(os.getenv("EVAL_CACHE_DISK_TTL", str(7 * 86400)))
@@ -2,8 +2,11 @@ import functools
 from opentelemetry import trace
 from src.reason_code.utils.logger import logger
 
-# 获取全局 tracer
-tracer = trace.get_tracer("reason_code")
+
+@functools.lru_cache(maxsize=None)
+def get_tracer():
+    """首次创建 span 时才获取全局 tracer (此时 TracerProvider 已由应用配置好)"""
+    return trace.get_tracer("reason_code")
 
 def trace_span(span_name: str = None, **kwargs):
     """
@@ -14,7 +17,7 @@ def trace_span(span_name: str = None, **kwargs):
         @functools.wraps(func)
         async def async_wrapper(*args, **func_kwargs):
             name = span_name or func.__name__
-            with tracer.start_as_current_span(name) as span:
+            with get_tracer().start_as_current_span(name) as span:
                 try:
                     # 记录输入参数
                     span.set_attribute("code.function", func.__name__)
@@ -27,7 +30,7 @@ def trace_span(span_name: str = None, **kwargs):
         @functools.wraps(func)
         def sync_wrapper(*args, **func_kwargs):
             name = span_name or func.__name__
-            with tracer.start_as_current_span(name) as span:
+            with get_tracer().start_as_current_span(name) as span:
                 try:
                     span.set_attribute("code.function", func.__name__)
                     return func(*args, **func_kwargs)
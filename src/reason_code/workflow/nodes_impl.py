@@ -1,6 +1,7 @@
 from src.reason_code.workflow.node import BaseNode
 from src.reason_code.tools.registry import registry
 from src.reason_code.agent.mcts import EnhancedMCTS
+from src.reason_code.models.scheduler import PRIORITY_LOW
 import structlog
 
 logger = structlog.get_logger(__name__)
@@ -50,7 +51,8 @@ class ReasoningNode(BaseNode):
         # 调用核心算法
         # 这里的 test_runner 暂时写死或从 inputs 获取
         test_runner = inputs.get("test_runner", "")
-        mcts = EnhancedMCTS(root_code=full_prompt, n_simulations=3, n_candidates=1)
+        # 工作流节点是后台任务，推理时让位于交互式请求
+        mcts = EnhancedMCTS(root_code=full_prompt, n_simulations=3, n_candidates=1, priority=PRIORITY_LOW)
         best_code = await mcts.run(test_runner)
         
         return {"final_code": best_code}
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+OpenAI 兼容接口的本地替身服务：可配置延迟、前 N 次请求失败，支持 stream=true 的 SSE 响应
+测试中通过 httpx.ASGITransport 直接调用；也可以单独启动给 benchmark 使用:
+  python tests/fake_openai_server.py --latency 0.2 --port 8001
+"""
+import json
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_REPLY = "```python\ndef add(a, b):\n    return a + b\n```"
+
+
+def create_app(latency: float = 0.0, fail_first: int = 0, fail_status: int = 503,
+               reply: str = DEFAULT_REPLY) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if app.state.requests <= fail_first:
+            return JSONResponse({"error": {"message": "overloaded"}}, status_code=fail_status)
+
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            app.state.in_flight -= 1
+
+        if body.get("stream"):
+            async def events():
+                for line in reply.splitlines(keepends=True):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": line}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        choices = [{"index": i, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                   for i in range(body.get("n", 1))]
+        return {"id": "fake", "object": "chat.completion", "model": body.get("model"), "choices": choices}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    uvicorn.run(create_app(latency=args.latency), host="127.0.0.1", port=args.port)
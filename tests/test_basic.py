@@ -18,3 +18,197 @@ def test_ucb_calculation():
     score = child.ucb_score(c=1.414)
     # 简单的数学断言
     assert score > 0.5
+
+def test_virtual_loss_spreads_selection():
+    """在途模拟的虚拟损失让下一次选择换到另一个叶子"""
+    mcts = EnhancedMCTS(root_code="root", parallelism=2)
+    mcts.root.visits = 2
+    a = Node(code="a", parent=mcts.root, visits=1, wins=1.0)
+    b = Node(code="b", parent=mcts.root, visits=1, wins=0.9)
+    mcts.root.children = [a, b]
+
+    first = mcts._select(mcts.root)
+    assert first is a
+    mcts._apply_virtual_loss(first, 1)
+    assert mcts._select(mcts.root) is b
+
+    mcts._apply_virtual_loss(first, -1)
+    assert mcts.root.virtual_loss == 0 and a.virtual_loss == 0
+
+
+@pytest.mark.asyncio
+async def test_transposition_table_merges_duplicates(monkeypatch):
+    """只差空白/注释的候选并入同一个节点，不重复评估"""
+    from src.reason_code.agent import mcts as mcts_module
+    from src.reason_code.executor import evaluator
+
+    async def fake_generate(prompt, n=3, **kwargs):
+        return ["def f():\n    return 1", "def f():  # same\n    return 1\n", "def f():\n    return 2"]
+
+    evaluated = []
+
+    async def fake_evaluate(candidates, test_runner, prompt=""):
+        evaluated.extend(candidates)
+        return [{"overall": {"reward": 0.3, "failed_at": "level_2"}, "level_2": {"passed": False, "message": "x"}}
+                for _ in candidates]
+
+    monkeypatch.setattr(mcts_module, "generate_code_candidates", fake_generate)
+    monkeypatch.setattr(mcts_module, "simple_retrieve", lambda code, k=3: [])
+    monkeypatch.setattr(evaluator, "evaluate_candidates_async", fake_evaluate)
+
+    mcts = EnhancedMCTS(root_code="root", n_simulations=2, n_candidates=3)
+    await mcts.run("assert True")
+
+    # 第一次扩展评估 2 个不同候选，第二次全部命中置换表
+    assert len(evaluated) == 2
+    assert len(mcts.transpositions) == 2
+    assert mcts.stats["duplicates_merged"] == 4
+    assert mcts.stats["evaluations_skipped"] == 4
+
+
+def test_merged_duplicate_keeps_visit_counts_consistent():
+    """并入的已有节点在扩展子树内时沿途记访问；在其他分支时只记本次扩展路径，父节点访问数不小于子节点之和"""
+    mcts = EnhancedMCTS(root_code="root")
+    mcts.root.visits = 3
+    a = Node(code="a", parent=mcts.root, visits=2, wins=1.0)
+    b = Node(code="b", parent=mcts.root, visits=1, wins=0.5)
+    a1 = Node(code="a1", parent=a, visits=1, wins=0.5)
+    a1.last_result = {"reward": 0.5}
+    mcts.root.children, a.children = [a, b], [a1]
+
+    def consistent(node):
+        return node.visits >= sum(c.visits for c in node.children) and all(consistent(c) for c in node.children)
+
+    # 其他分支：a1 / a 不动，回传只走 b 的路径
+    assert mcts._merge_duplicate(a1, b) == 0.5
+    mcts._backpropagate(b, 0.5)
+    assert (a1.visits, a.visits, b.visits, mcts.root.visits) == (1, 2, 2, 4)
+    assert consistent(mcts.root)
+
+    # 扩展子树内 (从根扩展出与 a1 等价的候选)：a1、a 各记一次，与新建子节点一样
+    mcts._merge_duplicate(a1, mcts.root)
+    mcts._backpropagate(mcts.root, 0.5)
+    assert (a1.visits, a.visits, mcts.root.visits) == (2, 3, 5)
+    assert a1.wins == 1.0 and consistent(mcts.root)
+
+
+@pytest.mark.asyncio
+async def test_docstring_variants_are_not_merged(monkeypatch):
+    """只差 docstring 的候选在 doctest / __doc__ 下行为可能不同，各自评估"""
+    from src.reason_code.agent import mcts as mcts_module
+    from src.reason_code.executor import evaluator
+
+    async def fake_generate(prompt, n=3, **kwargs):
+        return ["def f():\n    return 1", 'def f():\n    """>>> f()\n    2\n    """\n    return 1']
+
+    evaluated = []
+
+    async def fake_evaluate(candidates, test_runner, prompt=""):
+        evaluated.extend(candidates)
+        return [{"overall": {"reward": 0.3, "failed_at": "level_2"}, "level_2": {"passed": False, "message": "x"}}
+                for _ in candidates]
+
+    monkeypatch.setattr(mcts_module, "generate_code_candidates", fake_generate)
+    monkeypatch.setattr(mcts_module, "simple_retrieve", lambda code, k=3: [])
+    monkeypatch.setattr(evaluator, "evaluate_candidates_async", fake_evaluate)
+
+    mcts = EnhancedMCTS(root_code="root", n_simulations=1, n_candidates=2)
+    await mcts.run("import doctest; doctest.testmod()")
+    assert len(evaluated) == 2 and len(mcts.root.children) == 2
+    assert mcts.stats["duplicates_merged"] == 0
+
+@pytest.mark.asyncio
+async def test_anytime_search_stops_early(monkeypatch):
+    """找到通过的解或到达截止时间时提前停止，并返回目前最好的代码"""
+    import asyncio
+    from src.reason_code.agent import mcts as mcts_module
+    from src.reason_code.agent.mcts import SearchBudget
+    from src.reason_code.executor import evaluator
+
+    calls = {"n": 0}
+
+    async def fake_generate(prompt, n=3, **kwargs):
+        calls["n"] += 1
+        await asyncio.sleep(0.01 * calls["n"])
+        return [f"def f():\n    return {calls['n']}"]
+
+    async def fake_evaluate(candidates, test_runner, prompt=""):
+        return [{"overall": {"reward": 1.0 if c.endswith("3") else 0.3, "failed_at": None}} for c in candidates]
+
+    monkeypatch.setattr(mcts_module, "generate_code_candidates", fake_generate)
+    monkeypatch.setattr(mcts_module, "simple_retrieve", lambda code, k=3: [])
+    monkeypatch.setattr(evaluator, "evaluate_candidates_async", fake_evaluate)
+
+    result = await EnhancedMCTS(root_code="root", n_simulations=10, n_candidates=1).run_anytime("assert True")
+    assert (result.stop_reason, result.simulations, result.reward) == ("solved", 3, 1.0)
+    assert result.code.endswith("3")
+
+    calls["n"] = 10
+    result = await EnhancedMCTS(root_code="root", n_simulations=10, n_candidates=1).run_anytime(
+        "assert True", SearchBudget(deadline_s=0.25))
+    assert result.stop_reason == "deadline"
+    assert 0 < result.simulations < 10 and result.elapsed_s < 0.4
+    assert result.code.startswith("def f()")
+
+    result = await EnhancedMCTS(root_code="root", n_simulations=10, n_candidates=1).run_anytime(
+        "assert True", SearchBudget(max_llm_calls=2))
+    assert (result.stop_reason, result.simulations) == ("llm_call_budget", 2)
+
+
+def test_progressive_widening():
+    """子节点数未达 ceil(sqrt(visits)) 时就地再扩展；候选数随节点情况调整"""
+    from src.reason_code.agent.mcts import widening_limit
+    assert [widening_limit(v) for v in (0, 1, 2, 4, 5, 9)] == [1, 1, 2, 2, 3, 3]
+
+    mcts = EnhancedMCTS(root_code="root", n_candidates=2, progressive_widening=True)
+    child = Node(code="c", parent=mcts.root, visits=1, wins=0.7)
+    mcts.root.children = [child]
+    mcts.root.visits = 1
+    assert mcts._select(mcts.root) is child
+    mcts.root.visits = 2
+    assert mcts._select(mcts.root) is mcts.root
+    assert mcts._candidates_for(mcts.root) == 2
+
+    child.evaluation_result = {"overall": {"reward": 0.7, "failed_at": "level_3"}}
+    child.last_result = child.evaluation_result["overall"]
+    child.visits = 8
+    assert mcts._candidates_for(child) == 3
+    mcts._record_expansion(child, [{"overall": {"failed_at": "level_1"}}] * 3)
+    assert mcts._candidates_for(child) == 1
+
+
+@pytest.mark.asyncio
+async def test_reflexion_stage_repairs_concurrently(monkeypatch):
+    """运行时失败的候选并发修复，采用复查后的结果，且不超过修复预算"""
+    import asyncio
+    import time
+    from src.reason_code.agent import mcts as mcts_module
+    from src.reason_code.agent import reflexion
+    from src.reason_code.executor import evaluator
+
+    async def fake_generate(prompt, n=3, **kwargs):
+        return [f"def f():\n    return {i}" for i in range(n)]
+
+    async def fake_evaluate(candidates, test_runner, prompt=""):
+        return [{"overall": {"reward": 1.0, "failed_at": None}} if "fixed" in c else
+                {"overall": {"reward": 0.7, "failed_at": "level_3"}, "level_3": {"passed": False, "message": "boom"}}
+                for c in candidates]
+
+    async def fake_fix(code, error_msg, test_runner, decoding=None):
+        await asyncio.sleep(0.1)
+        return code + "  # fixed"
+
+    monkeypatch.setattr(mcts_module, "generate_code_candidates", fake_generate)
+    monkeypatch.setattr(mcts_module, "simple_retrieve", lambda code, k=3: [])
+    monkeypatch.setattr(evaluator, "evaluate_candidates_async", fake_evaluate)
+    monkeypatch.setattr(reflexion, "attempt_fix", fake_fix)
+
+    mcts = EnhancedMCTS(root_code="root", n_simulations=1, n_candidates=3, progressive_widening=False, repair_budget=2)
+    start = time.perf_counter()
+    await mcts.run("assert True")
+    assert time.perf_counter() - start < 0.25
+
+    rewards = sorted(c.last_result["reward"] for c in mcts.root.children)
+    assert rewards == [0.7, 1.0, 1.0]
+    assert (mcts.stats["repairs_attempted"], mcts.stats["repairs_succeeded"]) == (2, 2)
+    assert mcts.stats["reflexion_generate_s"] >= 0.1
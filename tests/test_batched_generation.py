@@ -0,0 +1,78 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from src.reason_code.models import llm
+
+
+class CharTokenizer:
+    """逐字符编码的极简 tokenizer；decode 把 token 序列写成一行合法的 Python，候选能通过语法检查且与 token 一一对应"""
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        return "".join(f"<{m['role']}>{m['content']}" for m in messages) + "<assistant>"
+
+    def encode(self, text):
+        return [2 + ord(ch) % 60 for ch in text]
+
+    def __call__(self, text, add_special_tokens=True, return_tensors=None):
+        ids = self.encode(text)
+        if return_tensors == "pt":
+            input_ids = torch.tensor([ids])
+            return transformers.BatchEncoding({"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)})
+        return {"input_ids": ids}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return f"out = {[int(t) for t in ids if int(t) != self.eos_token_id]}"
+
+
+@pytest.fixture
+def local(monkeypatch):
+    config = transformers.Qwen2Config(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=512,
+        # 默认的 0.02 初始化下随机小模型对任何输入都输出同一个循环，放大权重让输出取决于 prompt
+        initializer_range=0.2,
+    )
+    torch.manual_seed(0)
+    llm._import_inference_deps()
+    model = llm.LocalLoraModel()
+    model.model = transformers.AutoModelForCausalLM.from_config(config).eval()
+    model.tokenizer = CharTokenizer()
+    model.model_id = "tiny-test"
+    model._initialized = True
+    # 贪心解码，输出只取决于 logits，可以逐 token 比较
+    monkeypatch.setattr(model, "_sampling_kwargs", lambda: dict(max_new_tokens=12, do_sample=False, pad_token_id=0))
+    monkeypatch.setattr(llm, "LLM_EARLY_STOP", False)
+    llm._prefix_cache.clear()
+    return model
+
+
+PROMPTS = ["def f(x):\n    return x +", "print(1)", "def add(a, b):\n    return a - b\n\nassert add(2, 2) == 4"]
+
+
+def test_left_padded_batch_matches_unbatched(local):
+    separate = [local.generate_batch([p], [1], decoding="sample")[0] for p in PROMPTS]
+    assert len({tuple(c) for c in separate}) == len(PROMPTS)
+    llm._prefix_cache.clear()
+    # 三个长度不同的 prompt 左填充后合并成一批 (第二个 prompt 两行)
+    batched = local.generate_batch(PROMPTS, [1, 2, 1], decoding="sample")
+    assert batched == separate
+
+
+def test_prefix_cache_hit_matches_uncached(local, monkeypatch):
+    prefix = "def add(a, b):\n    return a - b\n"
+    prompts = [prefix, prefix + "\nassert add(1, 1) == 2", prefix + "\nassert add(2, 3) == 5"]
+
+    monkeypatch.setattr(llm, "LLM_PREFIX_CACHE", False)
+    uncached = [local.generate_batch([p], [1], decoding="sample")[0] for p in prompts]
+    assert len({tuple(c) for c in uncached}) == len(prompts)
+
+    monkeypatch.setattr(llm, "LLM_PREFIX_CACHE", True)
+    cached = [local.generate_batch([p], [1], [prefix], decoding="sample")[0] for p in prompts]
+    stats = llm._prefix_cache.stats()
+    # 第一次只写入 system / 节点前缀，之后的调用命中节点前缀
+    assert stats["hits"] >= 2 and stats["entries"] >= 2
+    assert cached == uncached
@@ -0,0 +1,64 @@
+from src.reason_code.utils.cache import LRUCache, SQLiteCache, TieredCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    """满了之后淘汰最久未访问的键"""
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 变成最新
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_ttl_expiry():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=8, ttl=10, clock=clock)
+    cache.set("k", ["x"])
+    clock.now = 9.9
+    assert cache.get("k") == ["x"]
+    clock.now = 10.0
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_byte_budget():
+    """超出字节预算时从旧到新淘汰"""
+    cache = LRUCache(maxsize=100, ttl=None, max_bytes=30, sizeof=len)
+    cache.set("a", "x" * 20)
+    cache.set("b", "y" * 20)
+    assert cache.get("a") is None
+    assert cache.get("b") == "y" * 20
+    cache.set("huge", "z" * 31)  # 单条超预算，直接不缓存
+    assert cache.get("huge") is None
+    assert cache.get("b") == "y" * 20
+
+
+def test_key_depends_on_all_parts():
+    assert make_cache_key("p", "m", 1, 0.7) != make_cache_key("p", "m", 8, 0.7)
+    assert make_cache_key("p", "m", 1, 0.7) == make_cache_key("p", "m", 1, 0.7)
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    """磁盘层在新实例 (模拟重启/另一个 worker) 中依然可以命中"""
+    db = str(tmp_path / "cache.db")
+    first = TieredCache(LRUCache(maxsize=4), SQLiteCache(db, namespace="candidates"))
+    first.set("k", ["def f(): return 1"])
+
+    second = TieredCache(LRUCache(maxsize=4), SQLiteCache(db, namespace="candidates"))
+    assert second.get("k") == ["def f(): return 1"]
+    assert second.memory.get("k") == ["def f(): return 1"]  # 已回填内存层
+    assert second.stats()["hit_ratio"] == 1.0
+
+    other_ns = SQLiteCache(db, namespace="other")
+    assert other_ns.get("k") is None
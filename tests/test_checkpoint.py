@@ -0,0 +1,52 @@
+import pytest
+
+from src.reason_code.agent import mcts as mcts_module
+from src.reason_code.agent.mcts import EnhancedMCTS
+from src.reason_code.agent.compact_tree import CompactMCTS
+from src.reason_code.agent.checkpoint import checkpoint_key, load_checkpoint
+from src.reason_code.executor import evaluator
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    state = {"calls": 0, "crash_at": None}
+
+    async def fake_generate(prompt, n=3, **kwargs):
+        state["calls"] += 1
+        if state["calls"] == state["crash_at"]:
+            raise RuntimeError("worker crashed")
+        return [f"def f():\n    return {state['calls']}"]
+
+    async def fake_evaluate(candidates, test_runner, prompt=""):
+        return [{"overall": {"reward": 0.3, "failed_at": "level_2"}, "level_2": {"passed": False, "message": "x" * 5000}}
+                for _ in candidates]
+
+    monkeypatch.setattr(mcts_module, "generate_code_candidates", fake_generate)
+    monkeypatch.setattr(mcts_module, "simple_retrieve", lambda code, k=3: [])
+    monkeypatch.setattr(evaluator, "evaluate_candidates_async", fake_evaluate)
+    return state
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", [EnhancedMCTS, CompactMCTS])
+async def test_resume_after_crash(tmp_path, fake_backend, cls):
+    fake_backend["crash_at"] = 8
+    search = cls(root_code="root", n_simulations=10, n_candidates=1, checkpoint_dir=str(tmp_path), checkpoint_every=3)
+    with pytest.raises(RuntimeError):
+        await search.run_anytime("assert True")
+
+    data = load_checkpoint(str(tmp_path), checkpoint_key("root", "assert True"))
+    assert (data["completed"], data["finished"], len(data["nodes"]["parent"])) == (6, False, 7)
+    # 节点上的评估信息已按 MCTS_EVAL_MESSAGE_CHARS 截断，检查点原样保存
+    assert "[truncated 4000 chars]" in data["nodes"]["evaluation"][1]["level_2"]["message"]
+
+    # 崩溃后重跑只补剩下的 4 次模拟，树在检查点的基础上继续长
+    resumed = cls(root_code="root", n_simulations=10, n_candidates=1, checkpoint_dir=str(tmp_path), checkpoint_every=3)
+    result = await resumed.run_anytime("assert True")
+    assert resumed.stats["resumed_nodes"] == 6
+    assert (result.simulations, resumed.stats["llm_calls"]) == (10, 4)
+    assert resumed._visits(resumed.root) == 10
+    assert len(resumed.transpositions) == 10
+
+    data = load_checkpoint(str(tmp_path), checkpoint_key("root", "assert True"))
+    assert (data["completed"], data["finished"], len(data["nodes"]["parent"])) == (10, True, 11)
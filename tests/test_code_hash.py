@@ -0,0 +1,18 @@
+from src.reason_code.utils.code_hash import code_hash
+
+
+def test_equivalent_code_shares_hash():
+    a = "def add(a, b):\n    return a + b\n"
+    b = 'def add(a,b):\n    # 注释\n\n    return a+b'
+    assert code_hash(a) == code_hash(b)
+    # docstring 会影响 doctest / __doc__，默认不合并
+    documented = 'def add(a, b):\n    """>>> add(1, 2)\n    3\n    """\n    return a + b'
+    assert code_hash(a) != code_hash(documented)
+    assert code_hash(a, keep_docstrings=False) == code_hash(documented, keep_docstrings=False)
+    assert code_hash(a) != code_hash("def add(a, b):\n    return a - b\n")
+
+
+def test_syntax_error_falls_back_to_text():
+    broken = "def f(:\n    return 1"
+    assert code_hash(broken) == code_hash("def f(:\n\n  return 1\n# 注释")
+    assert code_hash(broken) != code_hash("def g(:\n    return 1")
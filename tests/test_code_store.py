@@ -0,0 +1,26 @@
+from src.reason_code.agent.code_store import CodeStore, compact_evaluation
+
+
+def test_code_store_round_trips_diff_chains():
+    store = CodeStore(keyframe_interval=3, cache_size=0)
+    lines = [f"    x{i} = {i}\n" for i in range(30)]
+    codes = ["def f():\n" + "".join(lines)]
+    refs = [store.add(codes[0])]
+    for depth in range(1, 8):
+        lines[depth] = f"    x{depth} = {depth} * 2\n"
+        codes.append("def f():\n" + "".join(lines) + f"    return x{depth}\n")
+        refs.append(store.add(codes[-1], base=refs[-1]))
+
+    assert [store[r] for r in refs] == codes
+    # 每隔 keyframe_interval 层存一份全文，还原时回溯的链长有上界
+    assert max(store._depth) == 2 and list(store._base).count(-1) == 3
+    assert store.nbytes < sum(len(c) for c in codes)
+
+
+def test_compact_evaluation_truncates_and_interns():
+    trace = "Traceback (most recent call last):\n" + "  frame\n" * 1000 + "AssertionError: boom"
+    a = compact_evaluation({"level_3": {"passed": False, "message": trace}, "overall": {"reward": 0.7}}, limit=200)
+    b = compact_evaluation({"level_3": {"passed": False, "message": "".join(trace)}}, limit=200)
+    assert len(a["level_3"]["message"]) < 260 and a["level_3"]["message"].endswith("AssertionError: boom")
+    assert a["level_3"]["message"] is b["level_3"]["message"]
+    assert a["overall"] == {"reward": 0.7}
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.reason_code.agent.mcts import Node
+from src.reason_code.agent.compact_tree import CompactTree, CompactMCTS
+
+
+def test_selection_matches_node_tree():
+    """随机扩展/回传下，CompactTree 的选择与 Node 树逐步一致 (包括非末尾节点的二次扩展)"""
+    rng = random.Random(0)
+    root, tree = Node(code="r", parent=None), CompactTree("r", capacity=2)
+    nodes = [root]
+    for _ in range(500):
+        leaf = root
+        while leaf.children:
+            leaf = max(leaf.children, key=lambda n: n.ucb_score())
+        idx = tree.select()
+        assert nodes[idx] is leaf
+
+        reward = rng.random()
+        for _ in range(rng.randint(0, 3)):
+            child = Node(code="c", parent=leaf, visits=1, wins=reward)
+            leaf.children.append(child)
+            nodes.append(child)
+            new = tree.add_node(idx, "c")
+            tree.visits[new], tree.wins[new] = 1, reward
+        cur = leaf
+        while cur:
+            cur.visits += 1
+            cur.wins += reward
+            cur = cur.parent
+        tree.backpropagate(idx, reward)
+
+        if rng.random() < 0.1:
+            k = rng.randrange(len(nodes))
+            nodes[k].children.append(Node(code="x", parent=nodes[k]))
+            nodes.append(nodes[k].children[-1])
+            tree.add_node(k, "x")
+
+    for i, node in enumerate(nodes):
+        assert [next(j for j, m in enumerate(nodes) if m is c) for c in node.children] \
+            == list(tree.children(i))
+
+
+@pytest.mark.asyncio
+async def test_compact_mcts_run(monkeypatch):
+    from src.reason_code.agent import mcts as mcts_module
+    from src.reason_code.executor import evaluator
+
+    async def fake_generate(prompt, n=3, **kwargs):
+        return [f"def f():\n    return {random.random()}" for _ in range(n)]
+
+    async def fake_evaluate(candidates, test_runner, prompt=""):
+        return [{"overall": {"reward": 0.7 if "0.9" in c else 0.3, "failed_at": None}} for c in candidates]
+
+    monkeypatch.setattr(mcts_module, "generate_code_candidates", fake_generate)
+    monkeypatch.setattr(mcts_module, "simple_retrieve", lambda code, k=3: [])
+    monkeypatch.setattr(evaluator, "evaluate_candidates_async", fake_evaluate)
+
+    search = CompactMCTS(root_code="root", n_simulations=6, n_candidates=3, parallelism=2,
+                         progressive_widening=False)
+    code = await search.run("assert True")
+    assert len(search.tree) == 1 + 6 * 3
+    assert search.tree.visits[0] == 6
+    assert code in search.tree.codes[1:]
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+
+from src.reason_code.agent.mcts import EnhancedMCTS
+from src.reason_code.executor import evaluator as evaluator_module
+from src.reason_code.executor import sandbox_pool
+from src.reason_code.executor.evaluator import CodeEvaluator
+from src.reason_code.executor.execution import ExecutionResult
+from src.reason_code.utils.cache import LRUCache, SQLiteCache, TieredCache
+
+
+class _CountingPool:
+    def __init__(self):
+        self.runs = 0
+        self.result = ExecutionResult(0, "ok", "", wall_s=0.01, cpu_s=0.01, peak_memory_kb=1000)
+
+    @contextmanager
+    def lease(self):
+        self.runs += 1
+        yield self
+
+    def execute_code(self, code, test_runner):
+        return self.result
+
+
+def test_evaluation_cache_shares_results_across_equivalent_code_and_processes(monkeypatch, tmp_path):
+    pool = _CountingPool()
+    monkeypatch.setattr(sandbox_pool, "get_pool", lambda: pool)
+    monkeypatch.setattr(evaluator_module, "log_success", lambda *args: None)
+    monkeypatch.setattr(evaluator_module, "log_failure", lambda *args: None)
+    db = str(tmp_path / "eval.sqlite")
+
+    first = CodeEvaluator(cache=TieredCache(LRUCache(ttl=None), SQLiteCache(db, namespace="evaluations")))
+    result = first.evaluate("def add(a, b):\n    return a + b", "    assert add(1, 2) == 3")
+    assert result["overall"]["passed"] and "cached" not in result["overall"]
+    # 只差空白 / 注释的候选命中同一条缓存
+    again = first.evaluate('def add(a, b):\n\n    return a + b  # sum', "    assert add(1, 2) == 3")
+    assert again["overall"]["cached"] and pool.runs == 1
+    # docstring 可能被 doctest / __doc__ 用到，不同就重新执行
+    first.evaluate('def add(a, b):\n    """>>> add(1, 2)\n    3\n    """\n    return a + b', "    assert add(1, 2) == 3")
+    assert pool.runs == 2
+    # 测试代码不同也重新执行
+    first.evaluate("def add(a, b):\n    return a + b", "    assert add(2, 2) == 4")
+    assert pool.runs == 3
+
+    # 另一个进程 (新的内存层) 经 SQLite 共享层命中
+    second = CodeEvaluator(cache=TieredCache(LRUCache(ttl=None), SQLiteCache(db, namespace="evaluations")))
+    assert second.evaluate("def add(a, b):\n    return a + b", "    assert add(1, 2) == 3")["overall"]["cached"]
+    assert pool.runs == 3
+
+    # 墙钟超时受负载影响，不缓存
+    pool.result = ExecutionResult(-9, "", "执行超时", wall_s=10.0, timeout="wall")
+    for _ in range(2):
+        assert second.evaluate("def spin():\n    while True:\n        pass", "    spin()")["overall"]["failure"] == "timeout"
+    assert pool.runs == 5
+
+    search = EnhancedMCTS("def add(a, b):\n    pass")
+    search._update_stats(again)
+    search._update_stats(result)
+    assert search.stats["evaluation_cache_hits"] == 1 and search.stats["runtime_tests"] == 1
@@ -0,0 +1,55 @@
+import sys
+import subprocess
+from contextlib import contextmanager
+
+from src.reason_code.executor import evaluator as evaluator_module
+from src.reason_code.executor import fork_server, sandbox_pool
+from src.reason_code.executor.evaluator import CodeEvaluator, TIMEOUT_REWARD
+from src.reason_code.executor.execution import ExecutionResult
+from src.reason_code.executor.sandbox import parse_runner_output
+
+
+def _run_once(tmp_path, code, wall_s, cpu_s):
+    """与容器里的执行方式相同：fork_server.py 单次模式，输出交给 parse_runner_output"""
+    (tmp_path / "test_code.py").write_text(code)
+    proc = subprocess.run([sys.executable, fork_server.__file__, "--run", "test_code.py", str(wall_s), str(cpu_s)],
+                          cwd=tmp_path, capture_output=True, text=True, timeout=30)
+    return parse_runner_output(proc.stdout, proc.returncode, 0.0, wall_s, cpu_s)
+
+
+def test_runner_enforces_cpu_and_wall_deadlines(tmp_path):
+    result = _run_once(tmp_path, "print('hi')\nraise SystemExit(3)\n", 5, 5)
+    assert (result.exit_code, result.stdout, result.timeout) == (3, "hi\n", None)
+    assert result.wall_s > 0 and result.cpu_s > 0
+    assert result.peak_memory_kb > 0
+
+    result = _run_once(tmp_path, "while True:\n    pass\n", 10, 1)
+    assert result.timeout == "cpu" and "超时" in result.stderr
+
+    # 墙钟超时连另起会话的后代进程一起杀掉
+    code = "import os, time\nif os.fork() == 0:\n    os.setsid()\n    time.sleep(60)\ntime.sleep(60)\n"
+    result = _run_once(tmp_path, code, 1, 5)
+    assert result.timeout == "wall" and result.wall_s < 3
+    ps = subprocess.run(["ps", "-eo", "args"], capture_output=True, text=True).stdout
+    assert "test_code.py" not in ps
+
+
+class _TimeoutSandbox:
+    def execute_code(self, code, test_runner):
+        return ExecutionResult(-9, "partial", "执行超时 (wall > 10s)", wall_s=10.0, timeout="wall")
+
+
+class _FakePool:
+    @contextmanager
+    def lease(self):
+        yield _TimeoutSandbox()
+
+
+def test_evaluator_reports_timeouts_as_their_own_failure_class(monkeypatch):
+    monkeypatch.setattr(sandbox_pool, "get_pool", lambda: _FakePool())
+    monkeypatch.setattr(evaluator_module, "log_failure", lambda *args: None)
+    result = CodeEvaluator().evaluate("def f():\n    return 1", "    f()")
+    assert result["overall"] == {"passed": False, "failed_at": "level_3", "reward": TIMEOUT_REWARD,
+                                 "failure": "timeout"}
+    assert result["level_3"]["execution"]["timeout"] == "wall"
+    assert result["level_3"]["message"].startswith("执行超时")
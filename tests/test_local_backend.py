@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+peft = pytest.importorskip("peft")
+
+from src.reason_code.models import local_backend
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    """磁盘上的极小 Qwen2 基座 + 非零初始化的 LoRA 适配器"""
+    config = transformers.Qwen2Config(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=128,
+    )
+    torch.manual_seed(0)
+    base = transformers.AutoModelForCausalLM.from_config(config)
+    base_path, adapter_path = str(tmp_path / "base"), str(tmp_path / "adapter")
+    base.save_pretrained(base_path)
+    lora = peft.LoraConfig(r=4, lora_alpha=8, target_modules=["q_proj", "v_proj"], init_lora_weights=False)
+    peft.get_peft_model(base, lora).save_pretrained(adapter_path)
+    return base_path, adapter_path
+
+
+def _logits(model):
+    with torch.no_grad():
+        return model(input_ids=torch.tensor([[1, 5, 9, 13, 17, 21]])).logits.float()
+
+
+def test_artifact_key_tracks_adapter_and_variant(checkpoints):
+    base_path, adapter_path = checkpoints
+    key = local_backend.artifact_key(base_path, adapter_path, "merged")
+    assert key == local_backend.artifact_key(base_path, adapter_path, "merged")
+    assert key != local_backend.artifact_key(base_path, adapter_path, "merged_int8")
+
+    # 适配器按内容哈希：改了权重 (哪怕大小不变) 键就变
+    weights = os.path.join(adapter_path, "adapter_model.safetensors")
+    with open(weights, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 1]))
+    assert key != local_backend.artifact_key(base_path, adapter_path, "merged")
+
+
+@pytest.mark.parametrize("variant,atol", [("merged", 1e-5), ("merged_bf16", 5e-2), ("merged_int8", 5e-2)])
+def test_merged_artifact_roundtrip(checkpoints, tmp_path, monkeypatch, variant, atol):
+    base_path, adapter_path = checkpoints
+    monkeypatch.setattr(local_backend, "LLM_ARTIFACT_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(local_backend, "cpu_supports_bf16", lambda: True)
+
+    base = transformers.AutoModelForCausalLM.from_pretrained(base_path, torch_dtype=torch.float32)
+    base_logits = _logits(base)
+    reference = _logits(peft.PeftModel.from_pretrained(base, adapter_path).eval())
+    assert not torch.allclose(base_logits, reference, atol=atol)
+
+    built = local_backend.load_local_model(variant, base_path, adapter_path)
+    path = os.path.join(str(tmp_path / "artifacts"),
+                        f"{variant}-{local_backend.artifact_key(base_path, adapter_path, variant)}")
+    assert os.path.exists(os.path.join(path, "artifact.json"))
+
+    # 第二次启动直接读产物，不再合并
+    def no_merge(*args):
+        raise AssertionError("artifact should be loaded from disk")
+    monkeypatch.setattr(local_backend, "build_merged", no_merge)
+    loaded = local_backend.load_local_model(variant, base_path, adapter_path)
+
+    assert torch.equal(_logits(built), _logits(loaded))
+    # 合并 (与量化 / 降精度) 后仍接近未合并的 LoRA 模型
+    assert torch.allclose(_logits(loaded), reference, atol=atol)
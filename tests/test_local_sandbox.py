@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from src.reason_code.executor.local_sandbox import LocalForkSandbox, parse_mem_limit
+from src.reason_code.executor.runner_session import harness_id
+
+
+@pytest.fixture
+def sandbox():
+    box = LocalForkSandbox(timeout=1)
+    yield box
+    box.cleanup()
+
+
+def test_local_sandbox_runs_each_test_in_a_private_child(sandbox):
+    code = "import os\ndef add(a, b):\n    return a + b"
+    exit_code, stdout, stderr = sandbox.execute_code(code, "    assert add(1, 2) == 3\n    print(os.getcwd(), os.getpid())")
+    assert exit_code == 0 and stderr == ""
+    workdir, pid = stdout.split()
+    assert os.path.basename(workdir).startswith("sandbox-run-") and not os.path.exists(workdir)
+    assert int(pid) != sandbox.process.pid
+
+    result = sandbox.execute_code("def add(a, b):\n    return a - b", "    assert add(1, 2) == 3")
+    assert result.exit_code == 1
+    assert result.stderr.startswith("Traceback") and "AssertionError" in result.stderr
+    assert result.exception == {"type": "AssertionError", "message": "", "file": "test_runner.py", "line": 2}
+
+    result = sandbox.execute_code("def add(a, b):\n    return a + b[0]", "    assert add(1, 2) == 3")
+    assert (result.exception["type"], result.exception["file"], result.exception["line"]) == ("TypeError", "test_code.py", 2)
+
+
+def test_local_sandbox_sends_each_harness_once_and_reloads_evicted_ones(sandbox):
+    harness = "    assert add(1, 2) == 3"
+    assert sandbox.execute_code("def add(a, b):\n    return a + b", harness).exit_code == 0
+    key = harness_id(harness)
+    assert key in sandbox.session._loaded
+
+    sent = []
+    request = sandbox.session.request
+    sandbox.session.request = lambda message: sent.append("harness" in message) or request(message)
+    assert sandbox.execute_code("def add(a, b):\n    return b + a", harness).exit_code == 0
+    assert sent == [False]
+
+    # server 已经淘汰的 harness (这里是 server 从没见过的) 自动重发一次
+    other = "    assert add(2, 2) == 4"
+    sandbox.session._loaded.add(harness_id(other))
+    sent.clear()
+    assert sandbox.execute_code("def add(a, b):\n    return a + b", other).exit_code == 0
+    assert sent == [False, True]
+
+
+def test_local_sandbox_kills_runaway_code_and_keeps_serving(sandbox):
+    result = sandbox.execute_code("import time\ndef wait():\n    time.sleep(30)", "    wait()")
+    assert result.exit_code != 0 and result.timeout == "wall" and "超时" in result.stderr
+    assert 1 <= result.wall_s < 2 and result.cpu_s < 0.5
+
+    sandbox.cpu_timeout = sandbox.limits["cpu_s"] = 1
+    sandbox.timeout = 5
+    result = sandbox.execute_code("def spin():\n    while True:\n        pass", "    spin()")
+    assert result.timeout == "cpu" and result.cpu_s > 0.9 and result.wall_s < 3
+
+    assert sandbox.is_healthy()
+    result = sandbox.execute_code("def f():\n    return 1", "    assert f() == 1")
+    assert result.exit_code == 0 and result.timeout is None and result.peak_memory_kb > 0
+
+
+def test_parse_mem_limit():
+    assert parse_mem_limit("256m") == 256 * 2**20
+    assert parse_mem_limit("1g") == 2**30
+    assert parse_mem_limit("4096") == 4096
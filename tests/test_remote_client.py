@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+
+from tests.fake_openai_server import create_app, DEFAULT_REPLY
+from src.reason_code.models import remote_client
+from src.reason_code.models.remote_client import OpenAICompatibleClient, RemoteAPIError
+
+
+def _client(app, **kwargs):
+    return OpenAICompatibleClient("http://fake/v1", api_key="test", transport=httpx.ASGITransport(app=app), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_chat_respects_concurrency_limit():
+    app = create_app(latency=0.05)
+    client = _client(app, max_concurrency=2)
+    results = await asyncio.gather(*(client.chat([{"role": "user", "content": "hi"}], model="m", n=2) for _ in range(6)))
+    assert all(r == [DEFAULT_REPLY, DEFAULT_REPLY] for r in results)
+    assert app.state.max_in_flight <= 2
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_retries_then_gives_up(monkeypatch):
+    monkeypatch.setattr(remote_client, "LLM_API_BACKOFF_BASE", 0.001)
+    client = _client(create_app(fail_first=2), max_retries=2)
+    assert await client.chat([{"role": "user", "content": "hi"}], model="m") == [DEFAULT_REPLY]
+    assert client.stats["retries"] == 2
+
+    client = _client(create_app(fail_first=5), max_retries=1)
+    with pytest.raises(RemoteAPIError):
+        await client.chat([{"role": "user", "content": "hi"}], model="m")
+
+    # 不可重试的状态码立即失败
+    app = create_app(fail_first=5, fail_status=400)
+    with pytest.raises(RemoteAPIError):
+        await _client(app, max_retries=3).chat([{"role": "user", "content": "hi"}], model="m")
+    assert app.state.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_yields_deltas():
+    client = _client(create_app())
+    chunks = [c async for c in client.stream_chat([{"role": "user", "content": "hi"}], model="m")]
+    assert len(chunks) > 1
+    assert "".join(chunks) == DEFAULT_REPLY
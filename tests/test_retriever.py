@@ -0,0 +1,122 @@
+import sys
+import json
+import importlib.util
+
+import pytest
+
+from src.reason_code.agent.retriever import BM25Index, DenseIndex
+
+
+def _append(path, *records):
+    with open(path, "a", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+def test_bm25_tails_log_and_restores_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.reason_code.agent.retriever.RETRIEVER_SNAPSHOT_EVERY", 1)
+    log, snap = tmp_path / "fail_cases.jsonl", tmp_path / "fail_cases.bm25"
+    _append(log, {"candidate": "def add(a, b): return a - b", "stderr": "AssertionError"},
+            {"candidate": "def parse_json(s): return json.loads(s)", "stderr": "JSONDecodeError: Expecting value"})
+
+    index = BM25Index(str(log), str(snap))
+    assert index.refresh() == 2
+    assert index.get(index.search("json decode error", k=3)[0][1])["candidate"].startswith("def parse_json")
+    assert index.search("nothing matches", k=3) == []
+
+    # 只读取新增的完整行；写了一半的行留到下次
+    _append(log, {"candidate": "def mul(a, b): return a + b", "stderr": "ZeroDivisionError"})
+    with open(log, "a", encoding="utf-8") as f:
+        f.write('{"candidate": "def half')
+    assert index.refresh() == 1
+    assert index.refresh() == 0
+    assert [d for _, d in index.search("ZeroDivisionError", k=3)] == [2]
+
+    # 重启后从快照继续，不必重新解析
+    restored = BM25Index(str(log), str(snap))
+    assert len(restored) == 3 and restored.refresh() == 0
+
+    # 日志被截断时重建
+    log.write_text(json.dumps({"candidate": "x = 1", "stderr": "NameError"}) + "\n", encoding="utf-8")
+    assert restored.refresh() == 1 and len(restored) == 1
+
+
+class _Exploit:
+    def __reduce__(self):
+        return (exec, ("import builtins; builtins.PICKLE_SNAPSHOT_EXECUTED = True",))
+
+
+def test_bm25_untrusted_snapshot_is_rebuilt_from_log(tmp_path, monkeypatch):
+    """快照是 JSON 不是 pickle：写进 pickle 载荷不会被执行；读不出或内容不自洽的快照从日志重建"""
+    import gzip
+    import pickle
+    import builtins
+
+    monkeypatch.setattr("src.reason_code.agent.retriever.RETRIEVER_SNAPSHOT_EVERY", 1)
+    log, snap = tmp_path / "fail_cases.jsonl", tmp_path / "fail_cases.bm25"
+    _append(log, {"candidate": "def add(a, b): return a - b", "stderr": "AssertionError"},
+            {"candidate": "def parse_json(s): return json.loads(s)", "stderr": "JSONDecodeError"})
+    index = BM25Index(str(log), str(snap))
+    index.refresh()
+    expected = index.search("json decode error", k=2)
+
+    with gzip.open(snap, "rt", encoding="utf-8") as f:
+        state = json.load(f)
+    for payload in (pickle.dumps(_Exploit()), gzip.compress(pickle.dumps(_Exploit())), b"\x1f\x8b garbage"):
+        snap.write_bytes(payload)
+        restored = BM25Index(str(log), str(snap))
+        assert len(restored) == 0 and restored.refresh() == 2
+        assert restored.search("json decode error", k=2) == expected
+    assert not hasattr(builtins, "PICKLE_SNAPSHOT_EXECUTED")
+
+    # 文档号越界的倒排表：整个快照作废
+    state["postings"]["json"][0] = state["postings"]["add"][0] = "AAAAAQ=="
+    with gzip.open(snap, "wt", encoding="utf-8") as f:
+        json.dump(state, f)
+    restored = BM25Index(str(log), str(snap))
+    assert len(restored) == 0 and restored.refresh() == 2
+
+
+def test_bm25_scores_without_numpy_and_indexes_prompt(tmp_path, monkeypatch):
+    log = tmp_path / "fail_cases.jsonl"
+    _append(log, *({"candidate": f"def f{i}(xs): return xs[{i}] + {i % 3}", "stderr": "IndexError" if i % 2 else "TypeError",
+                     "prompt": "Return the median of xs" if i % 5 == 0 else "Sum a list"} for i in range(40)))
+    index = BM25Index(str(log), None)
+    index.refresh()
+    queries = ["IndexError xs", "TypeError return", "median", "f7 xs 7"]
+    expected = [index.search(q, k=5) for q in queries] if _has_numpy() else None
+
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    results = [index.search(q, k=5) for q in queries]
+    # prompt 字段也进了索引
+    assert {d for _, d in results[2]} == {0, 5, 10, 15, 20}
+    if expected is not None:
+        # 同分文档的先后 NumPy 路径不保证，只比分数
+        for got, want in zip(results, expected):
+            assert [s for s, _ in got] == pytest.approx([s for s, _ in want], rel=1e-5)
+
+
+def _has_numpy() -> bool:
+    return importlib.util.find_spec("numpy") is not None
+
+
+def test_dense_index_appends_and_partitions(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr("src.reason_code.agent.retriever.RETRIEVER_IVF_MIN", 16)
+    monkeypatch.setattr("src.reason_code.agent.retriever.RETRIEVER_IVF_NPROBE", 64)
+    log, prefix = tmp_path / "fail_cases.jsonl", str(tmp_path / "fail_cases.dense")
+    _append(log, *({"candidate": f"def f{i}(xs): return xs[{i}]", "stderr": "IndexError"} for i in range(15)))
+    _append(log, {"candidate": "def parse_json(s): return json.loads(s)", "stderr": "JSONDecodeError"})
+
+    index = DenseIndex(str(log), prefix, dim=64)
+    assert index.refresh() == 16
+    # 达到阈值后训练了 IVF；探测全部簇时结果与全量打分一致
+    assert index._centroids is not None
+    assert index.get(index.search("json.loads JSONDecodeError", k=1)[0][1])["candidate"].startswith("def parse_json")
+
+    # 重启后从 memmap 继续，只嵌入新增的行
+    _append(log, {"candidate": "def div(a, b): return a / b", "stderr": "ZeroDivisionError"})
+    restored = DenseIndex(str(log), prefix, dim=64)
+    assert len(restored) == 16 and restored._centroids is not None
+    assert restored.refresh() == 1
+    assert restored.search("ZeroDivisionError a / b", k=1)[0][1] == 16
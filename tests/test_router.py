@@ -0,0 +1,89 @@
+import random
+import asyncio
+
+from src.reason_code.models.router import ModelRouter
+
+
+class FakeBackend:
+    def __init__(self, name, is_mock=False):
+        self._name = name
+        self.is_mock = is_mock
+        self.tokenizer = None
+        self._initialized = True
+
+    def name(self):
+        return self._name
+
+    def is_available(self):
+        return True
+
+
+def _router(**kwargs):
+    return ModelRouter(local_model=FakeBackend("local"), remote_model=FakeBackend("remote"),
+                       explore=0.0, rng=random.Random(0), **kwargs)
+
+
+def test_routes_by_measured_latency_and_success():
+    router = _router()
+    for _ in range(10):
+        router.record("local", 1.0, True, 100)
+        router.record("remote", 3.0, True, 100)
+    assert router.select("x" * 400).backend == "local"
+
+    # 本地模型持续拿不到有效候选：预期耗时 = 延迟 / 成功率，切到远程
+    for _ in range(20):
+        router.record("local", 1.0, False, 100)
+    decision = router.select("x" * 400)
+    assert decision.backend == "remote"
+    assert decision.estimates["local"] > decision.estimates["remote"]
+    assert router.metrics["decisions"] == {"local": 1, "remote": 1}
+
+
+def test_cost_budget_excludes_remote():
+    router = _router(cost_budget=1e-6)
+    for _ in range(10):
+        router.record("local", 30.0, True, 100)
+    assert router.select("x" * 400).backend == "local"
+
+
+def test_mock_remote_only_used_by_heuristic_mode():
+    router = ModelRouter(local_model=FakeBackend("local"), remote_model=FakeBackend("mock", is_mock=True), explore=0.0)
+    assert router.select("short").backend == "local"
+    # 启发式模式保持原来的规则
+    router.mode = "heuristic"
+    assert router.select("class Foo: pass").backend == "remote"
+
+
+def test_local_availability_probed_once_and_fallback_reasons():
+    local = FakeBackend("local")
+    local._initialized = False
+    probes = []
+    local.is_available = lambda: probes.append(1) or False
+    router = ModelRouter(local_model=local, remote_model=FakeBackend("remote"), explore=0.0, cost_budget=1e-6)
+    decision = router.select("x" * 400)
+    assert decision.reason == "no_backend_within_budget" and decision.model is None
+    router.select("x" * 400)
+    assert len(probes) == 1
+
+    router.remote_model = None
+    assert router.select("x" * 400).reason == "no_backend_available"
+    assert router.metrics["no_backend"] == 3 and router.metrics["decisions"] == {"local": 0, "remote": 0}
+
+
+def test_mock_remote_never_routed_when_local_unavailable(monkeypatch):
+    from src.reason_code.models import llm, router as router_module
+
+    local = FakeBackend("local")
+    local._initialized = False
+    local.is_available = lambda: False
+    mock = FakeBackend("mock", is_mock=True)
+    mock.generate = lambda prompt, n: ["# Generated by Mock\ndef solution():\n    pass"]
+    router = ModelRouter(local_model=local, remote_model=mock, explore=0.0)
+    decision = router.select("def add(a, b): return a - b")
+    assert decision.model is None and decision.reason == "no_backend_available"
+
+    # 生成时落到 API / 规则兜底，而不是返回 Mock 的占位代码
+    monkeypatch.setattr(router_module, "get_router", lambda: router)
+    monkeypatch.setattr(llm, "LLM_API_BASE", None)
+    candidates = asyncio.run(llm.generate_code_candidates("def add(a, b): return a - b", n=2))
+    assert candidates == ["def add(a, b): return a + b", "def add(a, b): return a + b"]
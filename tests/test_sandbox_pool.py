@@ -0,0 +1,75 @@
+import time
+import asyncio
+import itertools
+
+import pytest
+
+from src.reason_code.executor.sandbox_pool import SandboxPool
+
+
+class FakeSandbox:
+    ids = itertools.count()
+
+    def __init__(self):
+        self.id = next(self.ids)
+        self.healthy = True
+        self.cleaned = False
+
+    def execute_code(self, code, test_runner):
+        if code == "crash":
+            raise RuntimeError("container died")
+        time.sleep(0.05)
+        return 0, f"ran on {self.id}", ""
+
+    def is_healthy(self):
+        return self.healthy
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+def _wait_idle(pool, n):
+    deadline = time.monotonic() + 2
+    while len(pool._idle) < n and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_pool_spreads_concurrent_checkouts():
+    pool = SandboxPool(size=4, factory=FakeSandbox)
+    pool.start()
+    _wait_idle(pool, 4)
+
+    async def run(code):
+        async with pool.checkout() as sandbox:
+            return await asyncio.to_thread(sandbox.execute_code, code, "")
+
+    start = time.perf_counter()
+    outputs = await asyncio.gather(*(run(f"c{i}") for i in range(8)))
+    # 8 次执行分散到 4 个容器上，两轮完成
+    assert time.perf_counter() - start < 0.35
+    assert len({out for _, out, _ in outputs}) == 4
+    assert pool.stats["created"] == 4
+    pool.close()
+
+
+def test_pool_recycles_after_max_runs_crash_and_failed_health_check():
+    pool = SandboxPool(size=1, factory=FakeSandbox, max_runs=2, health_interval=0.0)
+    with pool.lease() as first:
+        pass
+    with pool.lease() as sandbox:
+        assert sandbox is first
+    _wait_idle(pool, 1)
+    assert first.cleaned and pool.stats["recycled"] == 1
+
+    with pytest.raises(RuntimeError):
+        with pool.lease() as sandbox:
+            sandbox.execute_code("crash", "")
+    _wait_idle(pool, 1)
+    assert pool.stats["crashed"] == 1
+
+    pool._idle[0].sandbox.healthy = False
+    with pool.lease() as sandbox:
+        assert sandbox.healthy
+    assert pool.stats["health_failures"] == 1
+    pool.close()
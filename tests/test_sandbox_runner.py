@@ -0,0 +1,52 @@
+import sys
+import socket
+import struct
+import threading
+import subprocess
+
+from src.reason_code.executor import fork_server
+from src.reason_code.executor.runner_session import RunnerSession
+from src.reason_code.executor.sandbox import _ExecSocketStream
+
+
+def _docker_exec_relay(sock, proc):
+    """模拟 docker exec 的附加连接：socket 的输入写进 stdin，stdout / stderr 按多路复用帧发回"""
+    def pump_in():
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                proc.stdin.close()
+                return
+            proc.stdin.write(data)
+            proc.stdin.flush()
+
+    def pump_out(pipe, stream_id):
+        while True:
+            data = pipe.read1(65536)
+            if not data:
+                return
+            sock.sendall(struct.pack(">BxxxL", stream_id, len(data)) + data)
+
+    for target, args in ((pump_in, ()), (pump_out, (proc.stdout, 1)), (pump_out, (proc.stderr, 2))):
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def test_runner_over_docker_exec_stream_caches_harness_and_returns_structured_results():
+    proc = subprocess.Popen([sys.executable, fork_server.__file__, "math"], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    ours, theirs = socket.socketpair()
+    _docker_exec_relay(theirs, proc)
+    stream = _ExecSocketStream(ours, timeout=10)
+    session = RunnerSession(stream, stream)
+    try:
+        session.hello()
+        harness = "    import sys\n    print('noise', file=sys.stderr)\n    assert add(1, 2) == 3\n    print('ok')"
+        result = session.run("def add(a, b):\n    return a + b", harness, 5, {"cpu_s": 5})
+        assert (result["exit_code"], result["stdout"], result["stderr"]) == (0, "ok\n", "noise\n")
+        result = session.run("def add(a, b):\n    return a * b", harness, 5, {"cpu_s": 5})
+        assert result["exit_code"] == 1
+        assert result["exception"] == {"type": "AssertionError", "message": "", "file": "test_runner.py", "line": 4}
+        assert session.ping()
+    finally:
+        stream.close()
+        proc.wait(timeout=5)
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.reason_code.models import scheduler as scheduler_module
+from src.reason_code.models.scheduler import InferenceScheduler, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class FakeBatchModel:
+    """记录每个批次包含哪些 prompt；gate 未放行前批次会一直阻塞"""
+
+    def __init__(self):
+        self.batches = []
+        self.modes = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def generate_batch(self, prompts, ns, prefix_hints=None, contexts=None, decoding=None):
+        self.gate.wait(timeout=5)
+        self.batches.append(list(prompts))
+        self.modes.append(decoding)
+        return [[f"{p}:{i}" for i in range(n)] for p, n in zip(prompts, ns)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_coalesced():
+    model = FakeBatchModel()
+    scheduler = InferenceScheduler(model, max_batch_rows=16, max_wait_ms=20)
+    results = await asyncio.gather(*(scheduler.submit(f"p{i}", n=2) for i in range(4)))
+    assert results[1] == ["p1:0", "p1:1"]
+    assert len(model.batches) == 1
+    assert scheduler.snapshot()["avg_batch_rows"] == 8
+
+
+@pytest.mark.asyncio
+async def test_batch_respects_row_limit_and_priority():
+    model = FakeBatchModel()
+    scheduler = InferenceScheduler(model, max_batch_rows=2, max_wait_ms=5)
+    # 先占住模型，让后续请求在队列里排队
+    model.gate.clear()
+    blocker = asyncio.ensure_future(scheduler.submit("blocker", n=2))
+    await asyncio.sleep(0.05)
+    low = asyncio.ensure_future(scheduler.submit("low", n=2, priority=PRIORITY_LOW))
+    high = asyncio.ensure_future(scheduler.submit("high", n=2, priority=PRIORITY_HIGH))
+    await asyncio.sleep(0.01)
+    model.gate.set()
+    await asyncio.gather(blocker, low, high)
+    assert model.batches == [["blocker"], ["high"], ["low"]]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_is_skipped():
+    model = FakeBatchModel()
+    scheduler = InferenceScheduler(model, max_batch_rows=1, max_wait_ms=5)
+    model.gate.clear()
+    blocker = asyncio.ensure_future(scheduler.submit("blocker"))
+    await asyncio.sleep(0.05)
+    doomed = asyncio.ensure_future(scheduler.submit("doomed"))
+    await asyncio.sleep(0.01)
+    doomed.cancel()
+    model.gate.set()
+    await blocker
+    assert await scheduler.submit("after") == ["after:0"]
+    assert ["doomed"] not in model.batches
+    assert scheduler.stats["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_only_same_decoding_mode_is_coalesced():
+    model = FakeBatchModel()
+    scheduler = InferenceScheduler(model, max_batch_rows=16, max_wait_ms=20)
+    await asyncio.gather(
+        scheduler.submit("a", decoding="sample"),
+        scheduler.submit("b", decoding="prompt_lookup"),
+        scheduler.submit("c", decoding="sample"),
+    )
+    assert model.batches == [["a", "c"], ["b"]]
+    assert model.modes == ["sample", "prompt_lookup"]
+
+
+def test_schedulers_of_closed_loops_are_released(monkeypatch):
+    """每次 asyncio.run 换了事件循环：旧调度器的执行器被关闭，注册表不随运行次数增长"""
+    monkeypatch.setattr(scheduler_module, "_schedulers", {})
+
+    async def generate(model):
+        scheduler = scheduler_module.get_scheduler(model)
+        assert await scheduler.submit("p") == ["p:0"]
+        return scheduler
+
+    model = FakeBatchModel()
+    first = asyncio.run(generate(model))
+    second = asyncio.run(generate(model))
+    assert second is not first and first.executor._shutdown
+    # 换成另一个模型后，上一个循环里的调度器 (及其模型引用) 也被清掉
+    third = asyncio.run(generate(FakeBatchModel()))
+    assert second.executor._shutdown
+    assert list(scheduler_module._schedulers.values()) == [third]
+
+    # 关闭后空闲的执行器线程退出
+    threads = [t for s in (first, second) for t in s.executor._threads]
+    for t in threads:
+        t.join(timeout=2)
+    assert threads and not any(t.is_alive() for t in threads)
+    third.close()
@@ -0,0 +1,77 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from src.reason_code.models.speculative import NgramIndex, prompt_lookup_generate
+
+
+def test_ngram_index_prefers_longest_recent_match():
+    index = NgramIndex([1, 2, 3, 9, 2, 3, 4, 5], max_ngram=3)
+    index.extend([1, 2, 3])
+    # 3-gram (1, 2, 3) 只出现在开头，后续是 9
+    assert index.draft(3) == [9, 2, 3]
+    index.extend([7])
+    assert index.draft(3) == []
+
+
+def _tiny_model():
+    config = transformers.Qwen2Config(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=256,
+    )
+    torch.manual_seed(0)
+    return transformers.AutoModelForCausalLM.from_config(config).eval()
+
+
+def test_greedy_prompt_lookup_matches_plain_decoding():
+    model = _tiny_model()
+    input_ids = torch.tensor([[5, 6, 7, 8, 9, 5, 6, 7, 8, 9, 5, 6]])
+    with torch.no_grad():
+        expected = model.generate(input_ids, max_new_tokens=24, do_sample=False, eos_token_id=None)
+        cache = transformers.DynamicCache(config=model.config)
+        model(input_ids=input_ids[:, :-1], past_key_values=cache, use_cache=True)
+        tokens, stats = prompt_lookup_generate(model, input_ids, cache, max_new_tokens=24,
+                                               eos_token_id=-1, temperature=0)
+    assert tokens == expected[0, input_ids.shape[1]:].tolist()
+    assert stats.new_tokens == 24
+    assert stats.forward_passes <= 24
+
+
+def test_prompt_lookup_applies_logits_processors_and_eos_list():
+    model = _tiny_model()
+    input_ids = torch.tensor([[5, 6, 7, 8, 9, 5, 6, 7, 8, 9, 5, 6]])
+    processor = transformers.LogitsProcessorList([transformers.RepetitionPenaltyLogitsProcessor(1.5)])
+    with torch.no_grad():
+        expected = model.generate(input_ids, max_new_tokens=24, do_sample=False, repetition_penalty=1.5,
+                                  eos_token_id=None)[0, input_ids.shape[1]:].tolist()
+        cache = transformers.DynamicCache(config=model.config)
+        model(input_ids=input_ids[:, :-1], past_key_values=cache, use_cache=True)
+        tokens, _ = prompt_lookup_generate(model, input_ids, cache, max_new_tokens=24, eos_token_id=None,
+                                           temperature=0, logits_processor=processor)
+    assert tokens == expected
+
+    # eos 列表里任一 token 都会停止
+    stop = expected[len(expected) // 2]
+    with torch.no_grad():
+        cache = transformers.DynamicCache(config=model.config)
+        model(input_ids=input_ids[:, :-1], past_key_values=cache, use_cache=True)
+        tokens, _ = prompt_lookup_generate(model, input_ids, cache, max_new_tokens=24, eos_token_id=[-1, stop],
+                                           temperature=0, logits_processor=processor)
+    assert tokens == expected[:expected.index(stop) + 1]
+
+
+def test_speculative_sampling_follows_generation_config():
+    from types import SimpleNamespace
+    from src.reason_code.models import llm
+
+    llm._import_inference_deps()
+    local = llm.LocalLoraModel()
+    local.model = _tiny_model()
+    local.model.generation_config.update(top_k=20, repetition_penalty=1.1, eos_token_id=[3, 4])
+    local.tokenizer = SimpleNamespace(eos_token_id=3)
+    local.device = "cpu"
+    processor, eos = local._speculative_sampling(12)
+    kinds = {type(p).__name__ for p in processor}
+    assert {"RepetitionPenaltyLogitsProcessor", "TemperatureLogitsWarper", "TopKLogitsWarper", "TopPLogitsWarper"} <= kinds
+    assert eos == [3, 4]
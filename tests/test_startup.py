@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("torch", "transformers", "peft", "docker", "phoenix")
+
+
+def _eager_heavy_imports(module: str):
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return [m for m in proc.stdout.strip().split(",") if m]
+
+
+def test_agent_import_is_lazy():
+    # 导入搜索模块不应加载模型依赖或创建 Docker 沙箱
+    assert _eager_heavy_imports("src.reason_code.agent.mcts") == []
+
+
+def test_api_import_is_lazy():
+    pytest.importorskip("fastapi")
+    assert _eager_heavy_imports("src.reason_code.api.app") == []
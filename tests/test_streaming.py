@@ -0,0 +1,23 @@
+from src.reason_code.models.streaming import find_completion, truncate_at_completion
+
+
+def test_closed_fence_stops():
+    text = "```python\ndef add(a, b):\n    return a + b\n```\nThis function adds"
+    assert find_completion("```python\ndef add(a, b):\n    return a + b\n") is None
+    assert truncate_at_completion(text) == "```python\ndef add(a, b):\n    return a + b\n```"
+
+
+def test_dedent_after_complete_def_stops():
+    body = "def add(a, b):\n    return a + b\n\n"
+    assert find_completion(body) is None
+    text = body + "print(add(1, 2))\n"
+    assert truncate_at_completion(text) == body.rstrip("\n") + "\n"
+
+
+def test_helper_function_and_incomplete_code_continue():
+    # 回到第 0 列的是新的 def，属于同一段代码
+    assert find_completion("def a():\n    return 1\ndef b():\n") is None
+    # 函数体还没写完 (无法 parse) 时不停止
+    assert find_completion('def a():\n    """doc\nmore\n') is None
+    # 最后一行还没换行，不检查
+    assert find_completion("def a():\n    return 1\nprint(a())") is None